@@ -24,6 +24,19 @@ common_opts = [
                help='SQL Connection'),
     cfg.IntOpt('sql_idle_timeout', default=3600),
     cfg.BoolOpt('sql_query_log', default=False),
+    cfg.StrOpt('sql_replica_connection', default=None,
+               help='SQL Connection of a read-only replica, which GET '
+                    'requests of the API read from'),
+    cfg.IntOpt('sql_max_pool_size', default=10,
+               help='Connections kept open in the pool (not for SQLite)'),
+    cfg.IntOpt('sql_max_overflow', default=20,
+               help='Connections opened beyond sql_max_pool_size when '
+                    'every pooled one is in use (not for SQLite)'),
+    cfg.IntOpt('sql_pool_timeout', default=30,
+               help='Seconds to wait for a free connection before failing'),
+    cfg.BoolOpt('sql_pool_pre_ping', default=False,
+                help='Test connections with a SELECT 1 on checkout and '
+                     'replace the ones the server has dropped'),
     cfg.IntOpt('bind_port', default=8779),
     cfg.StrOpt('api_extensions_path', default='',
                help='Path to extensions'),
@@ -43,6 +56,11 @@ common_opts = [
     cfg.StrOpt('nova_compute_url', default='http://localhost:8774/v2'),
     cfg.StrOpt('nova_volume_url', default='http://localhost:8776/v2'),
     cfg.StrOpt('reddwarf_auth_url', default='http://0.0.0.0:5000/v2.0'),
+    cfg.StrOpt('reddwarf_proxy_admin_user', default='',
+               help='Admin user which talks to Nova for contexts that '
+                    'carry no user token, such as task recovery'),
+    cfg.StrOpt('reddwarf_proxy_admin_pass', default='', secret=True),
+    cfg.StrOpt('reddwarf_proxy_admin_tenant_name', default=''),
     cfg.StrOpt('host', default='0.0.0.0'),
     cfg.IntOpt('report_interval', default=10),
     cfg.IntOpt('periodic_interval', default=60),
@@ -63,13 +81,50 @@ common_opts = [
     cfg.IntOpt('users_page_size', default=20),
     cfg.IntOpt('databases_page_size', default=20),
     cfg.IntOpt('instances_page_size', default=20),
+    cfg.BoolOpt('server_status_cache_enabled', default=False,
+                help='Serve the Nova status of instances from a cache which '
+                     'is refreshed in the background'),
+    cfg.IntOpt('server_status_cache_max_age', default=30,
+               help='Seconds after which a cached server status is stale '
+                    'and is loaded from Nova again'),
+    cfg.IntOpt('server_status_cache_refresh_interval', default=10),
+    cfg.BoolOpt('server_status_from_notifications', default=False,
+                help='Trust the server status and addresses stored from Nova '
+                     'notifications instead of asking Nova on every read'),
+    cfg.StrOpt('nova_notification_topic', default='notifications.info'),
+    cfg.StrOpt('nova_control_exchange', default='nova'),
+    cfg.StrOpt('notification_queue', default='reddwarf-notifications'),
+    cfg.IntOpt('nova_server_load_pool_size', default=10,
+               help='Maximum number of concurrent requests made to Nova '
+                    'when loading the servers for a page of instances'),
     cfg.ListOpt('ignore_users', default=[]),
     cfg.ListOpt('ignore_dbs', default=[]),
     cfg.IntOpt('agent_call_low_timeout', default=5),
     cfg.IntOpt('agent_call_high_timeout', default=60),
     cfg.StrOpt('guest_id', default=None),
+    cfg.IntOpt('guest_sql_pool_size', default=2,
+               help='Connections the guest agent keeps open to MySQL'),
+    cfg.IntOpt('guest_sql_max_overflow', default=3,
+               help='Connections the guest agent opens beyond '
+                    'guest_sql_pool_size when all of those are in use'),
     cfg.IntOpt('state_change_wait_time', default=2 * 60),
     cfg.IntOpt('agent_heartbeat_time', default=10),
+    cfg.BoolOpt('check_agent_heartbeats', default=False,
+                help='Skip calls to guests whose heartbeat is older than '
+                     'agent_heartbeat_time instead of waiting for them to '
+                     'time out'),
+    cfg.IntOpt('guest_circuit_failure_threshold', default=3,
+               help='Timeouts in a row after which calls to a guest fail '
+                    'at once instead of waiting for it'),
+    cfg.IntOpt('guest_circuit_reset_timeout', default=30,
+               help='Seconds after which a guest that stopped answering '
+                    'is tried again'),
+    cfg.IntOpt('guest_circuit_log_interval', default=60,
+               help='Seconds between logging the guests whose circuit '
+                    'is open'),
+    cfg.IntOpt('guest_status_heartbeat_interval', default=300,
+               help='Seconds after which the guest agent touches its '
+                    'unchanged status in the database to show it is alive'),
     cfg.IntOpt('num_tries', default=3),
     cfg.StrOpt('volume_fstype', default='ext3'),
     cfg.StrOpt('format_options', default='-m 5'),
@@ -78,6 +133,13 @@ common_opts = [
     cfg.IntOpt('max_instances_per_user', default=5),
     cfg.IntOpt('max_accepted_volume_size', default=5),
     cfg.StrOpt('taskmanager_queue', default='taskmanager'),
+    cfg.StrOpt('conductor_queue', default='reddwarf-conductor'),
+    cfg.StrOpt('conductor_manager',
+               default='reddwarf.conductor.manager.Manager'),
+    cfg.BoolOpt('guest_status_via_conductor', default=False,
+                help='Have the guest agent cast its status and heartbeats '
+                     'to the conductor in the taskmanager instead of '
+                     'writing them to the database'),
     cfg.BoolOpt('use_nova_server_volume', default=False),
     cfg.StrOpt('fake_mode_events', default='simulated'),
     cfg.StrOpt('device_path', default='/dev/vdb'),
@@ -89,8 +151,37 @@ common_opts = [
     cfg.IntOpt('reboot_time_out', default=60 * 2),
     cfg.StrOpt('service_options', default=['mysql']),
     cfg.IntOpt('dns_time_out', default=60 * 2),
+    cfg.IntOpt('watcher_sweep_interval', default=2,
+               help='Seconds between the Nova list calls the taskmanager '
+                    'makes for tasks waiting on servers and volumes'),
+    cfg.FloatOpt('poll_backoff_factor', default=1.5,
+                 help='Each wait between two polls is this many times longer '
+                      'than the one before'),
+    cfg.IntOpt('poll_max_sleep_time', default=30,
+               help='Longest wait in seconds between two polls'),
+    cfg.FloatOpt('poll_jitter', default=0.2,
+                 help='Fraction by which every wait between two polls is '
+                      'randomly lengthened or shortened'),
     cfg.IntOpt('resize_time_out', default=60 * 10),
     cfg.IntOpt('revert_time_out', default=60 * 10),
+    cfg.StrOpt('taskmanager_worker_name', default=None,
+               help='Name under which a taskmanager journals its tasks. A '
+                    'taskmanager recovers the tasks left under its name as '
+                    'soon as it starts, so every taskmanager needs a name '
+                    'of its own. Defaults to the host name and process id, '
+                    'whose leftovers wait for task_journal_orphan_age'),
+    cfg.IntOpt('task_journal_touch_interval', default=60,
+               help='Seconds between the touches a running task gives its '
+                    'journal entry to show it is still alive'),
+    cfg.IntOpt('task_journal_orphan_age', default=60 * 5,
+               help='Seconds after which an untouched journaled task is '
+                    'taken over as abandoned; well above '
+                    'task_journal_touch_interval'),
+    cfg.BoolOpt('taskmanager_shard_by_instance', default=False,
+                help='Send the casts about an instance to the one '
+                     'taskmanager which owns it in the matchmaker ring'),
+    cfg.IntOpt('taskmanager_ring_replicas', default=100,
+               help='Points each taskmanager host gets on the hash ring'),
 ]
 
 
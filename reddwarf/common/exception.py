@@ -100,11 +100,17 @@ class GuestError(ReddwarfError):
                 "%(original_message)s.")
 
 
-class GuestTimeout(ReddwarfError):
+class GuestTimeout(GuestError):
 
     message = _("Timeout trying to connect to the Guest Agent.")
 
 
+class GuestUnavailable(GuestError):
+
+    message = _("The Guest Agent of instance %(instance_id)s has stopped "
+                "answering; calls to it are skipped for now.")
+
+
 class BadRequest(ReddwarfError):
 
     message = _("The server could not comply with the request since it is "
@@ -38,7 +38,7 @@ class ManagerAPI(object):
 
     def _real_cast(self, method_name, **kwargs):
         try:
-            rpc.cast(self.context, self._get_routing_key(),
+            rpc.cast(self.context, self._get_cast_routing_key(**kwargs),
                      {"method": method_name, "args": kwargs})
         except Exception as e:
             LOG.error(e)
@@ -46,3 +46,7 @@ class ManagerAPI(object):
 
     def _fake_cast(self, method_name, **kwargs):
         pass
+
+    def _get_cast_routing_key(self, **kwargs):
+        """Returns the routing key of a cast with the given arguments."""
+        return self._get_routing_key()
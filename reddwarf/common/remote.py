@@ -36,7 +36,26 @@ def create_guest_client(context, id):
     return API(context, id)
 
 
+def create_admin_nova_client(service_type="compute"):
+    """Creates a client which authenticates as the proxy admin.
+
+    Used for admin contexts which carry no user token, such as the ones the
+    taskmanager builds to recover journaled tasks. The endpoint comes from
+    the admin's service catalog.
+    """
+    return Client(CONF.reddwarf_proxy_admin_user,
+                  CONF.reddwarf_proxy_admin_pass,
+                  project_id=CONF.reddwarf_proxy_admin_tenant_name,
+                  auth_url=PROXY_AUTH_URL, service_type=service_type)
+
+
+def _is_tokenless_admin(context):
+    return context.is_admin and context.auth_tok is None
+
+
 def create_nova_client(context):
+    if _is_tokenless_admin(context):
+        return create_admin_nova_client()
     client = Client(context.user, context.auth_tok, project_id=context.tenant,
                     auth_url=PROXY_AUTH_URL)
     client.client.auth_token = context.auth_tok
@@ -46,6 +65,8 @@ def create_nova_client(context):
 
 
 def create_nova_volume_client(context):
+    if _is_tokenless_admin(context):
+        return create_admin_nova_client(service_type="volume")
     # Quite annoying but due to a paste config loading bug.
     # TODO(hub-cap): talk to the openstack-common people about this
     client = Client(context.user, context.auth_tok,
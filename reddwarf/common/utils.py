@@ -18,19 +18,19 @@
 
 import datetime
 import inspect
+import random
 import re
 import signal
-import sys
 import time
 import urlparse
 import uuid
 
-from eventlet import event
 from eventlet import greenthread
 from eventlet import semaphore
 from eventlet.green import subprocess
 from eventlet.timeout import Timeout
 
+from reddwarf.common import cfg
 from reddwarf.common import exception
 from reddwarf.openstack.common import importutils
 from reddwarf.openstack.common import log as logging
@@ -39,6 +39,7 @@ from reddwarf.openstack.common import timeutils
 from reddwarf.openstack.common import utils as openstack_utils
 from reddwarf.openstack.common.gettextutils import _
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 import_class = importutils.import_class
 import_object = importutils.import_object
@@ -152,88 +153,81 @@ class MethodInspector(object):
         return "%s %s" % (self._func.__name__, args_str)
 
 
-class LoopingCallDone(Exception):
-    """Exception to break out and stop a LoopingCall.
+class PollStats(object):
+    """How often and how long poll_until was used from one call site."""
 
-    The poll-function passed to LoopingCall can raise this exception to
-    break out of the loop normally. This is somewhat analogous to
-    StopIteration.
+    def __init__(self):
+        self.calls = 0
+        self.attempts = 0
+        self.timeouts = 0
+        self.wall_time = 0.0
 
-    An optional return-value can be included as the argument to the exception;
-    this return-value will be returned by LoopingCall.wait()
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'attempts': self.attempts,
+            'timeouts': self.timeouts,
+            'wall_time': self.wall_time,
+        }
 
-    """
 
-    def __init__(self, retvalue=True):
-        """:param retvalue: Value that LoopingCall.wait() should return."""
-        super(LoopingCallDone, self).__init__()
-        self.retvalue = retvalue
-
-
-class LoopingCall(object):
-    """Nabbed from nova."""
-    def __init__(self, f=None, *args, **kw):
-        self.args = args
-        self.kw = kw
-        self.f = f
-        self._running = False
-
-    def start(self, interval, now=True):
-        self._running = True
-        done = event.Event()
-
-        def _inner():
-            if not now:
-                greenthread.sleep(interval)
-            try:
-                while self._running:
-                    self.f(*self.args, **self.kw)
-                    if not self._running:
-                        break
-                    greenthread.sleep(interval)
-            except LoopingCallDone, e:
-                self.stop()
-                done.send(e.retvalue)
-            except Exception:
-                LOG.exception(_('in looping call'))
-                done.send_exception(*sys.exc_info())
-                return
-            else:
-                done.send(True)
-
-        self.done = done
-
-        greenthread.spawn(_inner)
-        return self.done
-
-    def stop(self):
-        self._running = False
-
-    def wait(self):
-        return self.done.wait()
+# Statistics of poll_until, keyed by the name of the call site.
+_poll_stats = {}
+
+
+def get_poll_stats():
+    return dict((name, stats.to_dict())
+                for name, stats in _poll_stats.items())
 
 
 def poll_until(retriever, condition=lambda value: value,
-               sleep_time=1, time_out=None):
+               sleep_time=1, time_out=None, backoff=None,
+               max_sleep_time=None, jitter=None, name=None):
     """Retrieves object until it passes condition, then returns it.
 
-    If time_out_limit is passed in, PollTimeOut will be raised once that
-    amount of time is eclipsed.
+    The first wait is sleep_time seconds long and every following one is
+    backoff times longer, up to max_sleep_time. Each wait is also moved by a
+    random fraction of up to jitter, so callers which started together don't
+    keep polling together. The three default to the poll_backoff_factor,
+    poll_max_sleep_time and poll_jitter options.
+
+    If time_out is passed in, PollTimeOut will be raised once that amount of
+    time is eclipsed; no wait goes past it.
 
+    The attempts and the time taken are added to the statistics of name,
+    which defaults to the name of the retriever.
     """
+    if backoff is None:
+        backoff = CONF.poll_backoff_factor
+    if max_sleep_time is None:
+        max_sleep_time = CONF.poll_max_sleep_time
+    if jitter is None:
+        jitter = CONF.poll_jitter
+    name = name or getattr(retriever, '__name__', 'poll_until')
+    stats = _poll_stats.setdefault(name, PollStats())
+    stats.calls += 1
     start_time = time.time()
-
-    def poll_and_check():
-        obj = retriever()
-        if condition(obj):
-            raise LoopingCallDone(retvalue=obj)
-        if time_out is not None and time.time() > start_time + time_out:
-            raise exception.PollTimeOut
-    lc = LoopingCall(f=poll_and_check).start(sleep_time, True)
-    return lc.wait()
+    deadline = start_time + time_out if time_out is not None else None
+    interval = sleep_time
+    try:
+        while True:
+            stats.attempts += 1
+            obj = retriever()
+            if condition(obj):
+                return obj
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                stats.timeouts += 1
+                raise exception.PollTimeOut
+            wait = interval * (1 + random.uniform(-jitter, jitter))
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+            greenthread.sleep(max(wait, 0))
+            interval = min(interval * backoff, max_sleep_time)
+    finally:
+        stats.wall_time += time.time() - start_time
 
 
-# Copied from nova.api.openstack.common in the old code.
 def get_id_from_href(href):
     """Return the id or uuid portion of a url.
 
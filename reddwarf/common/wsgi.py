@@ -29,6 +29,7 @@ from xml.dom import minidom
 from reddwarf.common import context as rd_context
 from reddwarf.common import exception
 from reddwarf.common import utils
+from reddwarf import db
 from reddwarf.openstack.common.gettextutils import _
 from reddwarf.openstack.common import pastedeploy
 from reddwarf.openstack.common import service
@@ -553,6 +554,15 @@ class ContextMiddleware(openstack_wsgi.Middleware):
                                              marker=limits.get('marker'))
         request.environ[CONTEXT_KEY] = context
 
+    @webob.dec.wsgify(RequestClass=openstack_wsgi.Request)
+    def __call__(self, request):
+        self.process_request(request)
+        # Every model call made while serving the request uses this session.
+        # Requests which can't change anything may read from a replica.
+        read_only = request.method in ('GET', 'HEAD')
+        with db.get_db_api().request_session(read_only=read_only):
+            return request.get_response(self.application)
+
     @classmethod
     def factory(cls, global_config, **local_config):
         def _factory(app):
@@ -0,0 +1,52 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Routes the status reports of guests to the conductor.
+"""
+
+from reddwarf.common import cfg
+from reddwarf.common.context import ReddwarfContext
+from reddwarf.common.manager import ManagerAPI
+from reddwarf.openstack.common import log as logging
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+
+class API(ManagerAPI):
+    """API for sending status reports to the conductor."""
+
+    def __init__(self, context=None):
+        # Guests have no request context; the conductor doesn't need one.
+        super(API, self).__init__(context or ReddwarfContext())
+
+    def _get_routing_key(self):
+        """Create the routing key for the conductor"""
+        return CONF.conductor_queue
+
+    def update_status(self, instance_id, status_id):
+        LOG.debug("Casting status %s of instance %s to the conductor"
+                  % (status_id, instance_id))
+        self._cast("update_status", instance_id=instance_id,
+                   status_id=status_id)
+
+    def heartbeat(self, instance_id, status_id):
+        LOG.debug("Casting heartbeat of instance %s to the conductor"
+                  % instance_id)
+        self._cast("heartbeat", instance_id=instance_id, status_id=status_id)
@@ -0,0 +1,112 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Writes the status reports cast by guests in batches.
+
+Guests cast their status and heartbeats to the conductor instead of
+writing them to the database themselves. The reports are collected in
+memory, only the latest per instance is kept, and every periodic run
+writes them with one UPDATE per status rather than one per guest.
+
+Every taskmanager runs a conductor on the same queue, so the reports of
+one instance may be written by different conductors in any order. Each
+report is stamped with the time a conductor received it and is only
+written over an older one. The stamp comes from the controller's clock,
+like the other writes to the row, so a guest whose clock is off can't
+lose its reports or fake its liveness. Reports still buffered when a
+conductor stops are lost, but heartbeats carry the status too, so the
+next one repairs it.
+"""
+
+from reddwarf.common import utils
+from reddwarf.guestagent.models import AgentHeartBeat
+from reddwarf.instance.models import InstanceServiceStatus
+from reddwarf.instance.models import ServiceStatus
+from reddwarf.openstack.common import log as logging
+from reddwarf.openstack.common import periodic_task
+from reddwarf.openstack.common.gettextutils import _
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Manager(periodic_task.PeriodicTasks):
+
+    def __init__(self):
+        # The latest (received_at, status_id) reported by each instance.
+        self.statuses = {}
+        # When a heartbeat of each instance was last received.
+        self.heartbeats = {}
+
+    def update_status(self, context, instance_id, status_id):
+        self._add_status(instance_id, status_id, utils.utcnow())
+
+    def heartbeat(self, context, instance_id, status_id=None):
+        if status_id is not None:
+            self._add_status(instance_id, status_id, utils.utcnow())
+        else:
+            self._add_heartbeat(instance_id, utils.utcnow())
+
+    def _add_status(self, instance_id, status_id, received_at):
+        pending = self.statuses.get(instance_id)
+        if pending is None or pending[0] <= received_at:
+            self.statuses[instance_id] = (received_at, status_id)
+
+    def _add_heartbeat(self, instance_id, received_at):
+        self.heartbeats[instance_id] = max(
+            received_at, self.heartbeats.get(instance_id, received_at))
+
+    @periodic_task.periodic_task
+    def write_reports(self, context):
+        """Writes the reports collected since the last run."""
+        statuses, self.statuses = self.statuses, {}
+        heartbeats, self.heartbeats = self.heartbeats, {}
+        if not statuses and not heartbeats:
+            return
+        try:
+            self._write(statuses, heartbeats)
+        except Exception:
+            LOG.exception(_("Could not write %d statuses and %d heartbeats, "
+                            "keeping them for the next run.")
+                          % (len(statuses), len(heartbeats)))
+            for instance_id, (received_at, status_id) in statuses.items():
+                self._add_status(instance_id, status_id, received_at)
+            for instance_id, received_at in heartbeats.items():
+                self._add_heartbeat(instance_id, received_at)
+
+    def _write(self, statuses, heartbeats):
+        by_status = {}
+        for instance_id, (received_at, status_id) in statuses.items():
+            times = by_status.setdefault(status_id, {})
+            times[instance_id] = received_at
+        for status_id, times in by_status.items():
+            status = ServiceStatus.from_code(status_id)
+            InstanceServiceStatus.update_all_in_if_newer(
+                'instance_id', times, 'updated_at',
+                {'status_id': status.code,
+                 'status_description': status.description})
+        # A status report shows the guest is alive as well.
+        alive = set(heartbeats) | set(statuses)
+        InstanceServiceStatus.update_all_in_if_newer(
+            'instance_id',
+            dict((instance_id, received_at)
+                 for instance_id, received_at in heartbeats.items()
+                 if instance_id not in statuses),
+            'updated_at', {})
+        AgentHeartBeat.touch_all(list(alive))
+        LOG.debug(_("Wrote %d statuses and %d heartbeats.")
+                  % (len(statuses), len(heartbeats)))
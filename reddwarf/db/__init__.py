@@ -29,6 +29,16 @@ def get_db_api():
     return utils.import_module(db_api_opt)
 
 
+def transaction():
+    """Batches the saves of a block into a single flush and commit.
+
+        with db.transaction():
+            first.save()
+            second.save()
+    """
+    return get_db_api().transaction()
+
+
 class Query(object):
     """Mimics sqlalchemy query object.
 
@@ -54,15 +64,30 @@ class Query(object):
     def __iter__(self):
         return iter(self.all())
 
+    def increment(self, field, amount, maximum=None, minimum=None):
+        return self.db_api.increment(self._query_func, self._model,
+                                     self._conditions, field, amount,
+                                     maximum=maximum, minimum=minimum)
+
     def update(self, **values):
-        self.db_api.update_all(self._query_func, self._model, self._conditions,
-                               values)
+        """Updates the matching rows; returns how many there were."""
+        return self.db_api.update_all(self._query_func, self._model,
+                                      self._conditions, values)
 
     def delete(self):
         self.db_api.delete_all(self._query_func, self._model,
                                **self._conditions)
 
-    def limit(self, limit=200, marker=None, marker_column=None):
+    def limit(self, limit=200, marker=None, marker_column=None,
+              sort_keys=None):
+        if sort_keys:
+            return self.db_api.find_all_by_keyset(
+                self._query_func,
+                self._model,
+                self._conditions,
+                limit=limit,
+                marker=marker,
+                sort_keys=sort_keys)
         return self.db_api.find_all_by_limit(
             self._query_func,
             self._model,
@@ -71,11 +96,27 @@ class Query(object):
             marker=marker,
             marker_column=marker_column)
 
-    def paginated_collection(self, limit=200, marker=None, marker_column=None):
-        collection = self.limit(int(limit) + 1, marker, marker_column)
-        if len(collection) > int(limit):
-            return (collection[0:-1], collection[-2]['id'])
-        return (collection, None)
+    def paginated_collection(self, limit=200, marker=None, marker_column=None,
+                             sort_keys=None):
+        """Returns a page of the query and the marker of the next page.
+
+        By default the rows are ordered by marker_column (the id). If
+        sort_keys is given, the rows are ordered by those columns instead
+        and the page starts after the row whose id is the marker; with
+        sort_keys ending in a unique column such as ['created', 'id'] the
+        pages stay stable while rows are added and can be served from an
+        index.
+        """
+        limit = int(limit)
+        # One extra row tells whether there is a next page without a count.
+        collection = self.limit(limit + 1, marker, marker_column, sort_keys)
+        if len(collection) <= limit:
+            return (collection, None)
+        page = collection[0:limit]
+        marker_key = 'id'
+        if marker_column is not None and not sort_keys:
+            marker_key = marker_column.key
+        return (page, page[-1][marker_key])
 
 
 class Queryable(object):
@@ -80,6 +80,30 @@ class DatabaseModelBase(models.ModelBase):
     def find_all(cls, **kwargs):
         return db_query.find_all(cls, **cls._process_conditions(kwargs))
 
+    @classmethod
+    def find_all_in(cls, field, values, **kwargs):
+        """Loads every model whose field matches one of values at once."""
+        if not values:
+            return []
+        return get_db_api().find_all_in(cls, field, values,
+                                        **cls._process_conditions(kwargs))
+
+    @classmethod
+    def update_all_in(cls, field, values, updates, **kwargs):
+        """Updates every model whose field matches one of values at once."""
+        if not values:
+            return 0
+        return get_db_api().update_all_in(cls, field, values, updates,
+                                          **cls._process_conditions(kwargs))
+
+    @classmethod
+    def update_all_in_if_newer(cls, field, times, time_field, updates):
+        """Updates the models of times unless they are already as new."""
+        if not times:
+            return 0
+        return get_db_api().update_all_in_if_newer(cls, field, times,
+                                                   time_field, updates)
+
     @classmethod
     def _process_conditions(cls, raw_conditions):
         """Override in inheritors to format/modify any conditions."""
@@ -15,18 +15,26 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
 import sqlalchemy.exc
 from sqlalchemy import and_
+from sqlalchemy import case
 from sqlalchemy import or_
 from sqlalchemy.orm import aliased
+from sqlalchemy.orm import attributes
 
 from reddwarf.common import exception
 from reddwarf.common import utils
+from reddwarf.openstack.common.gettextutils import _
 from reddwarf.db.sqlalchemy import migration
 from reddwarf.db.sqlalchemy import mappers
 from reddwarf.db.sqlalchemy import session
 
 
+IN_CLAUSE_CHUNK_SIZE = 500
+
+
 def list(query_func, *args, **kwargs):
     return query_func(*args, **kwargs).all()
 
@@ -45,15 +53,104 @@ def find_all_by_limit(query_func, model, conditions, limit, marker=None,
                    marker_column).all()
 
 
+def find_all_by_keyset(query_func, model, conditions, limit, marker=None,
+                       sort_keys=None):
+    return _keyset_limits(query_func, model, conditions, limit, marker,
+                          sort_keys).all()
+
+
 def find_by(model, **kwargs):
     return _query_by(model, **kwargs).first()
 
 
+def find_all_in(model, field, values, **conditions):
+    """Returns every row whose field is one of the given values.
+
+    The values are split into chunks so a large list never exceeds the
+    bound parameter limit of the backend (999 for SQLite).
+    """
+    column = getattr(model, field)
+    values = [value for value in values]
+    results = []
+    for index in range(0, len(values), IN_CLAUSE_CHUNK_SIZE):
+        chunk = values[index:index + IN_CLAUSE_CHUNK_SIZE]
+        query = _query_by(model, **conditions).filter(column.in_(chunk))
+        results.extend(query.all())
+    return results
+
+
+def find_values_in(model, field, values, time_field=None, since=None):
+    """Returns which of values are found in field.
+
+    If since is given, only rows whose time_field is newer count. Only the
+    field is selected, and like find_all_in the values are split into
+    chunks.
+    """
+    column = getattr(model, field)
+    values = [value for value in values]
+    found = []
+    for index in range(0, len(values), IN_CLAUSE_CHUNK_SIZE):
+        chunk = values[index:index + IN_CLAUSE_CHUNK_SIZE]
+        query = session.get_session().query(column).filter(column.in_(chunk))
+        if since is not None:
+            query = query.filter(getattr(model, time_field) > since)
+        found.extend(row[0] for row in query.all())
+    return found
+
+
+def update_all_in(model, field, values, updates, **conditions):
+    """Updates every row whose field is one of the given values.
+
+    Like find_all_in, the values are split into chunks; returns how many
+    rows were updated.
+    """
+    column = getattr(model, field)
+    values = [value for value in values]
+    count = 0
+    for index in range(0, len(values), IN_CLAUSE_CHUNK_SIZE):
+        chunk = values[index:index + IN_CLAUSE_CHUNK_SIZE]
+        query = _query_by(model, **conditions).filter(column.in_(chunk))
+        count += query.update(updates, synchronize_session=False)
+    return count
+
+
+def update_all_in_if_newer(model, field, times, time_field, updates):
+    """Applies updates to the rows whose field is a key of times.
+
+    times maps each value of field to the time of its update, which is
+    written to time_field as well. A row whose time_field is already at or
+    past that time is left alone, so updates racing each other can't take
+    a row back in time. Returns how many rows were updated.
+    """
+    column = getattr(model, field)
+    time_column = getattr(model, time_field)
+    values = [value for value in times]
+    # Each row binds its value three times: in the IN and in both CASEs.
+    chunk_size = IN_CLAUSE_CHUNK_SIZE // 3
+    count = 0
+    for index in range(0, len(values), chunk_size):
+        chunk = values[index:index + chunk_size]
+        row_time = case(dict((value, times[value]) for value in chunk),
+                        value=column)
+        query = _query_by(model).filter(column.in_(chunk)).filter(
+            or_(time_column == None, time_column < row_time))
+        chunk_updates = dict(updates)
+        chunk_updates[time_field] = row_time
+        count += query.update(chunk_updates, synchronize_session=False)
+    return count
+
+
 def save(model):
     try:
         db_session = session.get_session()
-        model = db_session.merge(model)
-        db_session.flush()
+        if attributes.instance_state(model).has_identity:
+            model = db_session.merge(model)
+        else:
+            # A new row; merge would first look for it in the database.
+            db_session.add(model)
+        if db_session.transaction is None:
+            # Inside a transaction the commit flushes every save at once.
+            db_session.flush()
         return model
     except sqlalchemy.exc.IntegrityError as error:
         raise exception.DBConstraintError(model_name=model.__class__.__name__,
@@ -77,7 +174,24 @@ def update(model, **values):
 
 
 def update_all(query_func, model, conditions, values):
-    query_func(model, **conditions).update(values)
+    return query_func(model, **conditions).update(values)
+
+
+def increment(query_func, model, conditions, field, amount, maximum=None,
+              minimum=None):
+    """Adds amount to a column in a single UPDATE, within optional bounds.
+
+    Returns the number of rows changed, so a caller can tell whether the
+    bounds allowed the change without reading the row first.
+    """
+    column = getattr(model, field)
+    query = query_func(model, **conditions)
+    if maximum is not None:
+        query = query.filter(column + amount <= maximum)
+    if minimum is not None:
+        query = query.filter(column + amount >= minimum)
+    return query.update({field: column + amount},
+                        synchronize_session='evaluate')
 
 
 def configure_db(options, *plugins):
@@ -90,6 +204,24 @@ def configure_db_for_plugins(options, *plugins):
         session.configure_db(options, models_mapper=plugin.mapper)
 
 
+def request_session(read_only=False):
+    return session.request_session(read_only=read_only)
+
+
+@contextlib.contextmanager
+def transaction():
+    try:
+        with session.transaction():
+            yield
+    except sqlalchemy.exc.IntegrityError as error:
+        raise exception.DBConstraintError(model_name="transaction",
+                                          error=str(error.orig))
+
+
+def get_pool_stats():
+    return session.get_pool_stats()
+
+
 def drop_db(options):
     session.drop_db(options)
 
@@ -133,3 +265,34 @@ def _limits(query_func, model, conditions, limit, marker, marker_column=None):
     if marker:
         query = query.filter(marker_column > marker)
     return query.order_by(marker_column).limit(limit)
+
+
+def _keyset_limits(query_func, model, conditions, limit, marker, sort_keys):
+    """Orders by sort_keys and seeks past the marker row instead of offsetting.
+
+    The marker is the id of the last row of the previous page. Its sort key
+    values are looked up under the query's conditions and the query
+    continues with the rows which sort after them:
+    (k1 > v1) or (k1 = v1 and k2 > v2) ...
+    The redundant k1 >= v1 lets the database seek the index to the marker
+    rather than scan it from the start.
+    """
+    query = query_func(model, **conditions)
+    columns = [getattr(model, key) for key in sort_keys]
+    if marker:
+        # The marker has to match the conditions too, or a tenant could
+        # find out whether the ids of other tenants exist. It may have been
+        # deleted since the previous page though.
+        marker_conditions = dict(conditions, id=marker)
+        marker_conditions.pop('deleted', None)
+        marker_row = query_func(model, **marker_conditions).first()
+        if marker_row is None:
+            raise exception.BadRequest(_("Marker %s could not be found.")
+                                       % marker)
+        values = [getattr(marker_row, key) for key in sort_keys]
+        criteria = []
+        for index, column in enumerate(columns):
+            equal_prefix = [columns[i] == values[i] for i in range(index)]
+            criteria.append(and_(column > values[index], *equal_prefix))
+        query = query.filter(and_(columns[0] >= values[0], or_(*criteria)))
+    return query.order_by(*columns).limit(limit)
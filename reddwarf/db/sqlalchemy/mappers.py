@@ -15,29 +15,24 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from sqlalchemy import MetaData
-from sqlalchemy import Table
 from sqlalchemy import orm
 from sqlalchemy.orm import exc as orm_exc
 
+from reddwarf.db.sqlalchemy import tables
+
 
 def map(engine, models):
-    meta = MetaData()
-    meta.bind = engine
     if mapping_exists(models['instance']):
         return
 
-    orm.mapper(models['instance'], Table('instances', meta, autoload=True))
-    orm.mapper(models['root_enabled_history'],
-               Table('root_enabled_history', meta, autoload=True))
-    orm.mapper(models['service_image'],
-               Table('service_images', meta, autoload=True))
-    orm.mapper(models['service_statuses'],
-               Table('service_statuses', meta, autoload=True))
-    orm.mapper(models['dns_records'],
-               Table('dns_records', meta, autoload=True))
-    orm.mapper(models['agent_heartbeats'],
-               Table('agent_heartbeats', meta, autoload=True))
+    orm.mapper(models['instance'], tables.instances)
+    orm.mapper(models['root_enabled_history'], tables.root_enabled_history)
+    orm.mapper(models['service_image'], tables.service_images)
+    orm.mapper(models['service_statuses'], tables.service_statuses)
+    orm.mapper(models['dns_records'], tables.dns_records)
+    orm.mapper(models['agent_heartbeats'], tables.agent_heartbeats)
+    orm.mapper(models['tenant_usage'], tables.tenant_usage)
+    orm.mapper(models['task_journal'], tables.task_journal)
 
 
 def mapping_exists(model):
@@ -0,0 +1,62 @@
+# Copyright 2013 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import uuid
+
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.schema import Column
+from sqlalchemy.schema import MetaData
+
+from reddwarf.db.sqlalchemy.migrate_repo.schema import create_tables
+from reddwarf.db.sqlalchemy.migrate_repo.schema import DateTime
+from reddwarf.db.sqlalchemy.migrate_repo.schema import drop_tables
+from reddwarf.db.sqlalchemy.migrate_repo.schema import Integer
+from reddwarf.db.sqlalchemy.migrate_repo.schema import String
+from reddwarf.db.sqlalchemy.migrate_repo.schema import Table
+
+
+meta = MetaData()
+
+tenant_usage = Table(
+    'tenant_usage',
+    meta,
+    Column('id', String(36), primary_key=True, nullable=False),
+    Column('tenant_id', String(36), nullable=False, unique=True),
+    Column('instances', Integer(), nullable=False, default=0),
+    Column('created', DateTime()),
+    Column('updated', DateTime()))
+
+
+def upgrade(migrate_engine):
+    meta.bind = migrate_engine
+    create_tables([tenant_usage])
+
+    # Start the counters from the instances which already exist.
+    instances = Table('instances', meta, autoload=True)
+    counts = select([instances.c.tenant_id, func.count(instances.c.id)],
+                    instances.c.deleted == False,
+                    group_by=[instances.c.tenant_id])
+    for tenant_id, count in migrate_engine.execute(counts):
+        if tenant_id is None:
+            continue
+        migrate_engine.execute(tenant_usage.insert(),
+                               id=str(uuid.uuid4()),
+                               tenant_id=tenant_id,
+                               instances=count)
+
+
+def downgrade(migrate_engine):
+    meta.bind = migrate_engine
+    drop_tables([tenant_usage])
@@ -0,0 +1,49 @@
+# Copyright 2013 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy.schema import Column
+from sqlalchemy.schema import MetaData
+
+from reddwarf.db.sqlalchemy.migrate_repo.schema import create_tables
+from reddwarf.db.sqlalchemy.migrate_repo.schema import DateTime
+from reddwarf.db.sqlalchemy.migrate_repo.schema import drop_tables
+from reddwarf.db.sqlalchemy.migrate_repo.schema import String
+from reddwarf.db.sqlalchemy.migrate_repo.schema import Table
+from reddwarf.db.sqlalchemy.migrate_repo.schema import Text
+
+
+meta = MetaData()
+
+task_journal = Table(
+    'task_journal',
+    meta,
+    Column('id', String(36), primary_key=True, nullable=False),
+    Column('instance_id', String(36), nullable=False),
+    Column('action', String(64), nullable=False),
+    Column('args', Text()),
+    Column('context', Text()),
+    Column('checkpoints', Text()),
+    Column('worker', String(255)),
+    Column('created', DateTime()),
+    Column('updated', DateTime()))
+
+
+def upgrade(migrate_engine):
+    meta.bind = migrate_engine
+    create_tables([task_journal])
+
+
+def downgrade(migrate_engine):
+    meta.bind = migrate_engine
+    drop_tables([task_journal])
@@ -0,0 +1,60 @@
+# Copyright 2013 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy.schema import Index
+from sqlalchemy.schema import MetaData
+from sqlalchemy.sql.expression import select
+
+from reddwarf.db.sqlalchemy.migrate_repo.schema import Table
+
+
+def _index(meta, unique):
+    agent_heartbeats = Table('agent_heartbeats', meta, autoload=True)
+    return Index('ix_agent_heartbeats_instance_id',
+                 agent_heartbeats.c.instance_id, unique=unique)
+
+
+def _delete_duplicates(migrate_engine, meta):
+    """Keeps only the newest heartbeat of each instance."""
+    agent_heartbeats = Table('agent_heartbeats', meta, autoload=True)
+    rows = migrate_engine.execute(
+        select([agent_heartbeats.c.id, agent_heartbeats.c.instance_id])
+        .order_by(agent_heartbeats.c.instance_id,
+                  agent_heartbeats.c.updated_at.desc()))
+    seen = set()
+    duplicates = []
+    for id, instance_id in rows:
+        if instance_id in seen:
+            duplicates.append(id)
+        seen.add(instance_id)
+    for id in duplicates:
+        migrate_engine.execute(agent_heartbeats.delete()
+                               .where(agent_heartbeats.c.id == id))
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    _delete_duplicates(migrate_engine, meta)
+    _index(meta, unique=False).drop(migrate_engine)
+    _index(MetaData(bind=migrate_engine), unique=True).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    _index(meta, unique=True).drop(migrate_engine)
+    _index(MetaData(bind=migrate_engine), unique=False).create(migrate_engine)
@@ -16,9 +16,18 @@
 #    under the License.
 
 import contextlib
+import time
+
+from eventlet import corolocal
 from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy import exc
 from sqlalchemy import MetaData
+from sqlalchemy.engine import url as sqlalchemy_url
+from sqlalchemy.orm import Session
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import expression
 
 from reddwarf.common import cfg
 from reddwarf.openstack.common import log as logging
@@ -27,6 +36,12 @@ from reddwarf.db.sqlalchemy import mappers
 
 _ENGINE = None
 _MAKER = None
+# The optional read-only engine of a replica of the database.
+_REPLICA_ENGINE = None
+_REPLICA_MAKER = None
+
+# Holds the session of the request a greenthread is serving, if any.
+_REQUEST = corolocal.local()
 
 
 LOG = logging.getLogger(__name__)
@@ -35,9 +50,11 @@ CONF = cfg.CONF
 
 
 def configure_db(options, models_mapper=None):
-    global _ENGINE
+    global _ENGINE, _REPLICA_ENGINE
     if not _ENGINE:
         _ENGINE = _create_engine(options)
+    if not _REPLICA_ENGINE and CONF.sql_replica_connection:
+        _REPLICA_ENGINE = _engine_for(CONF.sql_replica_connection)
     if models_mapper:
         models_mapper.map(_ENGINE)
     else:
@@ -45,12 +62,14 @@ def configure_db(options, models_mapper=None):
         from reddwarf.dns import models as dns_models
         from reddwarf.extensions.mysql import models as mysql_models
         from reddwarf.guestagent import models as agent_models
+        from reddwarf.taskmanager import journal as journal_models
 
         model_modules = [
             base_models,
             dns_models,
             mysql_models,
             agent_models,
+            journal_models,
         ]
 
         models = {}
@@ -59,17 +78,174 @@ def configure_db(options, models_mapper=None):
         mappers.map(_ENGINE, models)
 
 
+class PoolMetrics(object):
+    """Counts the connections handed out by the pool of the engine."""
+
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def on_connect(self, dbapi_conn, connection_rec):
+        self.connects += 1
+
+    def on_checkout(self, dbapi_conn, connection_rec, connection_proxy):
+        self.checkouts += 1
+        self.checked_out += 1
+        self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def on_checkin(self, dbapi_conn, connection_rec):
+        self.checked_out = max(self.checked_out - 1, 0)
+
+    def add_wait(self, seconds):
+        self.waits += 1
+        self.wait_time += seconds
+        self.max_wait_time = max(self.max_wait_time, seconds)
+
+    def stats(self):
+        return {
+            'connects': self.connects,
+            'checkouts': self.checkouts,
+            'checked_out': self.checked_out,
+            'max_checked_out': self.max_checked_out,
+            'waits': self.waits,
+            'wait_time': self.wait_time,
+            'max_wait_time': self.max_wait_time,
+        }
+
+
+METRICS = PoolMetrics()
+
+
+class MeteredQueuePool(QueuePool):
+    """A QueuePool which records how long callers wait for a connection."""
+
+    metrics = METRICS
+
+    def _do_get(self):
+        started = time.time()
+        try:
+            return super(MeteredQueuePool, self)._do_get()
+        finally:
+            self.metrics.add_wait(time.time() - started)
+
+
+def _ping_connection(dbapi_conn, connection_rec, connection_proxy):
+    """Makes the pool replace connections the server has closed."""
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute("SELECT 1")
+    except Exception:
+        LOG.warn(_("Database connection failed the ping, reconnecting."))
+        raise exc.DisconnectionError()
+    finally:
+        cursor.close()
+
+
 def _create_engine(options):
+    return _engine_for(options['sql_connection'])
+
+
+def _engine_for(sql_connection):
     engine_args = {
         "pool_recycle": CONF.sql_idle_timeout,
         "echo": CONF.sql_query_log
     }
+    connection = sqlalchemy_url.make_url(sql_connection)
+    if connection.drivername != 'sqlite':
+        # SQLite uses pools of its own which can't be sized.
+        engine_args.update({
+            "poolclass": MeteredQueuePool,
+            "pool_size": CONF.sql_max_pool_size,
+            "max_overflow": CONF.sql_max_overflow,
+            "pool_timeout": CONF.sql_pool_timeout,
+        })
     LOG.info(_("Creating SQLAlchemy engine with args: %s") % engine_args)
-    return create_engine(options['sql_connection'], **engine_args)
+    engine = create_engine(sql_connection, **engine_args)
+    event.listen(engine, 'connect', METRICS.on_connect)
+    event.listen(engine, 'checkout', METRICS.on_checkout)
+    event.listen(engine, 'checkin', METRICS.on_checkin)
+    if CONF.sql_pool_pre_ping:
+        event.listen(engine, 'checkout', _ping_connection)
+    return engine
+
+
+def get_pool_stats():
+    """Returns the pool metrics of this process as a dict."""
+    return METRICS.stats()
+
+
+class ReplicaRoutingSession(Session):
+    """Reads from the replica and writes to the primary database."""
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or isinstance(clause, (expression.Insert,
+                                                 expression.Update,
+                                                 expression.Delete)):
+            return _ENGINE
+        return _REPLICA_ENGINE
+
+
+@contextlib.contextmanager
+def request_session(read_only=False):
+    """Makes every model call of the current greenthread share one session.
+
+    Used around an API request, so the request takes connections from a
+    single session instead of building a new one for every query. If the
+    request only reads and a replica is configured, the queries of the
+    session go to the replica; anything it writes still goes to the
+    primary, so it may not read its own writes.
+    """
+    if getattr(_REQUEST, 'session', None) is not None:
+        # Nested scopes reuse the outer session.
+        yield _REQUEST.session
+        return
+    if read_only and _REPLICA_ENGINE:
+        session = _new_replica_session()
+    else:
+        session = _new_session()
+    _REQUEST.session = session
+    try:
+        yield session
+    finally:
+        _REQUEST.session = None
+        session.close()
+
+
+@contextlib.contextmanager
+def transaction():
+    """Runs the model calls of the current greenthread in one transaction.
+
+    Saves made inside the block are flushed together when it ends, and
+    are committed or rolled back as a whole. Nested blocks join the
+    outer transaction.
+    """
+    with request_session() as session:
+        if session.transaction is not None:
+            yield session
+            return
+        session.begin()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
 
 
 def get_session(autocommit=True, expire_on_commit=False):
     """Helper method to grab session."""
+    session = getattr(_REQUEST, 'session', None)
+    if session is not None:
+        return session
+    return _new_session(autocommit, expire_on_commit)
+
+
+def _new_session(autocommit=True, expire_on_commit=False):
     global _MAKER, _ENGINE
     if not _MAKER:
         if not _ENGINE:
@@ -82,6 +258,15 @@ def get_session(autocommit=True, expire_on_commit=False):
     return _MAKER()
 
 
+def _new_replica_session():
+    global _REPLICA_MAKER
+    if not _REPLICA_MAKER:
+        _REPLICA_MAKER = sessionmaker(class_=ReplicaRoutingSession,
+                                      autocommit=True,
+                                      expire_on_commit=False)
+    return _REPLICA_MAKER()
+
+
 def raw_query(model, autocommit=True, expire_on_commit=False):
     return get_session(autocommit, expire_on_commit).query(model)
 
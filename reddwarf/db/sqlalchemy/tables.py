@@ -0,0 +1,127 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""The tables the models are mapped to, as the migrations leave them.
+
+Declaring them here means mapping the models doesn't have to reflect the
+schema from the database. Whenever a migration changes a mapped table, the
+definition below has to be changed the same way.
+"""
+
+from sqlalchemy import Index
+from sqlalchemy import MetaData
+from sqlalchemy.schema import Column
+
+from reddwarf.db.sqlalchemy.migrate_repo.schema import Boolean
+from reddwarf.db.sqlalchemy.migrate_repo.schema import DateTime
+from reddwarf.db.sqlalchemy.migrate_repo.schema import Integer
+from reddwarf.db.sqlalchemy.migrate_repo.schema import String
+from reddwarf.db.sqlalchemy.migrate_repo.schema import Table
+from reddwarf.db.sqlalchemy.migrate_repo.schema import Text
+
+
+meta = MetaData()
+
+instances = Table(
+    'instances',
+    meta,
+    Column('id', String(36), primary_key=True, nullable=False),
+    Column('created', DateTime()),
+    Column('updated', DateTime()),
+    Column('name', String(255)),
+    Column('hostname', String(255)),
+    Column('compute_instance_id', String(36)),
+    Column('task_id', Integer()),
+    Column('task_description', String(32)),
+    Column('task_start_time', DateTime()),
+    Column('volume_id', String(36)),
+    Column('flavor_id', String(36)),
+    Column('volume_size', Integer()),
+    Column('tenant_id', String(36), nullable=True),
+    Column('server_status', String(64)),
+    Column('deleted', Boolean()),
+    Column('deleted_at', DateTime()),
+    Column('server_addresses', Text()))
+
+Index('ix_instances_tenant_deleted_id',
+      instances.c.tenant_id, instances.c.deleted, instances.c.id)
+Index('ix_instances_tenant_deleted_created',
+      instances.c.tenant_id, instances.c.deleted, instances.c.created,
+      instances.c.id)
+
+service_images = Table(
+    'service_images',
+    meta,
+    Column('id', String(36), primary_key=True, nullable=False),
+    Column('service_name', String(255)),
+    Column('image_id', String(255)))
+
+service_statuses = Table(
+    'service_statuses',
+    meta,
+    Column('id', String(36), primary_key=True, nullable=False),
+    Column('instance_id', String(36), nullable=False),
+    Column('status_id', Integer(), nullable=False),
+    Column('status_description', String(64), nullable=False),
+    Column('updated_at', DateTime()))
+
+Index('ix_service_statuses_instance_id', service_statuses.c.instance_id)
+
+root_enabled_history = Table(
+    'root_enabled_history',
+    meta,
+    Column('id', String(36), primary_key=True, nullable=False),
+    Column('user', String(length=255)),
+    Column('created', DateTime()))
+
+agent_heartbeats = Table(
+    'agent_heartbeats',
+    meta,
+    Column('id', String(36), primary_key=True, nullable=False),
+    Column('instance_id', String(36), nullable=False),
+    Column('updated_at', DateTime()))
+
+Index('ix_agent_heartbeats_instance_id', agent_heartbeats.c.instance_id,
+      unique=True)
+
+dns_records = Table(
+    'dns_records',
+    meta,
+    Column('name', String(length=255), primary_key=True),
+    Column('record_id', String(length=64)))
+
+tenant_usage = Table(
+    'tenant_usage',
+    meta,
+    Column('id', String(36), primary_key=True, nullable=False),
+    Column('tenant_id', String(36), nullable=False, unique=True),
+    Column('instances', Integer(), nullable=False, default=0),
+    Column('created', DateTime()),
+    Column('updated', DateTime()))
+
+task_journal = Table(
+    'task_journal',
+    meta,
+    Column('id', String(36), primary_key=True, nullable=False),
+    Column('instance_id', String(36), nullable=False),
+    Column('action', String(64), nullable=False),
+    Column('args', Text()),
+    Column('context', Text()),
+    Column('checkpoints', Text()),
+    Column('worker', String(255)),
+    Column('created', DateTime()),
+    Column('updated', DateTime()))
@@ -26,6 +26,7 @@ import hashlib
 from reddwarf.openstack.common import log as logging
 from reddwarf.common import cfg
 from reddwarf.common import exception
+from reddwarf.common import utils
 from reddwarf.common.exception import NotFound
 from reddwarf.dns.models import DnsRecord
 from rsdns.client import DNSaas
@@ -131,12 +132,12 @@ class RsDnsDriver(object):
                 record_type=entry.type,
                 record_ttl=entry.ttl)
             try:
-                #TODO: Bring back our good friend poll_until.
-                while(future.ready is False):
-                    import time
-                    time.sleep(2)
+                def record_is_ready():
                     LOG.info("Waiting for the dns record_id.. ")
+                    return future.ready
 
+                utils.poll_until(record_is_ready, sleep_time=2,
+                                 time_out=CONF.dns_time_out)
                 if len(future.resource) < 1:
                     raise RsDnsError("No DNS records were created.")
                 elif len(future.resource) > 1:
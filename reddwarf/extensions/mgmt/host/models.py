@@ -23,17 +23,20 @@ from reddwarf.openstack.common import log as logging
 
 from reddwarf import db
 
+from reddwarf.common import cfg
 from reddwarf.common import exception
 from reddwarf.common import utils
 from reddwarf.instance.models import DBInstance
 from reddwarf.instance.models import InstanceServiceStatus
 from reddwarf.instance.models import SimpleInstance
 from reddwarf.guestagent.db import models as guest_models
+from reddwarf.guestagent.models import AgentHeartBeat
 from reddwarf.common.remote import create_guest_client
 from reddwarf.common.remote import create_nova_client
 from novaclient import exceptions as nova_exceptions
 
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
@@ -66,13 +69,25 @@ class DetailedHost(object):
         for instance in self.instances:
             instance['server_id'] = instance['uuid']
             del instance['uuid']
+        db_infos = {}
+        server_ids = [instance['server_id'] for instance in self.instances]
+        for db_info in DBInstance.find_all_in('compute_instance_id',
+                                              server_ids):
+            db_infos.setdefault(db_info.compute_instance_id, db_info)
+        statuses = InstanceServiceStatus.find_all_by_instance_ids(
+            [db_info.id for db_info in db_infos.values()])
+        for instance in self.instances:
             try:
-                db_info = DBInstance.find_by(
-                    compute_instance_id=instance['server_id'])
+                db_info = db_infos.get(instance['server_id'])
+                if db_info is None:
+                    raise exception.ModelNotFoundError(
+                        "DBInstance Not Found")
                 instance['id'] = db_info.id
                 instance['tenant_id'] = db_info.tenant_id
-                status = InstanceServiceStatus.find_by(
-                    instance_id=db_info.id)
+                status = statuses.get(db_info.id)
+                if status is None:
+                    raise exception.ModelNotFoundError(
+                        "InstanceServiceStatus Not Found")
                 instance_info = SimpleInstance(None, db_info, status)
                 instance['status'] = instance_info.status
             except exception.ReddwarfError as re:
@@ -85,7 +100,19 @@ class DetailedHost(object):
         num_i = len(self.instances)
         LOG.debug("Host %s has %s instances to update" % (self.name, num_i))
         failed_instances = []
-        for instance in self.instances:
+        instances = self.instances
+        if CONF.check_agent_heartbeats:
+            # Skip the dead guests instead of waiting for each to time out.
+            alive = AgentHeartBeat.find_active_instance_ids(
+                [instance['id'] for instance in instances])
+            for instance in instances:
+                if instance['id'] not in alive:
+                    LOG.error("Instance %s has no heartbeat, not updating "
+                              "it." % instance['id'])
+                    failed_instances.append(instance['id'])
+            instances = [instance for instance in instances
+                         if instance['id'] in alive]
+        for instance in instances:
             client = create_guest_client(context, instance['id'])
             try:
                 client.update_guest()
@@ -61,15 +61,10 @@ class User(object):
         # Load InstanceServiceStatus to verify if it's running
         load_and_verify(context, instance_id)
         client = create_guest_client(context, instance_id)
-        for user in users:
-            user_name = user['_name']
-            existing_users, _nadda = Users.load_with_client(
-                client,
-                limit=1,
-                marker=user_name,
-                include_marker=True)
-            if (len(existing_users) > 0 and
-                    str(existing_users[0].name) == str(user_name)):
+        names = [user['_name'] for user in users]
+        existing = client.users_exist(names)
+        for user_name in names:
+            if user_name in existing:
                 raise exception.UserAlreadyExists(name=user_name)
         return client.create_user(users)
 
@@ -193,15 +188,10 @@ class Schema(object):
     def create(cls, context, instance_id, schemas):
         load_and_verify(context, instance_id)
         client = create_guest_client(context, instance_id)
-        for schema in schemas:
-            schema_name = schema['_name']
-            existing_schema, _nadda = Schemas.load_with_client(
-                client,
-                limit=1,
-                marker=schema_name,
-                include_marker=True)
-            if (len(existing_schema) > 0 and
-                    str(existing_schema[0].name) == str(schema_name)):
+        names = [schema['_name'] for schema in schemas]
+        existing = client.databases_exist(names)
+        for schema_name in names:
+            if schema_name in existing:
                 raise exception.DatabaseAlreadyExists(name=schema_name)
         return client.create_database(schemas)
 
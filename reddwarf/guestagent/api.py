@@ -19,14 +19,14 @@
 Handles all request to the Platform or Guest VM
 """
 
-from eventlet import Timeout
-
 from reddwarf.common import cfg
 from reddwarf.common import exception
 from reddwarf.common import utils
+from reddwarf.guestagent import circuit
 from reddwarf.guestagent import models as agent_models
 from reddwarf.openstack.common import log as logging
 from reddwarf.openstack.common import rpc
+from reddwarf.openstack.common.rpc import common as rpc_common
 from reddwarf.openstack.common.rpc import proxy
 from reddwarf.openstack.common.gettextutils import _
 
@@ -48,21 +48,26 @@ class API(proxy.RpcProxy):
 
     def _call(self, method_name, timeout_sec, **kwargs):
         LOG.debug("Calling %s" % method_name)
+        guest_circuit = circuit.get(self.id)
+        if not guest_circuit.allow_call():
+            raise exception.GuestUnavailable(instance_id=self.id)
         try:
             result = self.call(self.context,
                                self.make_msg(method_name, **kwargs),
                                timeout=timeout_sec)
 
             LOG.debug("Result is %s" % result)
+            guest_circuit.record_success()
             return result
+        except rpc_common.Timeout as t:
+            LOG.error(t)
+            guest_circuit.record_timeout()
+            raise exception.GuestTimeout(original_message=str(t))
         except Exception as e:
             LOG.error(e)
+            # Anything but a timeout was answered by the guest.
+            guest_circuit.record_success()
             raise exception.GuestError(original_message=str(e))
-        except Timeout as t:
-            if t is not timeout:
-                raise
-            else:
-                raise exception.GuestTimeout()
 
     def _cast(self, method_name, **kwargs):
         LOG.debug("Casting %s" % method_name)
@@ -91,6 +96,7 @@ class API(proxy.RpcProxy):
     def delete_queue(self):
         """Deletes the queue."""
         rpc.delete_queue(self.context, self._get_routing_key())
+        circuit.remove(self.id)
 
     def _get_routing_key(self):
         """Create the routing key based on the container id"""
@@ -98,12 +104,10 @@ class API(proxy.RpcProxy):
 
     def _check_for_hearbeat(self):
         """Preemptively raise GuestTimeout if heartbeat is old."""
-        try:
-            agent = agent_models.AgentHeartBeat.find_by(instance_id=self.id)
-            if agent_models.AgentHeartBeat.is_active(agent):
-                return True
-        except exception.ModelNotFoundError as mnfe:
-            LOG.warn(mnfe)
+        active = agent_models.AgentHeartBeat.find_active_instance_ids(
+            [self.id])
+        if self.id in active:
+            return True
         raise exception.GuestTimeout()
 
     def create_user(self, users):
@@ -117,6 +121,11 @@ class API(proxy.RpcProxy):
         return self._call("list_users", AGENT_LOW_TIMEOUT, limit=limit,
                           marker=marker, include_marker=include_marker)
 
+    def users_exist(self, names):
+        """Make a synchronous call to find which of the users exist"""
+        LOG.debug(_("Checking users for Instance %s"), self.id)
+        return self._call("users_exist", AGENT_LOW_TIMEOUT, names=names)
+
     def delete_user(self, user):
         """Make an asynchronous call to delete an existing database user"""
         LOG.debug(_("Deleting user %s for Instance %s"), user, self.id)
@@ -134,6 +143,11 @@ class API(proxy.RpcProxy):
         return self._call("list_databases", AGENT_LOW_TIMEOUT, limit=limit,
                           marker=marker, include_marker=include_marker)
 
+    def databases_exist(self, names):
+        """Make a synchronous call to find which of the databases exist"""
+        LOG.debug(_("Checking databases for Instance %s"), self.id)
+        return self._call("databases_exist", AGENT_LOW_TIMEOUT, names=names)
+
     def delete_database(self, database):
         """Make an asynchronous call to delete an existing database
            within the specified container"""
@@ -163,6 +177,16 @@ class API(proxy.RpcProxy):
         LOG.debug(_("Check hwinfo on Instance %s"), self.id)
         return self._call("get_hwinfo", AGENT_LOW_TIMEOUT)
 
+    def get_pool_stats(self):
+        """Make a synchronous call to get stats of the MySQL pool"""
+        LOG.debug(_("Check pool stats on Instance %s"), self.id)
+        return self._call("get_pool_stats", AGENT_LOW_TIMEOUT)
+
+    def get_status_report_stats(self):
+        """Make a synchronous call to get the status report counters"""
+        LOG.debug(_("Check status report stats on Instance %s"), self.id)
+        return self._call("get_status_report_stats", AGENT_LOW_TIMEOUT)
+
     def get_diagnostics(self):
         """Make a synchronous call to get diagnostics for the container"""
         LOG.debug(_("Check diagnostics on Instance %s"), self.id)
@@ -199,12 +223,28 @@ class API(proxy.RpcProxy):
         LOG.debug(_("Sending an upgrade call to nova-guest"))
         self._cast_with_consumer("upgrade")
 
+    def report_status(self):
+        """Make an asynchronous call to have the guest report its status
+           again, even if it hasn't changed"""
+        LOG.debug(_("Asking instance %s to report its status."), self.id)
+        self._cast("report_status")
+
     def get_volume_info(self):
         """Make a synchronous call to get volume info for the container"""
         LOG.debug(_("Check Volume Info on Instance %s"), self.id)
-        # self._check_for_hearbeat()
-        return self._call("get_filesystem_stats", AGENT_LOW_TIMEOUT,
-                          fs_path="/var/lib/mysql")
+        guest_circuit = circuit.get(self.id)
+        try:
+            if CONF.check_agent_heartbeats:
+                self._check_for_hearbeat()
+            info = self._call("get_filesystem_stats", AGENT_LOW_TIMEOUT,
+                              fs_path="/var/lib/mysql")
+        except (exception.GuestTimeout, exception.GuestUnavailable):
+            # While the guest doesn't answer, show what it said last.
+            if guest_circuit.volume_info is None:
+                raise
+            return guest_circuit.volume_info
+        guest_circuit.volume_info = info
+        return info
 
     def update_guest(self):
         """Make a synchronous call to update the guest agent."""
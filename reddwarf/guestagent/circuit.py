@@ -0,0 +1,166 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Circuit breakers which stop calls to guests that don't answer.
+
+Every guest has a circuit, kept for the life of the process:
+
+* closed: calls go through. Timeouts are counted, and after
+  guest_circuit_failure_threshold of them in a row the circuit opens.
+* open: calls fail at once with GuestUnavailable instead of waiting for
+  the RPC timeout. After guest_circuit_reset_timeout seconds the circuit
+  lets one trial call through.
+* half-open: the trial call is in flight; other calls still fail at once.
+  If it is answered the circuit closes, otherwise it opens again.
+
+With check_agent_heartbeats on, a timeout with a stale heartbeat opens the
+circuit at once, and no trial call is made while the heartbeat is stale.
+
+The taskmanager and the API servers each keep their own circuits and log
+the ones which aren't closed every minute or so, see log_circuit_stats.
+"""
+
+import time
+
+from reddwarf.common import cfg
+from reddwarf.guestagent import models as agent_models
+from reddwarf.openstack.common import log as logging
+from reddwarf.openstack.common import loopingcall
+from reddwarf.openstack.common.gettextutils import _
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+_circuits = {}
+_stats_logger = None
+
+
+class GuestCircuit(object):
+    """The circuit of a single guest."""
+
+    def __init__(self, instance_id):
+        self.instance_id = instance_id
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        # The last volume info the guest answered with, served while the
+        # circuit is open.
+        self.volume_info = None
+
+    def allow_call(self):
+        """Returns True if a call to the guest may be made now."""
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN:
+            return not self.probing
+        if time.time() - self.opened_at < CONF.guest_circuit_reset_timeout:
+            return False
+        if not self._heartbeat_is_fresh():
+            self.opened_at = time.time()
+            return False
+        LOG.info(_("Trying guest %s again.") % self.instance_id)
+        self.state = HALF_OPEN
+        self.probing = True
+        return True
+
+    def record_success(self):
+        if self.state != CLOSED:
+            LOG.info(_("Guest %s answered, closing its circuit.")
+                     % self.instance_id)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_timeout(self):
+        self.failures += 1
+        self.probing = False
+        if (self.state == HALF_OPEN or
+                self.failures >= CONF.guest_circuit_failure_threshold or
+                not self._heartbeat_is_fresh()):
+            self._open()
+
+    def _open(self):
+        if self.state != OPEN:
+            LOG.warn(_("Guest %s is not answering, opening its circuit "
+                       "after %d timeouts.")
+                     % (self.instance_id, self.failures))
+        self.state = OPEN
+        self.opened_at = time.time()
+
+    def _heartbeat_is_fresh(self):
+        if not CONF.check_agent_heartbeats:
+            return True
+        return self.instance_id in (
+            agent_models.AgentHeartBeat.find_active_instance_ids(
+                [self.instance_id]))
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'opened_at': self.opened_at,
+            'volume_info_cached': self.volume_info is not None,
+        }
+
+
+def get(instance_id):
+    """Returns the circuit of a guest, creating it if needed."""
+    circuit = _circuits.get(instance_id)
+    if circuit is None:
+        circuit = _circuits[instance_id] = GuestCircuit(instance_id)
+    return circuit
+
+
+def remove(instance_id):
+    """Forgets the circuit of a guest, e.g. when its instance is deleted."""
+    _circuits.pop(instance_id, None)
+
+
+def get_circuit_stats():
+    """Returns the circuits which aren't closed, keyed by instance id."""
+    return dict((instance_id, circuit.stats())
+                for instance_id, circuit in _circuits.items()
+                if circuit.state != CLOSED)
+
+
+def log_circuit_stats():
+    """Logs every circuit which isn't closed and returns their stats."""
+    stats = get_circuit_stats()
+    for instance_id, circuit_stats in sorted(stats.items()):
+        LOG.info(_("The circuit of guest %(instance_id)s is %(state)s after "
+                   "%(failures)d timeouts.")
+                 % dict(circuit_stats, instance_id=instance_id))
+    return stats
+
+
+def start_logging_circuit_stats():
+    """Logs the circuits of this process every guest_circuit_log_interval.
+
+    The taskmanager does this from a periodic task instead.
+    """
+    global _stats_logger
+    if _stats_logger is None:
+        interval = CONF.guest_circuit_log_interval
+        _stats_logger = loopingcall.LoopingCall(log_circuit_stats)
+        _stats_logger.start(interval, initial_delay=interval)
@@ -25,6 +25,7 @@ handles RPC calls relating to Platform specific operations.
 
 """
 
+import errno
 import os
 import re
 import time
@@ -32,14 +33,19 @@ import uuid
 
 from datetime import date
 from sqlalchemy import create_engine
+from sqlalchemy import event
 from sqlalchemy import exc
 from sqlalchemy import interfaces
+from sqlalchemy.pool import NullPool
 from sqlalchemy.sql.expression import text
 
 from reddwarf import db
+from reddwarf.common.exception import PollTimeOut
 from reddwarf.common.exception import ProcessExecutionError
 from reddwarf.common import cfg
 from reddwarf.common import utils
+from reddwarf.conductor import api as conductor_api
+from reddwarf.db.sqlalchemy import session
 from reddwarf.guestagent.db import models
 from reddwarf.guestagent.query import Query
 from reddwarf.guestagent import pkg
@@ -53,6 +59,7 @@ LOG = logging.getLogger(__name__)
 FLUSH = text("""FLUSH PRIVILEGES;""")
 
 ENGINE = None
+POOL_METRICS = session.PoolMetrics()
 MYSQLD_ARGS = None
 PREPARING = False
 UUID = False
@@ -62,6 +69,14 @@ FINAL_MYCNF = "/var/lib/mysql/my.cnf"
 TMP_MYCNF = "/tmp/my.cnf.tmp"
 DBAAS_MYCNF = "/etc/dbaas/my.cnf/my.cnf.%dM"
 MYSQL_BASE_DIR = "/var/lib/mysql"
+MYSQLD_SOCKET = "/var/run/mysqld/mysqld.sock"
+MYSQLD_PID_FILE = "/var/run/mysqld/mysqld.pid"
+
+# MySQL errors which mean the server answered, so it is up even though the
+# connection was refused.
+MYSQL_ANSWERED_ERRORS = (1040, 1044, 1045, 1129)
+# MySQL client errors which mean no server answered.
+MYSQL_UNREACHABLE_ERRORS = (2002, 2003, 2006, 2013)
 
 CONF = cfg.CONF
 INCLUDE_MARKER_OPERATORS = {
@@ -86,6 +101,12 @@ def get_auth_password():
     return pwd.strip()
 
 
+class GuestQueuePool(session.MeteredQueuePool):
+    """The pool of connections the guest agent keeps to MySQL."""
+
+    metrics = POOL_METRICS
+
+
 def get_engine():
         """Create the default engine with the updated admin user"""
         #TODO(rnirmal):Based on permissions issues being resolved we may revert
@@ -98,11 +119,29 @@ def get_engine():
         pwd = get_auth_password()
         ENGINE = create_engine("mysql://%s:%s@localhost:3306" %
                                (ADMIN_USER_NAME, pwd.strip()),
-                               pool_recycle=7200, echo=True,
+                               poolclass=GuestQueuePool,
+                               pool_size=CONF.guest_sql_pool_size,
+                               max_overflow=CONF.guest_sql_max_overflow,
+                               pool_recycle=7200, echo=CONF.sql_query_log,
                                listeners=[KeepAliveConnection()])
+        event.listen(ENGINE, 'connect', POOL_METRICS.on_connect)
+        event.listen(ENGINE, 'checkout', POOL_METRICS.on_checkout)
+        event.listen(ENGINE, 'checkin', POOL_METRICS.on_checkin)
         return ENGINE
 
 
+def get_pool_stats():
+    """Returns the use of the connection pool to MySQL as a dict."""
+    stats = POOL_METRICS.stats()
+    if ENGINE is not None:
+        stats.update({
+            'pool_size': ENGINE.pool.size(),
+            'checked_in': ENGINE.pool.checkedin(),
+            'overflow': ENGINE.pool.overflow(),
+        })
+    return stats
+
+
 def load_mysqld_options():
     try:
         out, err = utils.execute("/usr/sbin/mysqld", "--print-defaults",
@@ -120,6 +159,125 @@ def load_mysqld_options():
         return None
 
 
+_mycnf_cache = {}
+
+
+def read_mycnf(path=ORIG_MYCNF):
+    """Returns the sections of a my.cnf file as a dict of dicts.
+
+    The file is parsed again only when it has been modified. Options are
+    keyed with dashes, as MySQL treats dashes and underscores alike. An
+    unreadable file is returned as empty.
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+    cached = _mycnf_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    sections = {}
+    options = None
+    try:
+        with open(path) as mycnf:
+            for line in mycnf:
+                line = line.strip()
+                if not line or line[0] in '#;!':
+                    continue
+                if line.startswith('[') and line.endswith(']'):
+                    options = sections.setdefault(line[1:-1].strip(), {})
+                    continue
+                if options is None:
+                    continue
+                key, _sep, value = line.partition('=')
+                options[key.strip().replace('_', '-')] = (value.strip()
+                                                          if _sep else None)
+    except IOError as e:
+        LOG.debug(_("Could not read %s: %s") % (path, e))
+        return {}
+    _mycnf_cache[path] = (mtime, sections)
+    return sections
+
+
+def ping_mysql():
+    """Checks if MySQL answers on a pooled connection.
+
+    Returns True if it does, False if nothing answered and None if the
+    answer couldn't be told from the error.
+    """
+    global ENGINE
+    try:
+        engine = get_engine()
+        engine.connect().close()
+        return True
+    except exc.DisconnectionError:
+        return False
+    except exc.DBAPIError as e:
+        code = e.orig.args[0] if e.orig.args else None
+        if code in MYSQL_ANSWERED_ERRORS:
+            # The engine may have read my.cnf before the admin user was
+            # written into it; make the next call read it again.
+            if ENGINE is not None:
+                ENGINE.dispose()
+                ENGINE = None
+            return True
+        if code in MYSQL_UNREACHABLE_ERRORS:
+            return False
+        LOG.debug(_("Unexpected error pinging MySQL: %s") % e)
+        return None
+    except Exception as e:
+        LOG.debug(_("Could not ping MySQL: %s") % e)
+        return None
+
+
+def mysqld_process_state(pid_file):
+    """Tells from the pid file if mysqld is running, without forking.
+
+    Returns "running" if the process in the pid file exists, "crashed" if
+    it doesn't, "stopped" if there is no pid file and None if the pid file
+    can't be read.
+    """
+    try:
+        with open(pid_file) as f:
+            pid = int(f.read().strip())
+    except IOError as e:
+        if e.errno == errno.ENOENT:
+            return "stopped"
+        return None
+    except ValueError:
+        return None
+    if os.path.exists("/proc/%d" % pid):
+        return "running"
+    return "crashed"
+
+
+class StatusReportCounters(object):
+    """Counts how the status reports of the guest reached the database."""
+
+    def __init__(self):
+        # Full rows saved because the status changed.
+        self.writes = 0
+        # Unchanged statuses whose updated_at was touched.
+        self.heartbeats = 0
+        # Unchanged statuses which weren't written at all.
+        self.skipped = 0
+
+    def stats(self):
+        return {
+            'writes': self.writes,
+            'heartbeats': self.heartbeats,
+            'skipped': self.skipped,
+        }
+
+
+REPORT_COUNTERS = StatusReportCounters()
+
+
+def get_status_report_stats():
+    """Returns the status report counters of this guest as a dict."""
+    return REPORT_COUNTERS.stats()
+
+
 class MySqlAppStatus(object):
     """
     Answers the question "what is the status of the MySQL application on
@@ -145,8 +303,15 @@ class MySqlAppStatus(object):
     def __init__(self):
         if self._instance is not None:
             raise RuntimeError("Cannot instantiate twice.")
-        self.status = self._load_status()
+        if CONF.guest_status_via_conductor:
+            # The status can't be read without the database; the first
+            # update() reports the real one.
+            self.status = rd_models.ServiceStatuses.NEW
+        else:
+            self.status = self._load_status()
         self.restart_mode = False
+        # When the status was last written or touched, in seconds.
+        self.last_reported = None
 
     def begin_mysql_install(self):
         """Called right before MySQL is prepared."""
@@ -174,6 +339,35 @@ class MySqlAppStatus(object):
         return cls._instance
 
     def _get_actual_db_status(self):
+        """Works out the status of MySQL without running any commands.
+
+        A ping on a pooled connection tells if MySQL is running. If it
+        doesn't answer, the pid file and /proc tell if it is blocked,
+        crashed or shut down. Only when those can't be read are the
+        commands run.
+        """
+        mysqld = read_mycnf().get('mysqld', {})
+        # Without a socket nobody can answer a ping on localhost.
+        if os.path.exists(mysqld.get('socket') or MYSQLD_SOCKET):
+            if ping_mysql():
+                LOG.debug("Service Status is RUNNING.")
+                return rd_models.ServiceStatuses.RUNNING
+        state = mysqld_process_state(mysqld.get('pid-file') or
+                                     MYSQLD_PID_FILE)
+        if state == "running":
+            # TODO(rnirmal): Need to create new statuses for instances
+            # where the mysql service is up, but unresponsive
+            LOG.info("Service Status is BLOCKED.")
+            return rd_models.ServiceStatuses.BLOCKED
+        if state == "crashed":
+            LOG.info("Service Status is CRASHED.")
+            return rd_models.ServiceStatuses.CRASHED
+        if state == "stopped":
+            LOG.info("Service Status is SHUTDOWN.")
+            return rd_models.ServiceStatuses.SHUTDOWN
+        return self._get_status_from_commands()
+
+    def _get_status_from_commands(self):
         global MYSQLD_ARGS
         try:
             out, err = utils.execute_with_timeout(
@@ -231,20 +425,75 @@ class MySqlAppStatus(object):
 
     def set_status(self, status):
         """Changes the status of the MySQL app in the database."""
-        db_status = self._load_status()
-        db_status.set_status(status)
-        db_status.save()
+        if CONF.guest_status_via_conductor:
+            conductor_api.API().update_status(CONF.guest_id, status.code)
+        else:
+            db_status = self._load_status()
+            db_status.set_status(status)
+            db_status.save()
         self.status = status
+        self.last_reported = time.time()
+        REPORT_COUNTERS.writes += 1
 
-    def update(self):
+    def _heartbeat(self):
+        """Touches the updated_at of the status without loading it.
+
+        The touch only matches the row if it still holds our status; if
+        something else changed it, the status is written again instead.
+        """
+        if CONF.guest_status_via_conductor:
+            conductor_api.API().heartbeat(CONF.guest_id, self.status.code)
+        else:
+            touched = rd_models.InstanceServiceStatus.find_all(
+                instance_id=CONF.guest_id,
+                status_id=self.status.code).update(updated_at=utils.utcnow())
+            if not touched:
+                self.set_status(self.status)
+                return
+        self.last_reported = time.time()
+        REPORT_COUNTERS.heartbeats += 1
+
+    def _is_status_stored(self, status):
+        """Whether the database still holds status.
+
+        The taskmanager sets the status to PAUSED behind our back during
+        resizes and reboots and waits for us to overwrite it. Through the
+        conductor the guest can't look; the taskmanager then asks it to
+        report again through the report_status call instead.
+        """
+        if CONF.guest_status_via_conductor:
+            return True
+        return self._load_status().status_id == status.code
+
+    def report_status(self, status):
+        """Writes the status to the database only if it has changed.
+
+        An unchanged status is touched once every
+        guest_status_heartbeat_interval seconds instead, so the database
+        still shows the agent is alive.
+        """
+        if not status == self.status or not self._is_status_stored(status):
+            self.set_status(status)
+        elif (self.last_reported is None or
+              time.time() - self.last_reported >=
+              CONF.guest_status_heartbeat_interval):
+            self._heartbeat()
+        else:
+            REPORT_COUNTERS.skipped += 1
+
+    def update(self, force=False):
         """Find and report status of MySQL on this machine.
 
-        The database is update and the status is also returned.
+        The database is update and the status is also returned. With force
+        set the status is written even if it hasn't changed.
         """
         if self.is_mysql_installed and not self._is_mysql_restarting:
             LOG.info("Determining status of MySQL app...")
             status = self._get_actual_db_status()
-            self.set_status(status)
+            if force:
+                self.set_status(status)
+            else:
+                self.report_status(status)
         else:
             LOG.info("MySQL is not installed or is in restart mode, so for "
                      "now we'll skip determining the status of MySQL on this "
@@ -257,21 +506,28 @@ class MySqlAppStatus(object):
         specified. Does not update the publicly viewable status Unless
         "update_db" is True.
         """
-        WAIT_TIME = 3
-        waited_time = 0
-        while(waited_time < max_time):
-            time.sleep(WAIT_TIME)
-            waited_time += WAIT_TIME
-            LOG.info("Waiting for MySQL status to change to %s..." % status)
-            actual_status = self._get_actual_db_status()
-            LOG.info("MySQL status was %s after %d seconds."
-                     % (actual_status, waited_time))
-            if actual_status == status:
-                if update_db:
-                    self.set_status(actual_status)
-                return True
-        LOG.error("Time out while waiting for MySQL app status to change!")
-        return False
+        def status_has_changed(actual_status):
+            LOG.info("MySQL status was %s while waiting for %s."
+                     % (actual_status, status))
+            return actual_status == status
+
+        try:
+            utils.poll_until(self._get_actual_db_status, status_has_changed,
+                             sleep_time=3, time_out=max_time,
+                             name="wait_for_real_status")
+        except PollTimeOut:
+            LOG.error("Time out while waiting for MySQL app status to change!")
+            return False
+        if update_db:
+            self.set_status(status)
+        return True
+
+
+def _escape_like(value):
+    """Escapes the wildcards of a LIKE pattern."""
+    for char in ('\\', '%', '_'):
+        value = value.replace(char, '\\' + char)
+    return value
 
 
 class LocalSqlClient(object):
@@ -387,7 +643,7 @@ class MySqlAdmin(object):
 
     def is_root_enabled(self):
         """Return True if root access is enabled; False otherwise."""
-        client = LocalSqlClient(get_engine())
+        client = LocalSqlClient(get_engine(), use_flush=False)
         with client:
             mysql_user = models.MySQLUser()
             t = text("""SELECT User FROM mysql.user where User = 'root'
@@ -400,7 +656,7 @@ class MySqlAdmin(object):
         """List databases the user created on this mysql instance"""
         LOG.debug(_("---Listing Databases---"))
         databases = []
-        client = LocalSqlClient(get_engine())
+        client = LocalSqlClient(get_engine(), use_flush=False)
         with client:
             # If you have an external volume mounted at /var/lib/mysql
             # the lost+found directory will show up in mysql as a database
@@ -421,11 +677,10 @@ class MySqlAdmin(object):
             if limit:
                 q.limit = limit + 1
             if marker:
-                q.where.append("schema_name %s '%s'" %
+                q.where.append("schema_name %s %s" %
                                (INCLUDE_MARKER_OPERATORS[include_marker],
-                                marker))
-            t = text(str(q))
-            database_names = client.execute(t)
+                                q.bind('marker', marker)))
+            database_names = client.execute(q.statement(), **q.params)
             next_marker = None
             LOG.debug(_("database_names = %r") % database_names)
             for count, database in enumerate(database_names):
@@ -443,11 +698,60 @@ class MySqlAdmin(object):
             next_marker = None
         return databases, next_marker
 
+    def _existing_names(self, column, table, names, where=None):
+        """Returns which of names are in the column, with a single query."""
+        if not names:
+            return []
+        q = Query()
+        q.columns = ['DISTINCT %s' % column]
+        q.tables = [table]
+        q.where = (where or []) + [
+            "%s IN (%s)" % (column, q.bind_list('name', names))]
+        # Nothing is changed, so there's no need to flush privileges.
+        client = LocalSqlClient(get_engine(), use_flush=False)
+        with client:
+            result = client.execute(q.statement(), **q.params)
+            return [row[0] for row in result]
+
+    def users_exist(self, names):
+        """Returns the names of the given users which already exist"""
+        return self._existing_names('User', 'mysql.user', names,
+                                    where=["host != 'localhost'"])
+
+    def databases_exist(self, names):
+        """Returns the names of the given databases which already exist"""
+        return self._existing_names('schema_name',
+                                    'information_schema.schemata', names)
+
+    def _user_databases(self, client, names):
+        """Returns the databases each of the users has privileges on.
+
+        A single query fetches the grants of all the users, which are then
+        grouped by user name.
+        """
+        grants = {}
+        if not names:
+            return grants
+        q = Query()
+        q.columns = ['grantee', 'table_schema']
+        q.tables = ['information_schema.SCHEMA_PRIVILEGES']
+        q.where = ["(%s)" % " OR ".join(
+            "grantee LIKE %s" % q.bind("grantee%d" % index,
+                                       "'%s'@%%" % _escape_like(name))
+            for index, name in enumerate(sorted(set(names))))]
+        q.group = ['grantee', 'table_schema']
+        for db in client.execute(q.statement(), **q.params):
+            matches = re.match("^'(.+)'@", db['grantee'])
+            if matches is not None:
+                grants.setdefault(matches.group(1), []).append(
+                    db['table_schema'])
+        return grants
+
     def list_users(self, limit=None, marker=None, include_marker=False):
         """List users that have access to the database"""
         LOG.debug(_("---Listing Users---"))
         users = []
-        client = LocalSqlClient(get_engine())
+        client = LocalSqlClient(get_engine(), use_flush=False)
         with client:
             mysql_user = models.MySQLUser()
             q = Query()
@@ -456,15 +760,15 @@ class MySqlAdmin(object):
             q.where = ["host != 'localhost'"]
             q.order = ['User']
             if marker:
-                q.where.append("User %s '%s'" %
+                q.where.append("User %s %s" %
                                (INCLUDE_MARKER_OPERATORS[include_marker],
-                                marker))
+                                q.bind('marker', marker)))
             if limit:
                 q.limit = limit + 1
-            t = text(str(q))
-            result = client.execute(t)
+            result = client.execute(q.statement(), **q.params)
             next_marker = None
             LOG.debug("result = " + str(result))
+            page = []
             for count, row in enumerate(result):
                 if count >= limit:
                     break
@@ -472,20 +776,15 @@ class MySqlAdmin(object):
                 mysql_user = models.MySQLUser()
                 mysql_user.name = row['User']
                 next_marker = row['User']
-                # Now get the databases
-                q = Query()
-                q.columns = ['grantee', 'table_schema']
-                q.tables = ['information_schema.SCHEMA_PRIVILEGES']
-                q.group = ['grantee', 'table_schema']
-                t = text(str(q))
-                db_result = client.execute(t)
-                for db in db_result:
-                    matches = re.match("^'(.+)'@", db['grantee'])
-                    if (matches is not None and
-                            matches.group(1) == mysql_user.name):
-                        mysql_db = models.MySQLDatabase()
-                        mysql_db.name = db['table_schema']
-                        mysql_user.databases.append(mysql_db.serialize())
+                page.append(mysql_user)
+            # Now get the databases of the whole page at once
+            grants = self._user_databases(client,
+                                          [user.name for user in page])
+            for mysql_user in page:
+                for schema in grants.get(mysql_user.name, []):
+                    mysql_db = models.MySQLDatabase()
+                    mysql_db.name = schema
+                    mysql_user.databases.append(mysql_db.serialize())
                 users.append(mysql_user.serialize())
         if result.rowcount <= limit:
             next_marker = None
@@ -561,7 +860,10 @@ class MySqlApp(object):
         LOG.info(_("Generating root password..."))
         admin_password = generate_random_password()
 
-        engine = create_engine("mysql://root:@localhost:3306", echo=True)
+        # The root account loses its access below, so its connection is
+        # not worth keeping in a pool.
+        engine = create_engine("mysql://root:@localhost:3306",
+                               poolclass=NullPool, echo=CONF.sql_query_log)
         client = LocalSqlClient(engine)
         with client:
             self._generate_root_password(client)
@@ -15,6 +15,10 @@ class Manager(periodic_task.PeriodicTasks):
         """Update the status of the MySQL service"""
         dbaas.MySqlAppStatus.get().update()
 
+    def report_status(self, context):
+        """Reports the status of the MySQL service even if unchanged"""
+        dbaas.MySqlAppStatus.get().update(force=True)
+
     def create_database(self, context, databases):
         return dbaas.MySqlAdmin().create_database(databases)
 
@@ -37,6 +41,18 @@ class Manager(periodic_task.PeriodicTasks):
         return dbaas.MySqlAdmin().list_users(limit, marker,
                                              include_marker)
 
+    def users_exist(self, context, names):
+        return dbaas.MySqlAdmin().users_exist(names)
+
+    def databases_exist(self, context, names):
+        return dbaas.MySqlAdmin().databases_exist(names)
+
+    def get_pool_stats(self, context):
+        return dbaas.get_pool_stats()
+
+    def get_status_report_stats(self, context):
+        return dbaas.get_status_report_stats()
+
     def enable_root(self, context):
         return dbaas.MySqlAdmin().enable_root()
 
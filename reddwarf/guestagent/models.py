@@ -12,12 +12,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from datetime import datetime
 from datetime import timedelta
 
 from reddwarf.common import cfg
 from reddwarf.common import exception
 from reddwarf.common import utils
+from reddwarf import db
 from reddwarf.db import get_db_api
 from reddwarf.db import models as dbmodels
 from reddwarf.openstack.common import log as logging
@@ -62,5 +62,51 @@ class AgentHeartBeat(dbmodels.DatabaseModelBase):
 
     @staticmethod
     def is_active(agent):
-        return (datetime.now() - agent.updated_at <
+        # Heartbeats are saved with utcnow.
+        return (utils.utcnow() - agent.updated_at <
                 timedelta(seconds=AGENT_HEARTBEAT))
+
+    @classmethod
+    def find_active_instance_ids(cls, instance_ids):
+        """Returns the set of instance_ids whose agent is alive.
+
+        Uses one query however many instances there are (up to the chunk
+        size of find_all_in), so a caller can skip the dead guests of a
+        whole page instead of timing out on each.
+        """
+        if not instance_ids:
+            return set()
+        since = utils.utcnow() - timedelta(seconds=AGENT_HEARTBEAT)
+        return set(get_db_api().find_values_in(
+            cls, 'instance_id', instance_ids, time_field='updated_at',
+            since=since))
+
+    @classmethod
+    def touch_all(cls, instance_ids):
+        """Marks the agents of instance_ids alive, creating missing rows.
+
+        One UPDATE refreshes the existing heartbeats; the rows which are
+        missing are found with one query and inserted in one flush. Another
+        conductor may insert some of them first, in which case the rest are
+        inserted one by one and the ones which now exist are skipped.
+        """
+        if not instance_ids:
+            return
+        now = utils.utcnow()
+        cls.update_all_in('instance_id', instance_ids, {'updated_at': now})
+        existing = set(get_db_api().find_values_in(cls, 'instance_id',
+                                                   instance_ids))
+        missing = set(instance_ids) - existing
+        if not missing:
+            return
+        try:
+            with db.transaction():
+                for instance_id in missing:
+                    cls.create(instance_id=instance_id)
+        except exception.DBConstraintError:
+            for instance_id in missing:
+                try:
+                    cls.create(instance_id=instance_id)
+                except exception.DBConstraintError:
+                    # Created concurrently, so it was just touched too.
+                    pass
@@ -21,17 +21,79 @@ Intermediary class for building SQL queries for use by the guest agent.
 
 """
 
+from sqlalchemy.sql.expression import text
+
+
+# How many statement templates are kept by statement().
+STATEMENT_CACHE_SIZE = 64
+
+
+class StatementCache(object):
+    """Keeps the text() clauses of the most recently used statements.
+
+    A dict plus a list of its keys, oldest first, rather than an
+    OrderedDict, which the Python 2.6 guest images lack.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or STATEMENT_CACHE_SIZE
+        self._statements = {}
+        self._order = []
+
+    def __len__(self):
+        return len(self._statements)
+
+    def get(self, sql):
+        """Returns the text() clause of sql, reusing the recent ones."""
+        statement = self._statements.get(sql)
+        if statement is None:
+            statement = text(sql)
+            if len(self._order) >= self.size:
+                del self._statements[self._order.pop(0)]
+            self._statements[sql] = statement
+        else:
+            self._order.remove(sql)
+        self._order.append(sql)
+        return statement
+
+
+_statements = StatementCache()
+
 
 class Query(object):
 
     def __init__(self, columns=None, tables=None, where=None, order=None,
-                 group=None, limit=None):
+                 group=None, limit=None, params=None):
         self.columns = columns or []
         self.tables = tables or []
         self.where = where or []
         self.order = order or []
         self.group = group or []
         self.limit = limit
+        self.params = params or {}
+
+    def bind(self, name, value):
+        """Binds value to a parameter and returns its placeholder.
+
+        The value is sent separately from the SQL, so it never needs to be
+        quoted, and queries which differ only in their values share one
+        statement.
+        """
+        self.params[name] = value
+        return ":%s" % name
+
+    def bind_list(self, prefix, values):
+        """Binds every value and returns the placeholders, comma separated."""
+        return ', '.join(self.bind("%s%d" % (prefix, index), value)
+                         for index, value in enumerate(values))
+
+    def statement(self):
+        """Returns the query as a text() clause for execution with params.
+
+        The clause only depends on the shape of the query, so it is cached
+        and reused by later queries of the same shape.
+        """
+        return _statements.get(str(self))
 
     @property
     def _columns(self):
@@ -18,6 +18,7 @@
 """Model classes that form the core of instances functionality."""
 
 import eventlet
+import json
 import netaddr
 
 from datetime import datetime
@@ -29,9 +30,12 @@ from reddwarf.common.remote import create_dns_client
 from reddwarf.common.remote import create_guest_client
 from reddwarf.common.remote import create_nova_client
 from reddwarf.common.remote import create_nova_volume_client
+from reddwarf import db
 from reddwarf.db import models as dbmodels
 from reddwarf.instance.tasks import InstanceTask
 from reddwarf.instance.tasks import InstanceTasks
+from reddwarf.instance.status_cache import CachedServer
+from reddwarf.instance.status_cache import ServerStatusCache
 from reddwarf.guestagent import models as agent_models
 from reddwarf.taskmanager import api as task_api
 from reddwarf.openstack.common import log as logging
@@ -59,6 +63,48 @@ def load_server(context, instance_id, server_id):
     return server
 
 
+def load_servers_by_ids(context, server_ids):
+    """Loads the given servers from Nova, skipping any which are gone.
+
+    Servers found in the status cache aren't requested at all. Nova has no
+    filter for a list of ids, so each remaining server is fetched with its
+    own GET, run concurrently on a small green pool. Every green thread gets
+    its own client as the underlying http connection can't be shared.
+    Any other Nova error fails the whole listing, as it did when every
+    server was listed at once.
+    """
+    cache = ServerStatusCache.get()
+    servers = []
+    if cache.is_enabled():
+        missing_ids = []
+        for server_id in server_ids:
+            cached = cache.find(server_id)
+            if cached is None:
+                missing_ids.append(server_id)
+            else:
+                servers.append(cached)
+        server_ids = missing_ids
+
+    def get_server(server_id):
+        client = create_nova_client(context)
+        try:
+            server = client.servers.get(server_id)
+        except nova_exceptions.NotFound:
+            LOG.debug("Could not find nova server_id(%s)" % server_id)
+            return None
+        except nova_exceptions.ClientException, e:
+            raise exception.ReddwarfError(str(e))
+        if cache.is_enabled():
+            cache.put(server)
+        return server
+
+    if server_ids:
+        pool = eventlet.GreenPool(CONF.nova_server_load_pool_size)
+        servers += [server for server in pool.imap(get_server, server_ids)
+                    if server is not None]
+    return servers
+
+
 class InstanceStatus(object):
 
     ACTIVE = "ACTIVE"
@@ -76,15 +122,27 @@ def load_simple_instance_server_status(context, db_info):
     if 'BUILDING' == db_info.task_status.action:
         db_info.server_status = "BUILD"
         db_info.addresses = {}
-    else:
-        client = create_nova_client(context)
-        try:
-            server = client.servers.get(db_info.compute_instance_id)
-            db_info.server_status = server.status
-            db_info.addresses = server.addresses
-        except nova_exceptions.NotFound, e:
-            db_info.server_status = "SHUTDOWN"
-            db_info.addresses = {}
+        return
+    if CONF.server_status_from_notifications and db_info.server_status:
+        db_info.addresses = db_info.get_server_addresses()
+        return
+    cache = ServerStatusCache.get()
+    if cache.is_enabled():
+        cached = cache.find(db_info.compute_instance_id)
+        if cached is not None:
+            db_info.server_status = cached.status
+            db_info.addresses = cached.addresses
+            return
+    client = create_nova_client(context)
+    try:
+        server = client.servers.get(db_info.compute_instance_id)
+        db_info.server_status = server.status
+        db_info.addresses = server.addresses
+        if cache.is_enabled():
+            cache.put(server)
+    except nova_exceptions.NotFound, e:
+        db_info.server_status = "SHUTDOWN"
+        db_info.addresses = {}
 
 
 # If the compute server is in any of these states we can't perform any
@@ -339,8 +397,10 @@ class BaseInstance(SimpleInstance):
         except Exception as ex:
             LOG.warn(ex)
         time_now = datetime.now()
-        self.update_db(deleted=True, deleted_at=time_now,
-                       task_status=InstanceTasks.NONE)
+        with db.transaction():
+            self.update_db(deleted=True, deleted_at=time_now,
+                           task_status=InstanceTasks.NONE)
+            TenantUsage.release_instance(self.tenant_id)
 
     @property
     def guest(self):
@@ -355,10 +415,30 @@ class BaseInstance(SimpleInstance):
         return self._nova_client
 
     def update_db(self, **values):
-        self.db_info = DBInstance.find_by(id=self.id, deleted=False)
+        """Writes values to the instance row.
+
+        This is a single UPDATE which only applies while the row still has
+        the task this instance was loaded with. If someone changed the task
+        meanwhile, or deleted the instance, nothing is written and False is
+        returned.
+        """
+        columns = dict(values)
+        if 'task_status' in columns:
+            task_status = columns.pop('task_status')
+            columns['task_id'] = task_status.code
+            columns['task_description'] = task_status.db_text
+        columns['updated'] = utils.utcnow()
+        updated = DBInstance.find_all(id=self.id, deleted=False,
+                                      task_id=self.db_info.task_id
+                                      ).update(**columns)
+        if not updated:
+            LOG.warn(_("Task of instance %s changed from %s, not writing "
+                       "%s.") % (self.id, self.db_info.task_id, values))
+            return False
+        self.db_info.updated = columns['updated']
         for key in values:
             setattr(self.db_info, key, values[key])
-        self.db_info.save()
+        return True
 
     @property
     def volume_client(self):
@@ -395,29 +475,38 @@ class Instance(BuiltInstance):
     @classmethod
     def create(cls, context, name, flavor_id, image_id,
                databases, users, service_type, volume_size):
-        client = create_nova_client(context)
+        instance_max = CONF.max_instances_per_user
+        if not TenantUsage.reserve_instance(context.tenant, instance_max):
+            # That's too many, pal. Got to cut you off.
+            LOG.error(_("New instance would exceed user instance quota."))
+            msg = "User instance quota of %d would be exceeded."
+            raise exception.QuotaExceeded(msg % instance_max)
         try:
-            flavor = client.flavors.get(flavor_id)
-        except nova_exceptions.NotFound:
-            raise exception.FlavorNotFound(uuid=flavor_id)
-
-        db_info = DBInstance.create(name=name, flavor_id=flavor_id,
-                                    tenant_id=context.tenant,
-                                    volume_size=volume_size,
-                                    task_status=InstanceTasks.BUILDING)
+            client = create_nova_client(context)
+            try:
+                flavor = client.flavors.get(flavor_id)
+            except nova_exceptions.NotFound:
+                raise exception.FlavorNotFound(uuid=flavor_id)
+
+            with db.transaction():
+                db_info = DBInstance.create(
+                    name=name, flavor_id=flavor_id, tenant_id=context.tenant,
+                    volume_size=volume_size,
+                    task_status=InstanceTasks.BUILDING)
+                service_status = InstanceServiceStatus.create(
+                    instance_id=db_info.id,
+                    status=ServiceStatuses.NEW)
+                if CONF.reddwarf_dns_support:
+                    dns_client = create_dns_client(context)
+                    hostname = dns_client.determine_hostname(db_info.id)
+                    db_info.hostname = hostname
+                    db_info.save()
+        except Exception:
+            TenantUsage.release_instance(context.tenant)
+            raise
         LOG.debug(_("Tenant %s created new Reddwarf instance %s...")
                   % (context.tenant, db_info.id))
 
-        service_status = InstanceServiceStatus.create(
-            instance_id=db_info.id,
-            status=ServiceStatuses.NEW)
-
-        if CONF.reddwarf_dns_support:
-            dns_client = create_dns_client(context)
-            hostname = dns_client.determine_hostname(db_info.id)
-            db_info.hostname = hostname
-            db_info.save()
-
         task_api.API(context).create_instance(db_info.id, name, flavor_id,
                                               flavor.ram, image_id, databases,
                                               users, service_type,
@@ -506,10 +595,23 @@ class Instance(BuiltInstance):
         raise exception.UnprocessableEntity(msg)
 
 
-def create_server_list_matcher(server_list):
-    # Returns a method which finds a server from the given list.
-    def find_server(instance_id, server_id):
-        matches = [server for server in server_list if server.id == server_id]
+class ServerListMatcher(object):
+    """Finds servers from a list of servers by their id.
+
+    The list is indexed once when the matcher is created so each lookup is a
+    dictionary access rather than a scan of every server.
+    """
+
+    def __init__(self, server_list):
+        self._servers = {}
+        for server in server_list:
+            self._servers.setdefault(server.id, []).append(server)
+
+    def __call__(self, instance_id, server_id):
+        return self.find_server(instance_id, server_id)
+
+    def find_server(self, instance_id, server_id):
+        matches = self._servers.get(server_id, [])
         if len(matches) == 1:
             return matches[0]
         elif len(matches) < 1:
@@ -523,7 +625,11 @@ def create_server_list_matcher(server_list):
             LOG.error(_("Server %s for instance %s was found twice!") %
                       (server_id, instance_id))
             raise exception.ReddwarfError(uuid=instance_id)
-    return find_server
+
+
+def create_server_list_matcher(server_list):
+    # Returns a method which finds a server from the given list.
+    return ServerListMatcher(server_list)
 
 
 class Instances(object):
@@ -538,22 +644,32 @@ class Instances(object):
 
         if context is None:
             raise TypeError("Argument context not defined.")
-        client = create_nova_client(context)
-        servers = client.servers.list()
-
         db_infos = DBInstance.find_all(tenant_id=context.tenant, deleted=False)
         limit = int(context.limit or Instances.DEFAULT_LIMIT)
         if limit > Instances.DEFAULT_LIMIT:
             limit = Instances.DEFAULT_LIMIT
         data_view = DBInstance.find_by_pagination('instances', db_infos, "foo",
                                                   limit=limit,
-                                                  marker=context.marker)
+                                                  marker=context.marker,
+                                                  sort_keys=['created', 'id'])
         next_marker = data_view.next_page_marker
 
+        # Only the servers backing this page are fetched from Nova, and
+        # not even those if notifications already told us their status.
+        servers = []
+        server_ids = []
+        for db in data_view.collection:
+            if (not db.compute_instance_id or
+                    InstanceTasks.BUILDING == db.task_status):
+                continue
+            if CONF.server_status_from_notifications and db.server_status:
+                servers.append(CachedServer(db.compute_instance_id,
+                                            db.server_status,
+                                            db.get_server_addresses()))
+            else:
+                server_ids.append(db.compute_instance_id)
+        servers += load_servers_by_ids(context, server_ids)
         find_server = create_server_list_matcher(servers)
-        for db in db_infos:
-            LOG.debug("checking for db [id=%s, compute_instance_id=%s]" %
-                      (db.id, db.compute_instance_id))
         ret = Instances._load_servers_status(load_simple_instance, context,
                                              data_view.collection,
                                              find_server)
@@ -562,6 +678,9 @@ class Instances(object):
     @staticmethod
     def _load_servers_status(load_instance, context, db_items, find_server):
         ret = []
+        db_items = [db for db in db_items]
+        statuses = InstanceServiceStatus.find_all_by_instance_ids(
+            [db.id for db in db_items])
         for db in db_items:
             server = None
             try:
@@ -577,7 +696,10 @@ class Instances(object):
                 #TODO(tim.simpson): End of hack.
 
                 #volumes = find_volumes(server.id)
-                status = InstanceServiceStatus.find_by(instance_id=db.id)
+                status = statuses.get(db.id)
+                if status is None:
+                    raise exception.ModelNotFoundError(
+                        _("InstanceServiceStatus Not Found"))
                 LOG.info(_("Server api_status(%s)") %
                          (status.status.api_status))
                 if not status.status:  # This should never happen.
@@ -623,6 +745,17 @@ class DBInstance(dbmodels.DatabaseModelBase):
 
     task_status = property(get_task_status, set_task_status)
 
+    def get_server_addresses(self):
+        """The addresses last stored from a Nova notification."""
+        addresses = getattr(self, 'server_addresses', None)
+        if not addresses:
+            return {}
+        return json.loads(addresses)
+
+    @staticmethod
+    def dump_addresses(addresses):
+        return json.dumps(addresses)
+
 
 class ServiceImage(dbmodels.DatabaseModelBase):
     """Defines the status of the service being run."""
@@ -655,12 +788,64 @@ class InstanceServiceStatus(dbmodels.DatabaseModelBase):
 
     status = property(get_status, set_status)
 
+    def save(self):
+        self['updated_at'] = utils.utcnow()
+        return super(InstanceServiceStatus, self).save()
+
+    @classmethod
+    def find_all_by_instance_ids(cls, instance_ids):
+        """Loads the statuses of many instances in a single query.
+
+        Returns a dict keyed by instance id; instances without a status row
+        are simply absent from it.
+        """
+        statuses = cls.find_all_in('instance_id', instance_ids)
+        return dict((status.instance_id, status) for status in statuses)
+
+
+class TenantUsage(dbmodels.DatabaseModelBase):
+    """Counts the instances of a tenant which aren't deleted.
+
+    The counter is changed with a single conditional UPDATE, so checking
+    the quota doesn't need to count the tenant's instances.
+    """
+
+    _data_fields = ['tenant_id', 'instances']
+
+    @classmethod
+    def reserve_instance(cls, tenant_id, max_instances):
+        """Counts one more instance unless it would exceed max_instances.
+
+        Returns False if the tenant already has max_instances instances.
+        """
+        if cls._add_instances(tenant_id, 1, maximum=max_instances):
+            return True
+        if cls.get_by(tenant_id=tenant_id) is not None:
+            return False
+        try:
+            cls.create(tenant_id=tenant_id, instances=0)
+        except exception.DBConstraintError:
+            # Another request created the row first, which is fine.
+            pass
+        return bool(cls._add_instances(tenant_id, 1, maximum=max_instances))
+
+    @classmethod
+    def release_instance(cls, tenant_id):
+        """Stops counting an instance of the tenant."""
+        cls._add_instances(tenant_id, -1, minimum=0)
+
+    @classmethod
+    def _add_instances(cls, tenant_id, amount, maximum=None, minimum=None):
+        return cls.find_all(tenant_id=tenant_id).increment(
+            'instances', amount, maximum=maximum, minimum=minimum)
+
 
 def persisted_models():
     return {
         'instance': DBInstance,
         'service_image': ServiceImage,
         'service_statuses': InstanceServiceStatus,
+        'tenant_usage': TenantUsage,
     }
 
 
@@ -0,0 +1,162 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Keeps the server status of instances up to date from Nova notifications.
+
+Nova publishes a compute.instance.* notification every time a server changes
+state. The consumer here writes the resulting status and IP addresses into
+the instances table, so the API can show instances without asking Nova.
+"""
+
+from reddwarf.common import cfg
+from reddwarf.instance.models import DBInstance
+from reddwarf.openstack.common import log as logging
+from reddwarf.openstack.common import rpc
+from reddwarf.openstack.common import service
+from reddwarf.openstack.common.gettextutils import _
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+EVENT_PREFIX = "compute.instance."
+
+# Events after which the server is gone; the load paths fake those servers
+# as SHUTDOWN too.
+DELETED_EVENTS = ["compute.instance.delete.end"]
+
+# Maps the Nova vm_state of a server to the status shown by its API.
+VM_STATE_TO_STATUS = {
+    'active': "ACTIVE",
+    'building': "BUILD",
+    'stopped': "SHUTOFF",
+    'resized': "VERIFY_RESIZE",
+    'paused': "PAUSED",
+    'suspended': "SUSPENDED",
+    'rescued': "RESCUE",
+    'error': "ERROR",
+    'deleted': "SHUTDOWN",
+    'soft-delete': "SHUTDOWN",
+}
+
+# A server which is active but busy with one of these tasks is reported
+# with a status of its own.
+TASK_STATE_TO_STATUS = {
+    'rebooting': "REBOOT",
+    'rebooting_hard': "HARD_REBOOT",
+    'rebuilding': "REBUILD",
+    'resize_prep': "RESIZE",
+    'resize_migrating': "RESIZE",
+    'resize_migrated': "RESIZE",
+    'resize_finish': "RESIZE",
+    'resize_reverting': "REVERT_RESIZE",
+}
+
+
+def server_status_from_payload(event_type, payload):
+    """Works out the status Nova would show for the notified server."""
+    if event_type in DELETED_EVENTS:
+        return "SHUTDOWN"
+    vm_state = payload.get('state')
+    task_state = payload.get('new_task_state',
+                             payload.get('state_description'))
+    if vm_state == 'active' and task_state in TASK_STATE_TO_STATUS:
+        return TASK_STATE_TO_STATUS[task_state]
+    return VM_STATE_TO_STATUS.get(vm_state)
+
+
+def addresses_from_payload(payload):
+    """Converts the fixed_ips of a payload to the Nova addresses format.
+
+    Returns None if the payload doesn't mention IPs at all.
+    """
+    fixed_ips = payload.get('fixed_ips')
+    if fixed_ips is None:
+        return None
+    addresses = {}
+    for ip in fixed_ips:
+        label = ip.get('label', 'private')
+        addresses.setdefault(label, []).append({
+            'addr': ip.get('address'),
+            'version': ip.get('version', 4),
+        })
+    return addresses
+
+
+class NovaNotificationConsumer(object):
+    """Writes the server status from Nova notifications to the instances."""
+
+    def process_notification(self, message):
+        event_type = message.get('event_type', '')
+        if not event_type.startswith(EVENT_PREFIX):
+            return
+        payload = message.get('payload', {})
+        server_id = payload.get('instance_id')
+        if not server_id:
+            LOG.warn(_("Notification %s has no instance_id.") % event_type)
+            return
+        values = {}
+        status = server_status_from_payload(event_type, payload)
+        if status is not None:
+            values['server_status'] = status
+        addresses = addresses_from_payload(payload)
+        if addresses is not None:
+            values['server_addresses'] = DBInstance.dump_addresses(addresses)
+        if not values:
+            return
+        LOG.debug(_("Server %s changed after %s: %s")
+                  % (server_id, event_type, values))
+        # A targeted UPDATE; loading and saving the whole row could undo a
+        # task status written by the API or the taskmanager meanwhile.
+        DBInstance.find_all(compute_instance_id=server_id,
+                            deleted=False).update(**values)
+
+
+class NotificationService(service.Service):
+    """Consumes the notifications Nova publishes on its control exchange."""
+
+    def __init__(self, consumer=None, connection_factory=None):
+        super(NotificationService, self).__init__()
+        self.consumer = consumer or NovaNotificationConsumer()
+        self.connection_factory = (connection_factory or
+                                   (lambda: rpc.create_connection(new=True)))
+        self.conn = None
+        self.consumer_thread = None
+
+    def start(self):
+        super(NotificationService, self).start()
+        topic = CONF.nova_notification_topic
+        LOG.info(_("Consuming Nova notifications from %s.") % topic)
+        self.conn = self.connection_factory()
+        self.conn.declare_topic_consumer(
+            topic,
+            callback=self.consumer.process_notification,
+            queue_name=CONF.notification_queue,
+            exchange_name=CONF.nova_control_exchange)
+        self.consumer_thread = self.conn.consume_in_thread()
+
+    def stop(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        super(NotificationService, self).stop()
+
+    def wait(self):
+        if self.consumer_thread is not None:
+            self.consumer_thread.wait()
+        super(NotificationService, self).wait()
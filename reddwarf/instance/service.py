@@ -189,16 +189,6 @@ class InstanceController(wsgi.Controller):
         else:
             volume_size = None
 
-        instance_max = CONF.max_instances_per_user
-        number_instances = models.DBInstance.find_all(tenant_id=tenant_id,
-                                                      deleted=False).count()
-
-        if number_instances >= instance_max:
-            # That's too many, pal. Got to cut you off.
-            LOG.error(_("New instance would exceed user instance quota."))
-            msg = "User instance quota of %d would be exceeded."
-            raise exception.QuotaExceeded(msg % instance_max)
-
         instance = models.Instance.create(context, name, flavor_id,
                                           image_id, databases, users,
                                           service_type, volume_size)
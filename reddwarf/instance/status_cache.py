@@ -0,0 +1,143 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Caches the Nova status and addresses of servers for the API read path.
+
+The cache is filled by a periodic sweep which lists the servers of all
+tenants as the proxy admin, a page at a time, so showing or listing
+instances doesn't need to ask Nova about every server on every request.
+No user token is kept for it. Entries older than
+server_status_cache_max_age are ignored and the caller goes to Nova.
+"""
+
+import time
+
+from reddwarf.common import cfg
+from reddwarf.common.remote import create_admin_nova_client
+from reddwarf.openstack.common import log as logging
+from reddwarf.openstack.common import loopingcall
+from reddwarf.openstack.common.gettextutils import _
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+
+class CachedServer(object):
+    """The parts of a Nova server the API shows, plus when they were seen."""
+
+    def __init__(self, id, status, addresses, updated=None):
+        self.id = id
+        self.status = status
+        self.addresses = addresses
+        self.updated = updated or time.time()
+
+    @property
+    def age(self):
+        return time.time() - self.updated
+
+    @staticmethod
+    def from_server(server):
+        return CachedServer(server.id, server.status, server.addresses)
+
+
+class ServerStatusCache(object):
+    """Holds the last known status of servers, keyed by server id."""
+
+    _instance = None
+
+    def __init__(self):
+        self._servers = {}
+        self._poller = None
+
+    @classmethod
+    def get(cls):
+        if not cls._instance:
+            cls._instance = ServerStatusCache()
+        return cls._instance
+
+    @staticmethod
+    def is_enabled():
+        return CONF.server_status_cache_enabled
+
+    def find(self, server_id):
+        """Returns the cached server if it is fresh enough, else None."""
+        cached = self._servers.get(server_id)
+        if cached is None:
+            return None
+        if cached.age > CONF.server_status_cache_max_age:
+            LOG.debug("Cached status of server %s is stale." % server_id)
+            return None
+        return cached
+
+    def put(self, server):
+        cached = CachedServer.from_server(server)
+        self._servers[cached.id] = cached
+        return cached
+
+    def remove(self, server_id):
+        self._servers.pop(server_id, None)
+
+    def refresh_all(self):
+        """Caches the servers of every tenant; returns how many there were.
+
+        Nova cuts each list off at osapi_max_limit, so the listing goes on
+        from the last server seen until a page comes back empty.
+        """
+        client = create_admin_nova_client()
+        count = 0
+        marker = None
+        while True:
+            search_opts = {'all_tenants': 1}
+            if marker is not None:
+                search_opts['marker'] = marker
+            servers = client.servers.list(search_opts=search_opts)
+            if not servers or servers[-1].id == marker:
+                return count
+            for server in servers:
+                self.put(server)
+            count += len(servers)
+            marker = servers[-1].id
+
+    def refresh(self):
+        """Sweeps the servers of all tenants."""
+        try:
+            count = self.refresh_all()
+            LOG.debug("Refreshed the status of %d servers." % count)
+        except Exception as ex:
+            # The entries go stale and reads fall back to Nova until a
+            # sweep works again.
+            LOG.warn(_("Could not refresh the server status cache: %s")
+                     % ex)
+        # Forget servers nobody has refreshed for a while.
+        expired = [server_id for server_id, cached in self._servers.items()
+                   if cached.age > CONF.server_status_cache_max_age * 2]
+        for server_id in expired:
+            self.remove(server_id)
+
+    def start_polling(self):
+        if self._poller is None:
+            interval = CONF.server_status_cache_refresh_interval
+            LOG.info(_("Refreshing server status cache every %d seconds.")
+                     % interval)
+            self._poller = loopingcall.LoopingCall(self.refresh)
+            self._poller.start(interval, initial_delay=interval)
+
+    def stop_polling(self):
+        if self._poller is not None:
+            self._poller.stop()
+            self._poller = None
@@ -25,6 +25,7 @@ import sys
 from reddwarf.common import cfg
 from reddwarf.common.manager import ManagerAPI
 from reddwarf.openstack.common import log as logging
+from reddwarf.taskmanager import sharding
 
 
 CONF = cfg.CONF
@@ -58,6 +59,9 @@ class API(ManagerAPI):
         """Create the routing key for the taskmanager"""
         return CONF.taskmanager_queue
 
+    def _get_cast_routing_key(self, instance_id=None, **kwargs):
+        return sharding.get_routing_key(self._get_routing_key(), instance_id)
+
     def resize_volume(self, new_size, instance_id):
         LOG.debug("Making async call to resize volume for instance: %s"
                   % instance_id)
@@ -0,0 +1,171 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Runs the steps of a task side by side where their requirements allow.
+
+Each step names the steps whose results it needs and is started on a
+GreenPool as soon as those have finished, so independent steps such as
+setting up the DNS client and booting the server overlap. When the run is
+over the time taken by each step and the critical path through them are
+logged.
+"""
+
+import sys
+import time
+
+import eventlet
+from eventlet import queue
+
+from reddwarf.openstack.common import log as logging
+from reddwarf.openstack.common.gettextutils import _
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Step(object):
+    """A named function and the steps whose results it is called with."""
+
+    def __init__(self, name, func, requires):
+        self.name = name
+        self.func = func
+        self.requires = requires
+        self.started = None
+        self.finished = None
+
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+
+class TaskGraph(object):
+    """Steps to run, each once every step it requires has finished."""
+
+    def __init__(self, name, checkpoint=None):
+        self.name = name
+        # Called with the name of each step which finishes successfully.
+        self.checkpoint = checkpoint
+        self.steps = []
+        self._steps_by_name = {}
+
+    def add(self, name, func, requires=()):
+        """Adds a step, which must come after the steps it requires.
+
+        func is called with the result of every required step as a keyword
+        argument named after that step.
+        """
+        if name in self._steps_by_name:
+            raise ValueError(_("Step %s was added twice.") % name)
+        for required in requires:
+            if required not in self._steps_by_name:
+                raise ValueError(_("Step %s requires the unknown step %s.")
+                                 % (name, required))
+        step = Step(name, func, list(requires))
+        self.steps.append(step)
+        self._steps_by_name[name] = step
+        return step
+
+    def run(self):
+        """Runs every step and returns the results by step name.
+
+        If a step fails no further steps are started; the error is raised
+        once the steps that were already running have finished.
+        """
+        results = {}
+        pending = list(self.steps)
+        finished = queue.Queue()
+        pool = eventlet.GreenPool(max(len(self.steps), 1))
+        running = 0
+        error = None
+        while True:
+            if error is None:
+                for step in [step for step in pending
+                             if all(required in results
+                                    for required in step.requires)]:
+                    pending.remove(step)
+                    running += 1
+                    kwargs = dict((required, results[required])
+                                  for required in step.requires)
+                    pool.spawn_n(self._run_step, step, kwargs, finished)
+            if running == 0:
+                break
+            step, result, exc_info = finished.get()
+            running -= 1
+            if exc_info is not None:
+                error = error or exc_info
+            else:
+                results[step.name] = result
+                if self.checkpoint is not None:
+                    self.checkpoint(step.name)
+        self._log_timings()
+        if error is not None:
+            raise error[0], error[1], error[2]
+        return results
+
+    @staticmethod
+    def _run_step(step, kwargs, finished):
+        step.started = time.time()
+        try:
+            result = step.func(**kwargs)
+        except BaseException:
+            # Even a GreenletExit or Timeout must reach run(), which would
+            # otherwise wait for the step forever.
+            step.finished = time.time()
+            finished.put((step, None, sys.exc_info()))
+        else:
+            step.finished = time.time()
+            finished.put((step, result, None))
+
+    def timings(self):
+        """Returns the seconds each finished step took, by step name."""
+        return dict((step.name, step.duration) for step in self.steps
+                    if step.duration is not None)
+
+    def critical_path(self):
+        """Returns the chain of steps that decided when the last finished.
+
+        Going back from the step which finished last, each step is preceded
+        by the required step which finished last.
+        """
+        done = [step for step in self.steps if step.finished is not None]
+        if not done:
+            return []
+        step = max(done, key=lambda step: step.finished)
+        path = [step]
+        while step.requires:
+            step = max((self._steps_by_name[required]
+                        for required in step.requires),
+                       key=lambda step: step.finished)
+            path.insert(0, step)
+        return path
+
+    def _log_timings(self):
+        path = self.critical_path()
+        if not path:
+            return
+        total = path[-1].finished - min(step.started for step in self.steps
+                                        if step.started is not None)
+        LOG.info(_("%s took %.2fs; critical path: %s.")
+                 % (self.name, total,
+                    ", ".join("%s %.2fs" % (step.name, step.duration)
+                              for step in path)))
+        for step in self.steps:
+            if step.duration is not None:
+                LOG.debug("%s: step %s took %.2fs."
+                          % (self.name, step.name, step.duration))
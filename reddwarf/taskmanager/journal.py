@@ -0,0 +1,192 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Keeps a journal of the tasks the taskmanager is working on.
+
+A task is written to the task_journal table before it starts, together
+with its arguments, the user and tenant it was cast for and the name of
+the worker running it. The user's token is not kept; a task is recovered
+with an admin context of its tenant, which talks to Nova as the proxy
+admin. As it gets past the points which matter for undoing or
+finishing it, a checkpoint is added. Finished tasks are removed again, so
+every row left over belongs to a task which was cut short. While a task
+runs its row is touched every task_journal_touch_interval seconds. A
+taskmanager recovers its own leftovers when it starts, and every
+taskmanager periodically recovers the rows nobody has touched for
+task_journal_orphan_age seconds. Without a taskmanager_worker_name a
+taskmanager is named after its host and process id, so two on one host
+never take each other's tasks for their own.
+"""
+
+import contextlib
+import datetime
+import json
+import os
+import socket
+
+import eventlet
+from eventlet import event
+from eventlet import greenthread
+
+from reddwarf.common import cfg
+from reddwarf.common import utils
+from reddwarf.common.context import ReddwarfContext
+from reddwarf.db import models as dbmodels
+from reddwarf.openstack.common import log as logging
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+# The ids of the entries this process is running or recovering right now.
+_running = set()
+
+
+def worker_name():
+    """Returns the name this taskmanager journals its tasks under."""
+    return (CONF.taskmanager_worker_name or
+            "%s:%d" % (socket.gethostname(), os.getpid()))
+
+
+def persisted_models():
+    return {'task_journal': TaskJournal}
+
+
+class TaskJournal(dbmodels.DatabaseModelBase):
+    """A task in flight and the checkpoints it has passed."""
+
+    _data_fields = ['instance_id', 'action', 'args', 'context',
+                    'checkpoints', 'worker']
+    _table_name = 'task_journal'
+
+    @classmethod
+    def start(cls, context, instance_id, action, **args):
+        return cls.create(instance_id=instance_id,
+                          action=action,
+                          args=json.dumps(args),
+                          context=json.dumps({'user': context.user,
+                                              'tenant': context.tenant}),
+                          checkpoints=json.dumps([]),
+                          worker=worker_name())
+
+    @property
+    def task_args(self):
+        return json.loads(self.args or "{}")
+
+    def recovery_context(self):
+        """Returns an admin context of the task's user and tenant."""
+        values = json.loads(self.context or "{}")
+        return ReddwarfContext(user=values.get('user'),
+                               tenant=values.get('tenant'), is_admin=True)
+
+    @property
+    def steps(self):
+        return json.loads(self.checkpoints or "[]")
+
+    def checkpoint(self, step):
+        LOG.debug("Task %s of instance %s passed %s."
+                  % (self.action, self.instance_id, step))
+        self.checkpoints = json.dumps(self.steps + [step])
+        self.save()
+
+    def touch(self):
+        """Shows the task is alive; False if another worker took it."""
+        now = utils.utcnow()
+        touched = TaskJournal.find_all(id=self.id, worker=self.worker
+                                       ).update(updated=now)
+        if touched:
+            self.updated = now
+        return bool(touched)
+
+    def finish(self):
+        self.delete()
+
+    def claim(self):
+        """Makes the task this worker's; False if another worker was first.
+
+        The row is only taken over while it still has the worker and update
+        time it was read with.
+        """
+        now = utils.utcnow()
+        claimed = TaskJournal.find_all(id=self.id, worker=self.worker,
+                                       updated=self.updated).update(
+            worker=worker_name(), updated=now)
+        if claimed:
+            self.worker = worker_name()
+            self.updated = now
+        return bool(claimed)
+
+    @classmethod
+    def find_recoverable(cls):
+        """Returns the leftover tasks of this worker and of dead workers.
+
+        Tasks this process is running are never leftovers.
+        """
+        orphaned_before = utils.utcnow() - datetime.timedelta(
+            seconds=CONF.task_journal_orphan_age)
+        return [entry for entry in cls.find_all()
+                if entry.id not in _running and
+                (entry.worker == worker_name() or
+                 entry.updated < orphaned_before)]
+
+
+def _touch_until_finished(entry, finished):
+    while True:
+        with eventlet.Timeout(CONF.task_journal_touch_interval, False):
+            finished.wait()
+        if finished.ready():
+            return
+        try:
+            if not entry.touch():
+                LOG.warn("Task %s of instance %s was taken over by "
+                         "another taskmanager."
+                         % (entry.action, entry.instance_id))
+                return
+        except Exception:
+            LOG.exception("Could not touch task %s of instance %s."
+                          % (entry.action, entry.instance_id))
+
+
+@contextlib.contextmanager
+def kept_alive(entry):
+    """Keeps the entry from looking orphaned while the block runs."""
+    _running.add(entry.id)
+    finished = event.Event()
+    greenthread.spawn_n(_touch_until_finished, entry, finished)
+    try:
+        yield entry
+    finally:
+        finished.send()
+        _running.discard(entry.id)
+
+
+@contextlib.contextmanager
+def record(context, instance_tasks, action, **args):
+    """Journals the task run in the block with the given instance tasks.
+
+    The instance tasks can add checkpoints through their journal attribute
+    while the block runs. The entry is removed however the block ends,
+    because a task which raises has already undone what it could.
+    """
+    entry = TaskJournal.start(context, instance_tasks.id, action, **args)
+    instance_tasks.journal = entry
+    try:
+        with kept_alive(entry):
+            yield entry
+    finally:
+        instance_tasks.journal = None
+        entry.finish()
@@ -19,16 +19,27 @@ import traceback
 
 from eventlet import greenthread
 
+from reddwarf.common import cfg
 from reddwarf.common import exception
+from reddwarf.common import utils
+from reddwarf.guestagent import circuit
+from reddwarf.instance.models import DBInstance
+from reddwarf.instance.tasks import InstanceTasks
 from reddwarf.openstack.common import log as logging
 from reddwarf.openstack.common import periodic_task
 from reddwarf.openstack.common.rpc.common import UnsupportedRpcVersion
 from reddwarf.openstack.common.gettextutils import _
+from reddwarf.taskmanager import journal
 from reddwarf.taskmanager import models
+from reddwarf.taskmanager import sharding
+from reddwarf.taskmanager.journal import TaskJournal
 from reddwarf.taskmanager.models import BuiltInstanceTasks
 from reddwarf.taskmanager.models import FreshInstanceTasks
+from reddwarf.taskmanager.sharding import instance_lock
+from reddwarf.taskmanager.sharding import serialized_by_instance
 
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 RPC_API_VERSION = "1.0"
@@ -36,42 +47,171 @@ RPC_API_VERSION = "1.0"
 
 class Manager(periodic_task.PeriodicTasks):
 
+    def initialize_service_hook(self, service):
+        greenthread.spawn_n(self.recover_tasks)
+
+    @periodic_task.periodic_task
+    def recover_orphaned_tasks(self, context):
+        """Recovers the tasks of taskmanagers which died meanwhile."""
+        greenthread.spawn_n(self.recover_tasks)
+
+    @periodic_task.periodic_task(ticks_between_runs=6)
+    def log_guest_circuits(self, context):
+        """Logs the guests whose circuit is open, for monitoring."""
+        circuit.log_circuit_stats()
+
+    @serialized_by_instance
     def resize_volume(self, context, instance_id, new_size):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
-        instance_tasks.resize_volume(new_size)
+        with journal.record(context, instance_tasks, "resize_volume",
+                            new_size=new_size):
+            instance_tasks.resize_volume(new_size)
 
+    @serialized_by_instance
     def resize_flavor(self, context, instance_id, new_flavor_id,
                       old_memory_size, new_memory_size):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
-        instance_tasks.resize_flavor(new_flavor_id, old_memory_size,
-                                     new_memory_size)
-
+        with journal.record(context, instance_tasks, "resize_flavor",
+                            new_flavor_id=new_flavor_id,
+                            old_memory_size=old_memory_size,
+                            new_memory_size=new_memory_size):
+            instance_tasks.resize_flavor(new_flavor_id, old_memory_size,
+                                         new_memory_size)
+
+    @serialized_by_instance
     def reboot(self, context, instance_id):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
-        instance_tasks.reboot()
+        with journal.record(context, instance_tasks, "reboot"):
+            instance_tasks.reboot()
 
+    @serialized_by_instance
     def restart(self, context, instance_id):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
-        instance_tasks.restart()
+        with journal.record(context, instance_tasks, "restart"):
+            instance_tasks.restart()
 
+    @serialized_by_instance
     def migrate(self, context, instance_id):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
-        instance_tasks.migrate()
+        with journal.record(context, instance_tasks, "migrate"):
+            instance_tasks.migrate()
 
+    @serialized_by_instance
     def delete_instance(self, context, instance_id):
         try:
             instance_tasks = models.BuiltInstanceTasks.load(context,
                                                             instance_id)
-            instance_tasks.delete_async()
+            with journal.record(context, instance_tasks, "delete_instance"):
+                instance_tasks.delete_async()
         except exception.UnprocessableEntity as upe:
             instance_tasks = models.FreshInstanceTasks.load(context,
                                                             instance_id)
-            instance_tasks.delete_async()
+            with journal.record(context, instance_tasks, "delete_instance"):
+                instance_tasks.delete_async()
 
+    @serialized_by_instance
     def create_instance(self, context, instance_id, name, flavor_id,
                         flavor_ram, image_id, databases, users, service_type,
                         volume_size):
         instance_tasks = FreshInstanceTasks.load(context, instance_id)
-        instance_tasks.create_instance(flavor_id, flavor_ram, image_id,
-                                       databases, users, service_type,
-                                       volume_size)
+        with journal.record(context, instance_tasks, "create_instance"):
+            instance_tasks.create_instance(flavor_id, flavor_ram, image_id,
+                                           databases, users, service_type,
+                                           volume_size)
+
+    def recover_tasks(self):
+        """Finishes or undoes the journaled tasks of dead taskmanagers.
+
+        This runs when the taskmanager starts and then periodically. When
+        instances are sharded, only the tasks of the instances this host
+        owns are taken, so they don't run next to newer tasks of the owner.
+        """
+        for entry in TaskJournal.find_recoverable():
+            if not sharding.is_owner(CONF.taskmanager_queue,
+                                     entry.instance_id):
+                continue
+            if not entry.claim():
+                continue
+            LOG.info(_("Recovering task %s of instance %s after %s.")
+                     % (entry.action, entry.instance_id, entry.steps))
+            try:
+                context = entry.recovery_context()
+                recover = getattr(self, "_recover_%s" % entry.action)
+                with journal.kept_alive(entry):
+                    with instance_lock(entry.instance_id):
+                        recover(context, entry)
+            except Exception:
+                LOG.exception(_("Could not recover task %s of instance %s.")
+                              % (entry.action, entry.instance_id))
+            finally:
+                entry.finish()
+
+    def _recover_reboot(self, context, entry):
+        # Rebooting or restarting again does no harm.
+        self._resume_or_clear(self.reboot, context, entry)
+
+    def _recover_restart(self, context, entry):
+        self._resume_or_clear(self.restart, context, entry)
+
+    def _recover_delete_instance(self, context, entry):
+        self.delete_instance(context, entry.instance_id)
+
+    def _recover_resize_volume(self, context, entry):
+        # Nova may or may not have grown the volume; the user can ask again.
+        _set_task_status(entry.instance_id, InstanceTasks.NONE)
+
+    def _recover_resize_flavor(self, context, entry):
+        if "nova_action_confirmed" in entry.steps:
+            # Past the confirm there is nothing left to undo.
+            _set_task_status(entry.instance_id, InstanceTasks.NONE,
+                             flavor_id=entry.task_args['new_flavor_id'])
+        else:
+            self._roll_back_resize(context, entry)
+
+    def _recover_migrate(self, context, entry):
+        if "nova_action_confirmed" in entry.steps:
+            _set_task_status(entry.instance_id, InstanceTasks.NONE)
+        else:
+            self._roll_back_resize(context, entry)
+
+    def _recover_create_instance(self, context, entry):
+        # The create flow can't be picked up halfway, so the instance is
+        # failed at the step it stopped at; the user can then delete it.
+        steps = entry.steps
+        if "prepare" in steps:
+            task_status = InstanceTasks.NONE
+        elif "server" in steps and "dns" not in steps:
+            task_status = InstanceTasks.BUILDING_ERROR_DNS
+        elif ("server" in steps or "volume" in steps or
+              CONF.use_nova_server_volume):
+            task_status = InstanceTasks.BUILDING_ERROR_SERVER
+        else:
+            task_status = InstanceTasks.BUILDING_ERROR_VOLUME
+        _set_task_status(entry.instance_id, task_status)
+
+    def _resume_or_clear(self, method, context, entry):
+        try:
+            method(context, entry.instance_id)
+        except Exception:
+            LOG.exception(_("Could not resume task %s of instance %s.")
+                          % (entry.action, entry.instance_id))
+            _set_task_status(entry.instance_id, InstanceTasks.NONE)
+
+    def _roll_back_resize(self, context, entry):
+        try:
+            instance_tasks = BuiltInstanceTasks.load(context,
+                                                     entry.instance_id)
+            instance_tasks.roll_back_resize()
+        except Exception:
+            LOG.exception(_("Could not roll back task %s of instance %s.")
+                          % (entry.action, entry.instance_id))
+            _set_task_status(entry.instance_id, InstanceTasks.NONE)
+
+
+def _set_task_status(instance_id, task_status, **values):
+    """Writes the task status of an instance without loading it."""
+    DBInstance.find_all(id=instance_id, deleted=False).update(
+        task_id=task_status.code,
+        task_description=task_status.db_text,
+        updated=utils.utcnow(),
+        **values)
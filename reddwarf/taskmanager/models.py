@@ -16,7 +16,6 @@ import time
 from eventlet import greenthread
 from datetime import datetime
 import traceback
-from novaclient import exceptions as nova_exceptions
 from reddwarf.common import cfg
 from reddwarf.common import remote
 from reddwarf.common import utils
@@ -29,7 +28,6 @@ from reddwarf.common.remote import create_dns_client
 from reddwarf.common.remote import create_nova_client
 from reddwarf.common.remote import create_nova_volume_client
 from reddwarf.common.remote import create_guest_client
-from reddwarf.common.utils import poll_until
 from reddwarf.extensions.mysql.common import populate_databases
 from reddwarf.extensions.mysql.common import populate_users
 from reddwarf.instance import models as inst_models
@@ -43,6 +41,8 @@ from reddwarf.instance.tasks import InstanceTasks
 from reddwarf.instance.views import get_ip_address
 from reddwarf.openstack.common import log as logging
 from reddwarf.openstack.common.gettextutils import _
+from reddwarf.taskmanager.graph import TaskGraph
+from reddwarf.taskmanager.watcher import ResourceWatcher
 
 
 LOG = logging.getLogger(__name__)
@@ -55,32 +55,50 @@ REVERT_TIME_OUT = CONF.revert_time_out  # seconds.
 use_nova_server_volume = CONF.use_nova_server_volume
 
 
-class FreshInstanceTasks(FreshInstance):
+class JournaledTasks(object):
+    """Adds the checkpoints of a task to its journal entry, if it has one."""
+
+    journal = None
+
+    def checkpoint(self, step):
+        if self.journal is not None:
+            self.journal.checkpoint(step)
+
+
+class FreshInstanceTasks(FreshInstance, JournaledTasks):
 
     def create_instance(self, flavor_id, flavor_ram, image_id,
                         databases, users, service_type, volume_size):
+        graph = TaskGraph("Create of instance %s" % self.id,
+                          checkpoint=self.checkpoint)
         if use_nova_server_volume:
-            server, volume_info = self._create_server_volume(
+            graph.add("server", lambda: self._create_server_volume(
                 flavor_id,
                 image_id,
                 service_type,
-                volume_size)
+                volume_size))
         else:
-            server, volume_info = self._create_server_volume_individually(
+            # The server is booted with the volume mapped, so it can't be
+            # requested before the volume is available.
+            graph.add("volume", lambda: self._provision_volume(volume_size))
+            graph.add("server", lambda volume: self._provision_server(
                 flavor_id,
                 image_id,
                 service_type,
-                volume_size)
-        try:
-            self._create_dns_entry()
-        except Exception as e:
-            msg = "Error creating DNS entry for instance."
-            err = inst_models.InstanceTasks.BUILDING_ERROR_DNS
-            self._log_and_raise(e, msg, err)
-
-        if server:
-            self._guest_prepare(server, flavor_ram, volume_info,
-                                databases, users)
+                volume),
+                requires=["volume"])
+        # Setting up the DNS client authenticates with the DNS service,
+        # which doesn't need to wait for the server.
+        graph.add("dns_client", lambda: self._run_dns_step(
+            self._create_dns_client))
+        graph.add("dns", lambda server, dns_client: self._run_dns_step(
+            self._create_dns_entry, dns_client),
+            requires=["server", "dns_client"])
+        # The result of the server step is the server and the volume info.
+        graph.add("prepare", lambda server, dns: self._guest_prepare(
+            server[0], flavor_ram, server[1], databases, users),
+            requires=["server", "dns"])
+        graph.run()
 
         if not self.db_info.task_status.is_error:
             self.update_db(task_status=inst_models.InstanceTasks.NONE)
@@ -122,22 +140,19 @@ class FreshInstanceTasks(FreshInstance):
 
         return server, volume_info
 
-    def _create_server_volume_individually(self, flavor_id, image_id,
-                                           service_type, volume_size):
-        volume_info = None
-        block_device_mapping = None
-        server = None
+    def _provision_volume(self, volume_size):
         try:
-            volume_info = self._create_volume(volume_size)
-            block_device_mapping = volume_info['block_device']
+            return self._create_volume(volume_size)
         except Exception as e:
             msg = "Error provisioning volume for instance."
             err = inst_models.InstanceTasks.BUILDING_ERROR_VOLUME
             self._log_and_raise(e, msg, err)
 
+    def _provision_server(self, flavor_id, image_id, service_type,
+                          volume_info):
         try:
             server = self._create_server(flavor_id, image_id, service_type,
-                                         block_device_mapping)
+                                         volume_info['block_device'])
             server_id = server.id
             # Save server ID.
             self.update_db(compute_instance_id=server_id)
@@ -147,6 +162,14 @@ class FreshInstanceTasks(FreshInstance):
             self._log_and_raise(e, msg, err)
         return server, volume_info
 
+    def _run_dns_step(self, func, *args):
+        try:
+            return func(*args)
+        except Exception as e:
+            msg = "Error creating DNS entry for instance."
+            err = inst_models.InstanceTasks.BUILDING_ERROR_DNS
+            self._log_and_raise(e, msg, err)
+
     def _log_and_raise(self, exc, message, task_status):
         LOG.error(message)
         LOG.error(exc)
@@ -180,13 +203,10 @@ class FreshInstanceTasks(FreshInstance):
         # Record the volume ID in case something goes wrong.
         self.update_db(volume_id=volume_ref.id)
 
-        utils.poll_until(
-            lambda: volume_client.volumes.get(volume_ref.id),
+        v_ref = ResourceWatcher.get().wait_for_volume(
+            self.context, volume_ref.id,
             lambda v_ref: v_ref.status in ['available', 'error'],
-            sleep_time=2,
             time_out=VOLUME_TIME_OUT)
-
-        v_ref = volume_client.volumes.get(volume_ref.id)
         if v_ref.status in ['error']:
             raise VolumeCreationFailure()
         LOG.debug(_("Created volume %s") % v_ref)
@@ -234,20 +254,18 @@ class FreshInstanceTasks(FreshInstance):
                            device_path=volume_info['device_path'],
                            mount_point=volume_info['mount_point'])
 
-    def _create_dns_entry(self):
-        LOG.debug("%s: Creating dns entry for instance: %s" %
-                  (greenthread.getcurrent(), self.id))
+    def _create_dns_client(self):
         dns_support = CONF.reddwarf_dns_support
         LOG.debug(_("reddwarf dns support = %s") % dns_support)
-
         if dns_support:
-            nova_client = create_nova_client(self.context)
-            dns_client = create_dns_client(self.context)
+            return create_dns_client(self.context)
+        return None
 
-            def get_server():
-                c_id = self.db_info.compute_instance_id
-                return nova_client.servers.get(c_id)
+    def _create_dns_entry(self, dns_client):
+        LOG.debug("%s: Creating dns entry for instance: %s" %
+                  (greenthread.getcurrent(), self.id))
 
+        if dns_client:
             def ip_is_available(server):
                 LOG.info("Polling for ip addresses: $%s " % server.addresses)
                 if server.addresses != {}:
@@ -261,9 +279,9 @@ class FreshInstanceTasks(FreshInstance):
                             "server had status (%s).")
                     LOG.error(msg % (self.id, server.status))
                     raise ReddwarfError(status=server.status)
-            poll_until(get_server, ip_is_available,
-                       sleep_time=1, time_out=DNS_TIME_OUT)
-            server = nova_client.servers.get(self.db_info.compute_instance_id)
+            server = ResourceWatcher.get().wait_for_server(
+                self.context, self.db_info.compute_instance_id,
+                ip_is_available, time_out=DNS_TIME_OUT)
             LOG.info("Creating dns entry...")
             dns_client.create_instance_entry(self.id,
                                              get_ip_address(server.addresses))
@@ -272,7 +290,7 @@ class FreshInstanceTasks(FreshInstance):
                       (greenthread.getcurrent(), self.id))
 
 
-class BuiltInstanceTasks(BuiltInstance):
+class BuiltInstanceTasks(BuiltInstance, JournaledTasks):
     """
     Performs the various asynchronous instance related tasks.
     """
@@ -304,32 +322,29 @@ class BuiltInstanceTasks(BuiltInstance):
             LOG.error(ex)
         # Poll until the server is gone.
 
-        def server_is_finished():
-            try:
-                server_id = self.db_info.compute_instance_id
-                server = self.nova_client.servers.get(server_id)
-                if server.status not in ['SHUTDOWN', 'ACTIVE']:
-                    msg = "Server %s got into ERROR status during delete " \
-                          "of instance %s!" % (server.id, self.id)
-                    LOG.error(msg)
-                return False
-            except nova_exceptions.NotFound:
+        def server_is_finished(server):
+            if server is None:
                 return True
+            if server.status not in ['SHUTDOWN', 'ACTIVE']:
+                msg = "Server %s got into ERROR status during delete " \
+                      "of instance %s!" % (server.id, self.id)
+                LOG.error(msg)
+            return False
 
-        poll_until(server_is_finished, sleep_time=2,
-                   time_out=CONF.server_delete_time_out)
+        ResourceWatcher.get().wait_for_server(
+            self.context, self.db_info.compute_instance_id,
+            server_is_finished, time_out=CONF.server_delete_time_out,
+            missing_ok=True)
 
     def resize_volume(self, new_size):
         LOG.debug("%s: Resizing volume for instance: %s to %r GB"
                   % (greenthread.getcurrent(), self.server.id, new_size))
         self.volume_client.volumes.resize(self.volume_id, int(new_size))
         try:
-            utils.poll_until(
-                lambda: self.volume_client.volumes.get(self.volume_id),
+            volume = ResourceWatcher.get().wait_for_volume(
+                self.context, self.volume_id,
                 lambda volume: volume.status == 'in-use',
-                sleep_time=2,
                 time_out=CONF.volume_time_out)
-            volume = self.volume_client.volumes.get(self.volume_id)
             self.update_db(volume_size=volume.size)
             self.nova_client.volumes.rescan_server_volume(self.server,
                                                           self.volume_id)
@@ -353,6 +368,35 @@ class BuiltInstanceTasks(BuiltInstance):
         action = MigrateAction(self)
         action.execute()
 
+    def roll_back_resize(self):
+        """Undoes a resize or migration which was cut short."""
+        try:
+            if self.server.status in ('RESIZE', 'RESIZE_PREP'):
+                # Nova is still working on it; deciding now would let it
+                # finish (and maybe auto-confirm) behind our back.
+                LOG.info("Waiting for the resize of instance %s to settle."
+                         % self.id)
+                self.server = ResourceWatcher.get().wait_for_server(
+                    self.context, self.server.id,
+                    lambda server: server.status not in ('RESIZE',
+                                                         'RESIZE_PREP'),
+                    time_out=RESIZE_TIME_OUT)
+            if self.server.status == 'VERIFY_RESIZE':
+                LOG.info("Reverting the resize of instance %s." % self.id)
+                self.server.revert_resize()
+                self.server = ResourceWatcher.get().wait_for_server(
+                    self.context, self.server.id,
+                    lambda server: server.status == 'ACTIVE',
+                    time_out=REVERT_TIME_OUT)
+            if self.server.status == 'ACTIVE':
+                # If Nova confirmed the resize on its own the new flavor
+                # stuck, so record whatever the server really runs on.
+                self.update_db(flavor_id=self.server.flavor['id'])
+                LOG.info("Restarting MySQL on instance %s." % self.id)
+                self.guest.restart()
+        finally:
+            self.update_db(task_status=inst_models.InstanceTasks.NONE)
+
     def reboot(self):
         try:
             LOG.debug("Instance %s calling stop_mysql..." % self.id)
@@ -363,12 +407,9 @@ class BuiltInstanceTasks(BuiltInstance):
             # Poll nova until instance is active
             reboot_time_out = CONF.reboot_time_out
 
-            def update_server_info():
-                self._refresh_compute_server_info()
-                return self.server.status == 'ACTIVE'
-            utils.poll_until(
-                update_server_info,
-                sleep_time=2,
+            self.server = ResourceWatcher.get().wait_for_server(
+                self.context, self.server.id,
+                lambda server: server.status == 'ACTIVE',
                 time_out=reboot_time_out)
 
             # Set the status to PAUSED. The guest agent will reset the status
@@ -406,6 +447,9 @@ class BuiltInstanceTasks(BuiltInstance):
         status = InstanceServiceStatus.find_by(instance_id=self.id)
         status.set_status(inst_models.ServiceStatuses.PAUSED)
         status.save()
+        # A guest which came up before the status was paused has nothing
+        # new to report, so it is asked to report again.
+        self.guest.report_status()
 
 
 class ResizeActionBase(object):
@@ -478,6 +522,7 @@ class ResizeActionBase(object):
         need_to_revert = False
         try:
             LOG.debug("Initiating nova action")
+            self.instance.checkpoint("nova_action_started")
             self._initiate_nova_action()
             LOG.debug("Waiting for nova action")
             self._wait_for_nova_action()
@@ -491,6 +536,7 @@ class ResizeActionBase(object):
             self._assert_processes_are_ok()
             LOG.debug("Confirming nova action")
             self._confirm_nova_action()
+            self.instance.checkpoint("nova_action_confirmed")
         except Exception as ex:
             LOG.exception("Exception during nova action.")
             if need_to_revert:
@@ -514,22 +560,16 @@ class ResizeActionBase(object):
 
     def _wait_for_nova_action(self):
         # Wait for the flavor to change.
-        def update_server_info():
-            self.instance._refresh_compute_server_info()
-            return self.instance.server.status != 'RESIZE'
-        utils.poll_until(
-            update_server_info,
-            sleep_time=2,
+        self.instance.server = ResourceWatcher.get().wait_for_server(
+            self.instance.context, self.instance.server.id,
+            lambda server: server.status != 'RESIZE',
             time_out=RESIZE_TIME_OUT)
 
     def _wait_for_revert_nova_action(self):
         # Wait for the server to return to ACTIVE after revert.
-        def update_server_info():
-            self.instance._refresh_compute_server_info()
-            return self.instance.server.status == 'ACTIVE'
-        utils.poll_until(
-            update_server_info,
-            sleep_time=2,
+        self.instance.server = ResourceWatcher.get().wait_for_server(
+            self.instance.context, self.instance.server.id,
+            lambda server: server.status == 'ACTIVE',
             time_out=REVERT_TIME_OUT)
 
 
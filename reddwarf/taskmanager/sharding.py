@@ -0,0 +1,151 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Spreads instances over taskmanagers and runs one task per instance.
+
+With taskmanager_shard_by_instance set, casts about an instance go to the
+node topic of the taskmanager owning it instead of the shared queue, so
+every task for one instance is run by the same worker. The owners come
+from a consistent hash over the taskmanager hosts listed for the topic in
+the matchmaker ring file; adding or removing a host only moves the
+instances of that host. Within a worker, tasks for the same instance take
+turns.
+"""
+
+import bisect
+import functools
+import hashlib
+import weakref
+
+from eventlet import greenthread
+from eventlet import semaphore
+
+from reddwarf.common import cfg
+from reddwarf.openstack.common import log as logging
+from reddwarf.openstack.common.rpc import matchmaker
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+
+def _hash(value):
+    return int(hashlib.md5(value).hexdigest()[:8], 16)
+
+
+class InstanceRing(matchmaker.RingExchange):
+    """Maps instance ids onto the hosts of a topic in the matchmaker ring."""
+
+    _instance = None
+
+    def __init__(self, ring=None, replicas=None):
+        super(InstanceRing, self).__init__(ring)
+        self.replicas = replicas or CONF.taskmanager_ring_replicas
+        self._points = {}
+
+    @classmethod
+    def get(cls):
+        if not cls._instance:
+            cls._instance = InstanceRing()
+        return cls._instance
+
+    def _points_of(self, topic):
+        """Returns the sorted hashes of the topic and the host of each."""
+        if topic not in self._points:
+            points = sorted((_hash("%s-%d" % (host, replica)), host)
+                            for host in self.ring[topic]
+                            for replica in range(self.replicas))
+            self._points[topic] = ([point[0] for point in points],
+                                   [point[1] for point in points])
+        return self._points[topic]
+
+    def get_host(self, topic, key):
+        """Returns the host owning key, or None if the topic has none."""
+        if not self._ring_has(topic):
+            return None
+        hashes, hosts = self._points_of(topic)
+        if not hashes:
+            return None
+        index = bisect.bisect(hashes, _hash(key)) % len(hashes)
+        return hosts[index]
+
+
+def get_routing_key(topic, instance_id):
+    """Returns the topic a cast about the instance should be sent to."""
+    if instance_id is None or not CONF.taskmanager_shard_by_instance:
+        return topic
+    host = InstanceRing.get().get_host(topic, instance_id)
+    if host is None:
+        LOG.warn("No taskmanager hosts for topic %s in the ring; casting "
+                 "to the shared queue." % topic)
+        return topic
+    return "%s.%s" % (topic, host)
+
+
+def is_owner(topic, instance_id, host=None):
+    """Returns whether casts about the instance are routed to this host."""
+    routing_key = get_routing_key(topic, instance_id)
+    return routing_key in (topic, "%s.%s" % (topic, host or CONF.host))
+
+
+class InstanceLock(object):
+    """Lets one greenthread at a time run tasks for an instance.
+
+    The greenthread holding it may take it again. Nothing else does that,
+    but the fake mode runs tasks nested in the sleeps of other tasks.
+    """
+
+    def __init__(self):
+        self._semaphore = semaphore.Semaphore()
+        self._owner = None
+        self._depth = 0
+
+    def __enter__(self):
+        current = greenthread.getcurrent()
+        if self._owner is not current:
+            self._semaphore.acquire()
+            self._owner = current
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+            self._semaphore.release()
+
+
+# The locks of the instances with tasks running or waiting; a lock goes
+# away with the last task holding on to it.
+_locks = weakref.WeakValueDictionary()
+
+
+def instance_lock(instance_id):
+    lock = _locks.get(instance_id)
+    if lock is None:
+        lock = InstanceLock()
+        _locks[instance_id] = lock
+    return lock
+
+
+def serialized_by_instance(f):
+    """Runs a manager method only while no other task has the instance."""
+    @functools.wraps(f)
+    def wrapper(self, context, instance_id, *args, **kwargs):
+        with instance_lock(instance_id):
+            return f(self, context, instance_id, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,203 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Waits for Nova servers and volumes with one sweep for every task.
+
+Tasks used to poll Nova for their own server or volume every second or
+two, so the calls made grew with the number of tasks in flight. Instead a
+task registers what it waits for here. A sweep lists the servers and
+volumes of each tenant with waiting tasks once, checks every waiting task
+against the result and sets the event of those whose condition holds or
+whose time is up. Each task still wakes up every watcher_sweep_interval
+seconds, without backing off as the sweeps are shared anyway, but only
+sweeps if no other task has swept since it last looked and none is
+sweeping now, so there is about one sweep per interval however many tasks
+are waiting.
+"""
+
+import time
+
+from eventlet import event
+from eventlet import semaphore
+from novaclient import exceptions as nova_exceptions
+
+from reddwarf.common import cfg
+from reddwarf.common import exception
+from reddwarf.common import utils
+from reddwarf.common.remote import create_nova_client
+from reddwarf.common.remote import create_nova_volume_client
+from reddwarf.openstack.common import log as logging
+from reddwarf.openstack.common.gettextutils import _
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+SERVER = "server"
+VOLUME = "volume"
+
+
+class Wait(object):
+    """A task waiting for a server or volume to pass a condition."""
+
+    def __init__(self, kind, context, resource_id, condition, time_out,
+                 missing_ok=False):
+        self.kind = kind
+        self.context = context
+        self.resource_id = resource_id
+        self.condition = condition
+        self.deadline = None
+        if time_out is not None:
+            self.deadline = time.time() + time_out
+        self.missing_ok = missing_ok
+        self.event = event.Event()
+
+    def check(self, resources):
+        """Wakes the task if its resource passes the condition."""
+        if self.event.ready():
+            return
+        resource = resources.get(self.resource_id)
+        try:
+            if resource is None and not self.missing_ok:
+                raise exception.NotFound(uuid=self.resource_id)
+            if self.condition(resource):
+                self.event.send(resource)
+            elif self.expired():
+                raise exception.PollTimeOut()
+        except Exception as ex:
+            self.event.send_exception(ex)
+
+    def expired(self):
+        return self.deadline is not None and time.time() > self.deadline
+
+
+class ResourceWatcher(object):
+    """Sweeps Nova on behalf of every task waiting for a resource."""
+
+    _instance = None
+
+    def __init__(self):
+        self._waits = []
+        self._sweeps = 0
+        self._sweeping = semaphore.Semaphore()
+
+    @classmethod
+    def get(cls):
+        if not cls._instance:
+            cls._instance = ResourceWatcher()
+        return cls._instance
+
+    def wait_for_server(self, context, server_id, condition, time_out=None,
+                        missing_ok=False):
+        """Returns the server once it passes the condition.
+
+        Raises NotFound if the server is gone, unless missing_ok is set, in
+        which case the condition is called with None. Raises PollTimeOut
+        once time_out seconds have passed.
+        """
+        return self._wait(Wait(SERVER, context, server_id, condition,
+                               time_out, missing_ok))
+
+    def wait_for_volume(self, context, volume_id, condition, time_out=None):
+        """Returns the volume once it passes the condition."""
+        return self._wait(Wait(VOLUME, context, volume_id, condition,
+                               time_out))
+
+    def _wait(self, wait):
+        self._waits.append(wait)
+        # Nothing is swept on the first poll, so tasks which start together
+        # share their first sweep too.
+        last_seen = [None]
+
+        def is_ready():
+            if wait.event.ready():
+                return True
+            if self._sweeps == last_seen[0]:
+                self.sweep()
+            last_seen[0] = self._sweeps
+            return wait.event.ready()
+
+        try:
+            # The sweeps time the wait out, so there is no time_out here.
+            utils.poll_until(is_ready,
+                             sleep_time=CONF.watcher_sweep_interval,
+                             backoff=1, name="wait_for_%s" % wait.kind)
+            return wait.event.wait()
+        finally:
+            if wait in self._waits:
+                self._waits.remove(wait)
+
+    def sweep(self):
+        """Lists the resources of each waiting tenant once.
+
+        Only one sweep runs at a time. A task which finds another sweeping
+        returns at once; that sweep or the next one wakes it.
+        """
+        if not self._sweeping.acquire(blocking=False):
+            return
+        try:
+            self._sweep()
+        finally:
+            self._sweeping.release()
+
+    def _sweep(self):
+        # Counted up front, so tasks polling while the list calls are made
+        # don't start sweeps of their own.
+        self._sweeps += 1
+        groups = {}
+        for wait in self._waits:
+            key = (wait.kind, wait.context.tenant, wait.context.is_admin)
+            groups.setdefault(key, []).append(wait)
+        for (kind, tenant, is_admin), waits in groups.items():
+            try:
+                resources = self._list(kind, waits[0].context,
+                                       [wait.resource_id for wait in waits])
+            except Exception as ex:
+                # Like a failed poll, this is tried again on the next sweep.
+                LOG.warn(_("Could not list %ss of tenant %s: %s")
+                         % (kind, tenant, ex))
+                resources = None
+            for wait in waits:
+                if resources is not None:
+                    wait.check(resources)
+                elif wait.expired() and not wait.event.ready():
+                    wait.event.send_exception(exception.PollTimeOut())
+                if wait.event.ready() and wait in self._waits:
+                    # The task may have gone while other tenants were listed.
+                    self._waits.remove(wait)
+        LOG.debug("Made %d list calls, %d tasks still waiting."
+                  % (len(groups), len(self._waits)))
+
+    def _list(self, kind, context, ids):
+        if kind == SERVER:
+            manager = create_nova_client(context).servers
+        else:
+            manager = create_nova_volume_client(context).volumes
+        if context.is_admin:
+            # Admin contexts wait for the resources of other tenants, which
+            # a plain list leaves out, so each one is fetched instead.
+            resources = {}
+        else:
+            resources = dict((item.id, item) for item in manager.list())
+        # Nova cuts a list off at osapi_max_limit, so what is missing from
+        # it is looked up before it counts as gone.
+        for resource_id in set(ids) - set(resources):
+            try:
+                resources[resource_id] = manager.get(resource_id)
+            except nova_exceptions.NotFound:
+                pass
+        return resources
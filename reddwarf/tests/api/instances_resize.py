@@ -29,6 +29,7 @@ from reddwarf.instance.models import ServiceStatuses
 from reddwarf.instance.tasks import InstanceTasks
 from reddwarf.openstack.common.rpc.common import RPCException
 from reddwarf.taskmanager import models as models
+from reddwarf.taskmanager.watcher import ResourceWatcher
 
 GROUP = 'dbaas.api.instances.resize'
 
@@ -49,6 +50,7 @@ class ResizeTestBase(TestCase):
             volume_size=None,
             task_status=InstanceTasks.RESIZING)
         self.server = self.mock.CreateMock(Server)
+        self.server.id = "server-500"
         self.instance = models.BuiltInstanceTasks(context,
                                                   self.db_info,
                                                   self.server,
@@ -56,12 +58,14 @@ class ResizeTestBase(TestCase):
         self.instance.server.flavor = {'id': OLD_FLAVOR_ID}
         self.guest = self.mock.CreateMock(guest.API)
         self.instance._guest = self.guest
-        self.instance._refresh_compute_server_info = lambda: None
         self.instance._refresh_compute_service_status = lambda: None
         self.mock.StubOutWithMock(self.instance, 'update_db')
         self.mock.StubOutWithMock(self.instance,
                                   '_set_service_status_to_paused')
-        self.poll_until_mocked = False
+        self.mock.StubOutWithMock(utils, "poll_until")
+        self.watcher = self.mock.CreateMock(ResourceWatcher)
+        self.orig_watcher = ResourceWatcher._instance
+        ResourceWatcher._instance = self.watcher
         self.action = None
 
     def _teardown(self):
@@ -72,21 +76,20 @@ class ResizeTestBase(TestCase):
             self.mock.VerifyAll()
         finally:
             self.mock.UnsetStubs()
+            ResourceWatcher._instance = self.orig_watcher
             self.db_info.delete()
 
     def _stop_mysql(self, reboot=True):
         self.guest.stop_mysql(do_not_start_on_reboot=reboot)
 
     def _server_changes_to(self, new_status, new_flavor_id):
-        def change():
+        def change(*args, **kwargs):
             self.server.status = new_status
             self.instance.server.flavor['id'] = new_flavor_id
 
-        if not self.poll_until_mocked:
-            self.mock.StubOutWithMock(utils, "poll_until")
-            self.poll_until_mocked = True
-        utils.poll_until(mox.IgnoreArg(), sleep_time=2, time_out=120)\
-            .WithSideEffects(lambda ignore, sleep_time, time_out: change())
+        self.watcher.wait_for_server(mox.IgnoreArg(), self.server.id,
+                                     mox.IgnoreArg(), time_out=120)\
+            .WithSideEffects(change).AndReturn(self.server)
 
     def _nova_resizes_successfully(self):
         self.server.resize(NEW_FLAVOR_ID)
@@ -123,8 +126,8 @@ class ResizeTests(ResizeTestBase):
         self._stop_mysql()
         self.server.resize(NEW_FLAVOR_ID)
 
-        self.mock.StubOutWithMock(utils, 'poll_until')
-        utils.poll_until(mox.IgnoreArg(), sleep_time=2, time_out=120)\
+        self.watcher.wait_for_server(mox.IgnoreArg(), self.server.id,
+                                     mox.IgnoreArg(), time_out=120)\
             .AndRaise(PollTimeOut)
 
     def test_nova_doesnt_change_flavor(self):
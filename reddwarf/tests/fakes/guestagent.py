@@ -37,6 +37,23 @@ class FakeGuest(object):
     def get_hwinfo(self):
         return {'mem_total': 524288, 'num_cpus': 1}
 
+    def get_pool_stats(self):
+        return {
+            'connects': 1,
+            'checkouts': 1,
+            'checked_out': 0,
+            'max_checked_out': 1,
+            'waits': 1,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'pool_size': 2,
+            'checked_in': 1,
+            'overflow': -1,
+        }
+
+    def get_status_report_stats(self):
+        return {'writes': 1, 'heartbeats': 0, 'skipped': 0}
+
     def get_diagnostics(self):
         return {
             'version': str(self.version),
@@ -108,6 +125,12 @@ class FakeGuest(object):
     def list_users(self, limit=None, marker=None, include_marker=False):
         return self._list_resource(self.users, limit, marker, include_marker)
 
+    def databases_exist(self, names):
+        return [name for name in names if name in self.dbs]
+
+    def users_exist(self, names):
+        return [name for name in names if name in self.users]
+
     def prepare(self, memory_mb, databases, users, device_path=None,
                 mount_point=None):
         from reddwarf.instance.models import DBInstance
@@ -156,6 +179,10 @@ class FakeGuest(object):
     def stop_mysql(self, do_not_start_on_reboot=False):
         self._set_status('SHUTDOWN')
 
+    def report_status(self):
+        # The fake servers' events set the status of a fake guest.
+        pass
+
     def get_volume_info(self):
         """Return used volume information in bytes."""
         return {'used': 175756487}
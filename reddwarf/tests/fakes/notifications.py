@@ -0,0 +1,57 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http: //www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Publishes fake Nova notifications to consumers in the same process."""
+
+import datetime
+import uuid
+
+from reddwarf.openstack.common.rpc import impl_fake
+
+
+CALLBACKS = {}
+
+
+class FakeNotificationConnection(impl_fake.Connection):
+    """An impl_fake connection which also takes raw topic consumers."""
+
+    def declare_topic_consumer(self, topic, callback=None, queue_name=None,
+                               exchange_name=None):
+        CALLBACKS.setdefault(topic, []).append(callback)
+        self.callbacks = getattr(self, 'callbacks', [])
+        self.callbacks.append((topic, callback))
+
+    def close(self):
+        for topic, callback in getattr(self, 'callbacks', []):
+            CALLBACKS[topic].remove(callback)
+        self.callbacks = []
+        super(FakeNotificationConnection, self).close()
+
+
+def publish(event_type, payload, topic='notifications.info'):
+    """Delivers a notification shaped like Nova's to every consumer."""
+    message = {
+        'message_id': str(uuid.uuid4()),
+        'publisher_id': 'compute.fake-host',
+        'event_type': event_type,
+        'priority': 'INFO',
+        'payload': payload,
+        'timestamp': str(datetime.datetime.utcnow()),
+    }
+    impl_fake.check_serialize(message)
+    for callback in CALLBACKS.get(topic, []):
+        callback(message)
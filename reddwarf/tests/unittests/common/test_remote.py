@@ -0,0 +1,53 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import testtools
+from mock import Mock
+from reddwarf.common import remote
+from reddwarf.common.context import ReddwarfContext
+
+
+class NovaClientTest(testtools.TestCase):
+
+    def setUp(self):
+        super(NovaClientTest, self).setUp()
+        self.orig_client = remote.Client
+        remote.Client = Mock()
+        remote.CONF.set_override('reddwarf_proxy_admin_user', "admin")
+        remote.CONF.set_override('reddwarf_proxy_admin_pass', "secret")
+        remote.CONF.set_override('reddwarf_proxy_admin_tenant_name',
+                                 "admin_tenant")
+
+    def tearDown(self):
+        super(NovaClientTest, self).tearDown()
+        remote.Client = self.orig_client
+        remote.CONF.clear_override('reddwarf_proxy_admin_user')
+        remote.CONF.clear_override('reddwarf_proxy_admin_pass')
+        remote.CONF.clear_override('reddwarf_proxy_admin_tenant_name')
+
+    def test_user_token(self):
+        context = ReddwarfContext(user="user", tenant="tenant",
+                                  auth_tok="token", is_admin=True)
+        client = remote.create_nova_client(context)
+        args, _ = remote.Client.call_args
+        self.assertEqual(("user", "token"), args)
+        self.assertEqual("token", client.client.auth_token)
+
+    def test_tokenless_admin(self):
+        context = ReddwarfContext(user="user", tenant="tenant", is_admin=True)
+        remote.create_nova_volume_client(context)
+        args, kwargs = remote.Client.call_args
+        self.assertEqual(("admin", "secret"), args)
+        self.assertEqual("admin_tenant", kwargs['project_id'])
+        self.assertEqual("volume", kwargs['service_type'])
@@ -0,0 +1,97 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+
+import testtools
+from mock import Mock
+from reddwarf.common import exception
+from reddwarf.common import utils
+
+
+class PollUntilTest(testtools.TestCase):
+
+    def setUp(self):
+        super(PollUntilTest, self).setUp()
+        self.orig_greenthread = utils.greenthread
+        self.orig_time = utils.time
+        self.orig_random = utils.random
+        self.now = [1000.0]
+        utils.greenthread = Mock()
+        utils.greenthread.sleep = Mock(side_effect=self._sleep)
+        utils.time = Mock()
+        utils.time.time = Mock(side_effect=lambda: self.now[0])
+        utils.random = Mock()
+        utils.random.uniform = Mock(return_value=0)
+        utils._poll_stats.clear()
+
+    def tearDown(self):
+        super(PollUntilTest, self).tearDown()
+        utils.greenthread = self.orig_greenthread
+        utils.time = self.orig_time
+        utils.random = self.orig_random
+        utils._poll_stats.clear()
+
+    def _sleep(self, seconds):
+        self.now[0] += seconds
+
+    def _sleeps(self):
+        return [call[0][0] for call in utils.greenthread.sleep.call_args_list]
+
+    def _retriever(self, values):
+        return Mock(side_effect=values, __name__="retriever")
+
+    def test_returns_value(self):
+        retriever = self._retriever([None, None, "done"])
+        self.assertEqual("done", utils.poll_until(retriever))
+        self.assertEqual(3, retriever.call_count)
+
+    def test_backoff(self):
+        retriever = self._retriever([None] * 5 + ["done"])
+        utils.poll_until(retriever, sleep_time=1, backoff=2,
+                         max_sleep_time=10, jitter=0)
+        self.assertEqual([1, 2, 4, 8, 10], self._sleeps())
+
+    def test_jitter(self):
+        utils.random.uniform = Mock(return_value=0.5)
+        retriever = self._retriever([None, None, "done"])
+        utils.poll_until(retriever, sleep_time=2, backoff=1, jitter=0.5)
+        utils.random.uniform.assert_called_with(-0.5, 0.5)
+        self.assertEqual([3, 3], self._sleeps())
+
+    def test_time_out(self):
+        retriever = self._retriever([None] * 10)
+        self.assertRaises(exception.PollTimeOut, utils.poll_until, retriever,
+                          sleep_time=4, time_out=10, backoff=2,
+                          max_sleep_time=30, jitter=0)
+        # The last wait is cut short so it ends at the deadline.
+        self.assertEqual([4, 6], self._sleeps())
+
+    def test_retriever_error(self):
+        retriever = self._retriever([None, exception.NotFound()])
+        self.assertRaises(exception.NotFound, utils.poll_until, retriever,
+                          time_out=10)
+        self.assertEqual(1, utils.get_poll_stats()['retriever']['calls'])
+
+    def test_stats(self):
+        utils.poll_until(self._retriever([None, "done"]), sleep_time=5,
+                         backoff=1, jitter=0)
+        self.assertRaises(exception.PollTimeOut, utils.poll_until,
+                          self._retriever([None] * 10), sleep_time=5,
+                          time_out=5, backoff=1, jitter=0)
+        utils.poll_until(self._retriever(["done"]), name="other")
+        stats = utils.get_poll_stats()
+        self.assertEqual({'calls': 2, 'attempts': 4, 'timeouts': 1,
+                          'wall_time': 10.0}, stats['retriever'])
+        self.assertEqual({'calls': 1, 'attempts': 1, 'timeouts': 0,
+                          'wall_time': 0.0}, stats['other'])
@@ -0,0 +1,190 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import datetime
+
+import testtools
+from mock import Mock
+from reddwarf.common import utils
+from reddwarf.conductor import api
+from reddwarf.conductor.manager import Manager
+from reddwarf.guestagent.models import AgentHeartBeat
+from reddwarf.instance.models import InstanceServiceStatus
+from reddwarf.instance.models import ServiceStatuses
+from reddwarf.tests.unittests.util import util
+
+
+class ConductorApiTest(testtools.TestCase):
+
+    def setUp(self):
+        super(ConductorApiTest, self).setUp()
+        self.api = api.API()
+        self.api._cast = Mock()
+
+    def test_update_status(self):
+        self.api.update_status("instance-1", ServiceStatuses.RUNNING.code)
+        args, kwargs = self.api._cast.call_args
+        self.assertEqual(("update_status",), args)
+        self.assertEqual("instance-1", kwargs['instance_id'])
+        self.assertEqual(ServiceStatuses.RUNNING.code, kwargs['status_id'])
+        # The conductor stamps reports itself; the guest's clock isn't used.
+        self.assertFalse('sent_at' in kwargs)
+
+    def test_heartbeat(self):
+        self.api.heartbeat("instance-1", ServiceStatuses.RUNNING.code)
+        args, kwargs = self.api._cast.call_args
+        self.assertEqual(("heartbeat",), args)
+        self.assertEqual("instance-1", kwargs['instance_id'])
+        self.assertEqual(ServiceStatuses.RUNNING.code, kwargs['status_id'])
+
+    def test_routing_key(self):
+        self.assertEqual(api.CONF.conductor_queue,
+                         self.api._get_routing_key())
+
+
+class ConductorManagerTest(testtools.TestCase):
+
+    def setUp(self):
+        super(ConductorManagerTest, self).setUp()
+        util.init_db()
+        self.manager = Manager()
+        self.ids = [utils.generate_uuid() for _ in range(3)]
+        for instance_id in self.ids:
+            InstanceServiceStatus.create(instance_id=instance_id,
+                                         status=ServiceStatuses.NEW)
+            AgentHeartBeat.create(instance_id=instance_id)
+            AgentHeartBeat.find_all(instance_id=instance_id).update(
+                updated_at=None)
+        # Reports received after the rows were written.
+        self.received_at = utils.utcnow() + datetime.timedelta(seconds=60)
+        self.orig_utcnow = utils.utcnow
+
+    def tearDown(self):
+        super(ConductorManagerTest, self).tearDown()
+        utils.utcnow = self.orig_utcnow
+        for instance_id in self.ids:
+            InstanceServiceStatus.find_all(instance_id=instance_id).delete()
+            AgentHeartBeat.find_all(instance_id=instance_id).delete()
+
+    def _receive(self, seconds, method, *args, **kwargs):
+        """Calls a manager method as if received seconds after received_at."""
+        utils.utcnow = Mock(return_value=self.received_at +
+                            datetime.timedelta(seconds=seconds))
+        try:
+            method(None, *args, **kwargs)
+        finally:
+            utils.utcnow = self.orig_utcnow
+
+    def _status(self, instance_id):
+        return InstanceServiceStatus.find_by(instance_id=instance_id).status
+
+    def _heartbeat(self, instance_id):
+        return AgentHeartBeat.find_by(instance_id=instance_id).updated_at
+
+    def test_write_reports(self):
+        self._receive(0, self.manager.update_status, self.ids[0],
+                      ServiceStatuses.RUNNING.code)
+        self._receive(0, self.manager.update_status, self.ids[1],
+                      ServiceStatuses.SHUTDOWN.code)
+        self._receive(0, self.manager.heartbeat, self.ids[2])
+
+        self.manager.write_reports(None)
+
+        self.assertEqual(ServiceStatuses.RUNNING, self._status(self.ids[0]))
+        self.assertEqual(ServiceStatuses.SHUTDOWN, self._status(self.ids[1]))
+        self.assertEqual(ServiceStatuses.NEW, self._status(self.ids[2]))
+        for instance_id in self.ids:
+            self.assertTrue(self._heartbeat(instance_id) is not None)
+        self.assertEqual(self.received_at, InstanceServiceStatus.find_by(
+            instance_id=self.ids[2]).updated_at)
+        self.assertEqual({}, self.manager.statuses)
+        self.assertEqual({}, self.manager.heartbeats)
+
+    def test_write_reports_one_update_per_status(self):
+        orig_update = InstanceServiceStatus.update_all_in_if_newer
+        InstanceServiceStatus.update_all_in_if_newer = Mock()
+        try:
+            for instance_id in self.ids:
+                self.manager.update_status(None, instance_id,
+                                           ServiceStatuses.RUNNING.code)
+            self.manager.write_reports(None)
+            calls = InstanceServiceStatus.update_all_in_if_newer.call_args_list
+        finally:
+            InstanceServiceStatus.update_all_in_if_newer = orig_update
+        # One for the statuses and one, with no ids, for the heartbeats.
+        self.assertEqual(2, len(calls))
+        args, _ = calls[0]
+        self.assertEqual(sorted(self.ids), sorted(args[1].keys()))
+        self.assertEqual(ServiceStatuses.RUNNING.code, args[3]['status_id'])
+
+    def test_latest_status_wins(self):
+        self._receive(1, self.manager.update_status, self.ids[0],
+                      ServiceStatuses.SHUTDOWN.code)
+        self._receive(0, self.manager.update_status, self.ids[0],
+                      ServiceStatuses.RUNNING.code)
+
+        self.manager.write_reports(None)
+
+        self.assertEqual(ServiceStatuses.SHUTDOWN, self._status(self.ids[0]))
+
+    def test_latest_status_wins_across_conductors(self):
+        other = Manager()
+        self._receive(1, self.manager.update_status, self.ids[0],
+                      ServiceStatuses.SHUTDOWN.code)
+        self._receive(0, other.update_status, self.ids[0],
+                      ServiceStatuses.RUNNING.code)
+
+        self.manager.write_reports(None)
+        other.write_reports(None)
+
+        self.assertEqual(ServiceStatuses.SHUTDOWN, self._status(self.ids[0]))
+
+    def test_status_received_before_a_later_write_is_ignored(self):
+        self.manager.update_status(None, self.ids[0],
+                                   ServiceStatuses.RUNNING.code)
+        # The taskmanager pauses the status before the report is written.
+        status = InstanceServiceStatus.find_by(instance_id=self.ids[0])
+        status.set_status(ServiceStatuses.PAUSED)
+        status.save()
+
+        self.manager.write_reports(None)
+
+        self.assertEqual(ServiceStatuses.PAUSED, self._status(self.ids[0]))
+
+    def test_heartbeat_with_status_repairs_status(self):
+        self._receive(0, self.manager.heartbeat, self.ids[0],
+                      status_id=ServiceStatuses.RUNNING.code)
+
+        self.manager.write_reports(None)
+
+        self.assertEqual(ServiceStatuses.RUNNING, self._status(self.ids[0]))
+        self.assertTrue(self._heartbeat(self.ids[0]) is not None)
+
+    def test_write_reports_failed_keeps_reports(self):
+        self.manager._write = Mock(side_effect=Exception("db is down"))
+        self._receive(0, self.manager.update_status, self.ids[0],
+                      ServiceStatuses.RUNNING.code)
+        self._receive(0, self.manager.heartbeat, self.ids[1])
+
+        self.manager.write_reports(None)
+
+        self.assertEqual((self.received_at, ServiceStatuses.RUNNING.code),
+                         self.manager.statuses[self.ids[0]])
+        self.assertEqual(self.received_at,
+                         self.manager.heartbeats[self.ids[1]])
+
+    def test_write_reports_nothing_to_write(self):
+        self.manager._write = Mock()
+        self.manager.write_reports(None)
+        self.assertFalse(self.manager._write.called)
@@ -0,0 +1,77 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import testtools
+from mock import Mock
+from reddwarf.db.sqlalchemy import api
+from reddwarf.instance.models import InstanceServiceStatus
+from reddwarf.instance.models import ServiceStatuses
+from reddwarf.tests.unittests.util import util
+
+
+class FindAllInTest(testtools.TestCase):
+
+    def setUp(self):
+        super(FindAllInTest, self).setUp()
+        util.init_db()
+        self.orig_chunk_size = api.IN_CLAUSE_CHUNK_SIZE
+        self.orig_query_by = api._query_by
+        api.IN_CLAUSE_CHUNK_SIZE = 2
+        api._query_by = Mock(wraps=api._query_by)
+        self.statuses = []
+        for index in range(5):
+            status = (ServiceStatuses.RUNNING if index % 2
+                      else ServiceStatuses.SHUTDOWN)
+            self.statuses.append(InstanceServiceStatus.create(
+                instance_id="instance-%d" % index, status=status))
+        self.ids = [status.instance_id for status in self.statuses]
+
+    def tearDown(self):
+        super(FindAllInTest, self).tearDown()
+        api.IN_CLAUSE_CHUNK_SIZE = self.orig_chunk_size
+        api._query_by = self.orig_query_by
+        for status in self.statuses:
+            status.delete()
+
+    def _instance_ids(self, statuses):
+        return sorted(status.instance_id for status in statuses)
+
+    def test_chunks(self):
+        found = InstanceServiceStatus.find_all_in('instance_id',
+                                                  self.ids + ["unknown"])
+        self.assertEqual(self.ids, self._instance_ids(found))
+        self.assertEqual(3, api._query_by.call_count)
+
+    def test_empty_values(self):
+        self.assertEqual([], InstanceServiceStatus.find_all_in('instance_id',
+                                                               []))
+        self.assertFalse(api._query_by.called)
+
+    def test_conditions(self):
+        found = InstanceServiceStatus.find_all_in(
+            'instance_id', self.ids,
+            status_id=ServiceStatuses.RUNNING.code)
+        self.assertEqual(["instance-1", "instance-3"],
+                         self._instance_ids(found))
+
+    def test_find_all_by_instance_ids(self):
+        found = InstanceServiceStatus.find_all_by_instance_ids(
+            ["instance-0", "instance-4", "unknown"])
+        self.assertEqual(["instance-0", "instance-4"], sorted(found.keys()))
+        self.assertEqual(ServiceStatuses.SHUTDOWN,
+                         found["instance-4"].status)
+
+    def test_find_all_by_instance_ids_empty(self):
+        found = InstanceServiceStatus.find_all_by_instance_ids([])
+        self.assertEqual({}, found)
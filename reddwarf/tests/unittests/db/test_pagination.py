@@ -0,0 +1,141 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import urlparse
+from datetime import datetime
+from datetime import timedelta
+
+import testtools
+from reddwarf.common import exception
+from reddwarf.instance.models import DBInstance
+from reddwarf.instance.tasks import InstanceTasks
+from reddwarf.tests.unittests.util import util
+
+
+SORT_KEYS = ['created', 'id']
+
+
+class KeysetPaginationTest(testtools.TestCase):
+
+    def setUp(self):
+        super(KeysetPaginationTest, self).setUp()
+        util.init_db()
+        start = datetime(2013, 1, 1)
+        # Several rows share a created time so the id has to break ties.
+        offsets = [0, 0, 0, 1, 1, 2, 3]
+        self.db_infos = []
+        for index, offset in enumerate(offsets):
+            db_info = DBInstance.create(name="instance-%d" % index,
+                                        tenant_id="paging",
+                                        task_status=InstanceTasks.NONE)
+            db_info.created = start + timedelta(seconds=offset)
+            self.db_infos.append(db_info.save())
+        self.expected = [db_info.id for db_info in
+                         sorted(self.db_infos,
+                                key=lambda db: (db.created, db.id))]
+
+    def tearDown(self):
+        super(KeysetPaginationTest, self).tearDown()
+        for db_info in self.db_infos:
+            db_info.delete()
+
+    def _page(self, limit, marker=None, **conditions):
+        conditions.setdefault('deleted', False)
+        query = DBInstance.find_all(tenant_id="paging", **conditions)
+        page, next_marker = query.paginated_collection(limit=limit,
+                                                       marker=marker,
+                                                       sort_keys=SORT_KEYS)
+        return [db_info.id for db_info in page], next_marker
+
+    def test_pages_with_ties(self):
+        ids, marker = self._page(2)
+        self.assertEqual(self.expected[0:2], ids)
+        self.assertEqual(self.expected[1], marker)
+        ids, marker = self._page(2, marker)
+        self.assertEqual(self.expected[2:4], ids)
+        self.assertEqual(self.expected[3], marker)
+
+    def test_last_page(self):
+        ids, marker = self._page(2, self.expected[4])
+        self.assertEqual(self.expected[5:7], ids)
+        self.assertEqual(None, marker)
+
+    def test_marker_on_last_row(self):
+        self.assertEqual(([], None), self._page(2, self.expected[-1]))
+
+    def test_deleted_marker(self):
+        deleted = DBInstance.find_by(id=self.expected[2])
+        deleted.deleted = True
+        deleted.save()
+        ids, marker = self._page(2, self.expected[2])
+        self.assertEqual(self.expected[3:5], ids)
+
+    def test_unknown_marker(self):
+        self.assertRaises(exception.BadRequest, self._page, 2, "unknown")
+
+    def test_marker_of_other_tenant(self):
+        other = DBInstance.create(name="other", tenant_id="other",
+                                  task_status=InstanceTasks.NONE)
+        self.db_infos.append(other)
+        self.assertRaises(exception.BadRequest, self._page, 2, other.id)
+
+    def test_next_links_walk_every_row_once(self):
+        url = "http://localhost/v1.0/tenant/instances"
+        seen = []
+        marker = None
+        while True:
+            query = DBInstance.find_all(tenant_id="paging", deleted=False)
+            view = DBInstance.find_by_pagination('instances', query, url,
+                                                 limit=3, marker=marker,
+                                                 sort_keys=SORT_KEYS)
+            seen += [db_info.id for db_info in view.collection]
+            links = view.data()['links']()
+            if not links:
+                break
+            query_string = urlparse.urlparse(links[0]['href']).query
+            marker = urlparse.parse_qs(query_string)['marker'][0]
+        self.assertEqual(self.expected, seen)
+
+
+class MarkerColumnPaginationTest(testtools.TestCase):
+
+    def setUp(self):
+        super(MarkerColumnPaginationTest, self).setUp()
+        util.init_db()
+        self.db_infos = [DBInstance.create(name="instance-%d" % index,
+                                           tenant_id="paging",
+                                           task_status=InstanceTasks.NONE)
+                         for index in range(5)]
+
+    def tearDown(self):
+        super(MarkerColumnPaginationTest, self).tearDown()
+        for db_info in self.db_infos:
+            db_info.delete()
+
+    def _page(self, limit, marker=None):
+        query = DBInstance.find_all(tenant_id="paging", deleted=False)
+        page, next_marker = query.paginated_collection(
+            limit=limit, marker=marker, marker_column=DBInstance.name)
+        return [db_info.name for db_info in page], next_marker
+
+    def test_marker_is_last_row_shown(self):
+        self.assertEqual((["instance-0", "instance-1"], "instance-1"),
+                         self._page(2))
+        self.assertEqual((["instance-2", "instance-3"], "instance-3"),
+                         self._page(2, "instance-1"))
+        self.assertEqual((["instance-4"], None), self._page(2, "instance-3"))
+
+    def test_exact_last_page(self):
+        self.assertEqual((["instance-%d" % index for index in range(5)],
+                          None), self._page(5))
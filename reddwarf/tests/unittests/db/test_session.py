@@ -0,0 +1,216 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import os
+import tempfile
+
+import eventlet
+import sqlalchemy
+import testtools
+from mock import Mock
+from sqlalchemy import orm
+from reddwarf.db.sqlalchemy import api
+from reddwarf.db.sqlalchemy import session
+
+
+class RequestSessionTest(testtools.TestCase):
+
+    def setUp(self):
+        super(RequestSessionTest, self).setUp()
+        self.orig_new_session = session._new_session
+        session._new_session = Mock(side_effect=lambda *args: Mock())
+
+    def tearDown(self):
+        super(RequestSessionTest, self).tearDown()
+        session._new_session = self.orig_new_session
+
+    def test_request_shares_one_session(self):
+        with session.request_session() as request_session:
+            self.assertEqual(request_session, session.get_session())
+            self.assertEqual(request_session, session.get_session())
+        self.assertEqual(1, session._new_session.call_count)
+        request_session.close.assert_called_once_with()
+
+    def test_nested_request_reuses_session(self):
+        with session.request_session() as outer:
+            with session.request_session() as inner:
+                self.assertEqual(outer, inner)
+            self.assertFalse(outer.close.called)
+        outer.close.assert_called_once_with()
+
+    def test_session_outside_request_is_new(self):
+        with session.request_session() as request_session:
+            pass
+        self.assertNotEqual(request_session, session.get_session())
+
+    def test_session_not_shared_between_greenthreads(self):
+        with session.request_session() as request_session:
+            other = eventlet.spawn(session.get_session).wait()
+            self.assertNotEqual(request_session, other)
+
+    def test_session_closed_after_error(self):
+        def fail():
+            with session.request_session() as request_session:
+                self.request_session = request_session
+                raise ValueError()
+        self.assertRaises(ValueError, fail)
+        self.request_session.close.assert_called_once_with()
+        self.assertNotEqual(self.request_session, session.get_session())
+
+
+class PoolMetricsTest(testtools.TestCase):
+
+    def test_checkouts(self):
+        metrics = session.PoolMetrics()
+        metrics.on_checkout(None, None, None)
+        metrics.on_checkout(None, None, None)
+        metrics.on_checkin(None, None)
+        metrics.on_checkout(None, None, None)
+        stats = metrics.stats()
+        self.assertEqual(3, stats['checkouts'])
+        self.assertEqual(2, stats['checked_out'])
+        self.assertEqual(2, stats['max_checked_out'])
+
+    def test_waits(self):
+        metrics = session.PoolMetrics()
+        metrics.add_wait(0.5)
+        metrics.add_wait(1.5)
+        stats = metrics.stats()
+        self.assertEqual(2, stats['waits'])
+        self.assertEqual(2.0, stats['wait_time'])
+        self.assertEqual(1.5, stats['max_wait_time'])
+
+
+class TransactionTest(testtools.TestCase):
+
+    def setUp(self):
+        super(TransactionTest, self).setUp()
+        self.session = Mock()
+        self.session.transaction = None
+
+        def begin():
+            self.session.transaction = Mock()
+        self.session.begin.side_effect = begin
+        self.orig_new_session = session._new_session
+        session._new_session = Mock(return_value=self.session)
+
+    def tearDown(self):
+        super(TransactionTest, self).tearDown()
+        session._new_session = self.orig_new_session
+
+    def test_commit(self):
+        with session.transaction() as transaction_session:
+            self.assertEqual(self.session, session.get_session())
+        transaction_session.begin.assert_called_once_with()
+        transaction_session.commit.assert_called_once_with()
+        self.assertFalse(transaction_session.rollback.called)
+        transaction_session.close.assert_called_once_with()
+
+    def test_rollback(self):
+        def fail():
+            with session.transaction():
+                raise ValueError()
+        self.assertRaises(ValueError, fail)
+        self.assertFalse(self.session.commit.called)
+        self.session.rollback.assert_called_once_with()
+        self.session.close.assert_called_once_with()
+
+    def test_nested_transaction_joins_outer(self):
+        with session.transaction():
+            with session.transaction():
+                pass
+            self.assertFalse(self.session.commit.called)
+        self.session.begin.assert_called_once_with()
+        self.session.commit.assert_called_once_with()
+
+
+class Widget(object):
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+widgets = sqlalchemy.Table(
+    'widgets', sqlalchemy.MetaData(),
+    sqlalchemy.Column('id', sqlalchemy.String(36), primary_key=True),
+    sqlalchemy.Column('name', sqlalchemy.String(255)))
+
+orm.mapper(Widget, widgets)
+
+
+class ReplicaRoutingTest(testtools.TestCase):
+    """Routes the sessions between a primary and a replica SQLite file."""
+
+    def setUp(self):
+        super(ReplicaRoutingTest, self).setUp()
+        self.orig_engines = (session._ENGINE, session._MAKER,
+                             session._REPLICA_ENGINE, session._REPLICA_MAKER)
+        self.paths = []
+        session._ENGINE = self._engine("primary")
+        session._REPLICA_ENGINE = self._engine("replica")
+        session._MAKER = None
+        session._REPLICA_MAKER = None
+
+    def tearDown(self):
+        super(ReplicaRoutingTest, self).tearDown()
+        session._ENGINE.dispose()
+        session._REPLICA_ENGINE.dispose()
+        (session._ENGINE, session._MAKER,
+         session._REPLICA_ENGINE, session._REPLICA_MAKER) = self.orig_engines
+        for path in self.paths:
+            os.remove(path)
+
+    def _engine(self, name):
+        fd, path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        self.paths.append(path)
+        engine = sqlalchemy.create_engine("sqlite:///%s" % path)
+        widgets.create(engine)
+        engine.execute(widgets.insert(), id="1", name=name)
+        return engine
+
+    def _names(self, engine):
+        return [row.name for row in engine.execute(widgets.select())]
+
+    def test_read_only_request_reads_replica(self):
+        with session.request_session(read_only=True):
+            self.assertEqual("replica", api.find_by(Widget, id="1").name)
+
+    def test_request_reads_primary(self):
+        with session.request_session():
+            self.assertEqual("primary", api.find_by(Widget, id="1").name)
+
+    def test_no_request_reads_primary(self):
+        self.assertEqual("primary", api.find_by(Widget, id="1").name)
+
+    def test_read_only_request_writes_primary(self):
+        with session.request_session(read_only=True):
+            api.save(Widget("2", "new"))
+            api.update_all(api._query_by, Widget, {'id': "1"},
+                           {'name': "renamed"})
+        self.assertEqual(["renamed", "new"],
+                         self._names(session._ENGINE))
+        self.assertEqual(["replica"], self._names(session._REPLICA_ENGINE))
+
+    def test_read_only_without_replica(self):
+        session._REPLICA_ENGINE.dispose()
+        replica = session._REPLICA_ENGINE
+        session._REPLICA_ENGINE = None
+        try:
+            with session.request_session(read_only=True):
+                self.assertEqual("primary",
+                                 api.find_by(Widget, id="1").name)
+        finally:
+            session._REPLICA_ENGINE = replica
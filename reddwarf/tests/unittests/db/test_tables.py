@@ -0,0 +1,57 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import os
+import tempfile
+
+import sqlalchemy
+import testtools
+from reddwarf.db.sqlalchemy import migration
+from reddwarf.db.sqlalchemy import tables
+
+
+class TablesMatchMigrationsTest(testtools.TestCase):
+    """The static tables must describe the schema the migrations create."""
+
+    def setUp(self):
+        super(TablesMatchMigrationsTest, self).setUp()
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        url = "sqlite:///%s" % self.path
+        migration.db_sync({'sql_connection': url})
+        self.engine = sqlalchemy.create_engine(url)
+        self.migrated = sqlalchemy.MetaData()
+        self.migrated.reflect(bind=self.engine)
+
+    def tearDown(self):
+        super(TablesMatchMigrationsTest, self).tearDown()
+        self.engine.dispose()
+        os.remove(self.path)
+
+    def test_columns(self):
+        for name, table in tables.meta.tables.items():
+            migrated = self.migrated.tables[name]
+            self.assertEqual(sorted(migrated.columns.keys()),
+                             sorted(table.columns.keys()))
+            self.assertEqual(
+                [column.name for column in migrated.primary_key],
+                [column.name for column in table.primary_key])
+
+    def test_indexes(self):
+        for name, table in tables.meta.tables.items():
+            migrated = self.migrated.tables[name]
+            expected = set(index.name for index in table.indexes)
+            actual = set(index.name for index in migrated.indexes)
+            self.assertTrue(expected.issubset(actual),
+                            "%s lacks indexes %s" % (name, expected - actual))
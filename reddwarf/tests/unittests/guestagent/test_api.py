@@ -14,11 +14,13 @@
 import testtools
 from mock import Mock, MagicMock
 from reddwarf.openstack.common import rpc
+from reddwarf.openstack.common.rpc import common as rpc_common
 from reddwarf.openstack.common.rpc import proxy
 from reddwarf.openstack.common.rpc import impl_kombu as kombu
 from reddwarf.guestagent import models as agent_models
 from reddwarf.common import exception
 from reddwarf.guestagent import api
+from reddwarf.guestagent import circuit
 
 
 class ApiTest(testtools.TestCase):
@@ -37,6 +39,8 @@ class ApiTest(testtools.TestCase):
         self.origin_object = agent_models.AgentHeartBeat.find_by
         agent_models.AgentHeartBeat.find_by = Mock()
         self.origin_is_active = agent_models.AgentHeartBeat.is_active
+        self.origin_find_active_instance_ids = \
+            agent_models.AgentHeartBeat.find_active_instance_ids
 
         self.origin_api_id = self.api.id
 
@@ -46,14 +50,31 @@ class ApiTest(testtools.TestCase):
         proxy.RpcProxy.cast = self.origin_rpc_cast
 
         agent_models.AgentHeartBeat.is_active = self.origin_is_active
+        agent_models.AgentHeartBeat.find_active_instance_ids = \
+            self.origin_find_active_instance_ids
         agent_models.AgentHeartBeat.find_by = self.origin_object
 
         self.api.id = self.origin_api_id
+        circuit._circuits.clear()
 
     def test__call(self):
         self.api._call(Mock, Mock)
         self.assertEqual(1, self.rpc_call.call_count)
 
+    def test__call_timeouts_open_circuit(self):
+        self.rpc_call.side_effect = rpc_common.Timeout()
+        for _ in range(api.CONF.guest_circuit_failure_threshold):
+            self.assertRaises(exception.GuestTimeout, self.api._call, "m", 1)
+        self.assertRaises(exception.GuestUnavailable, self.api._call, "m", 1)
+        self.assertEqual(api.CONF.guest_circuit_failure_threshold,
+                         self.rpc_call.call_count)
+
+    def test__call_answered_errors_keep_circuit_closed(self):
+        self.rpc_call.side_effect = rpc_common.RemoteError()
+        for _ in range(api.CONF.guest_circuit_failure_threshold + 1):
+            self.assertRaises(exception.GuestError, self.api._call, "m", 1)
+        self.assertEqual(circuit.CLOSED, circuit.get(self.api.id).state)
+
     def test__cast(self):
         self.api._cast(Mock)
         self.assertEqual(1, self.rpc_cast.call_count)
@@ -69,13 +90,28 @@ class ApiTest(testtools.TestCase):
                          self.api._get_routing_key())
 
     def test_check_for_heartbeat_positive(self):
-        agent_models.AgentHeartBeat.is_active = MagicMock(return_value=True)
+        agent_models.AgentHeartBeat.find_active_instance_ids = MagicMock(
+            return_value=set([self.api.id]))
         self.assertTrue(self.api._check_for_hearbeat())
+        agent_models.AgentHeartBeat.find_active_instance_ids.\
+            assert_called_once_with([self.api.id])
 
     def test_check_for_heartbeat_negative(self):
-        agent_models.AgentHeartBeat.is_active = MagicMock(return_value=False)
+        agent_models.AgentHeartBeat.find_active_instance_ids = MagicMock(
+            return_value=set())
         self.assertRaises(exception.GuestTimeout, self.api._check_for_hearbeat)
 
+    def test_get_volume_info_checks_heartbeat(self):
+        agent_models.AgentHeartBeat.find_active_instance_ids = MagicMock(
+            return_value=set())
+        api.CONF.set_override('check_agent_heartbeats', True)
+        try:
+            self.assertRaises(exception.GuestTimeout,
+                              self.api.get_volume_info)
+        finally:
+            api.CONF.clear_override('check_agent_heartbeats')
+        self.assertFalse(self.rpc_call.called)
+
     def test_create_user(self):
         self.api.create_user(Mock)
         self.assertEqual(1, self.rpc_cast.call_count)
@@ -84,10 +120,18 @@ class ApiTest(testtools.TestCase):
         self.api.list_users()
         self.assertEqual(1, self.rpc_call.call_count)
 
+    def test_users_exist(self):
+        self.api.users_exist(["user1", "user2"])
+        self.assertEqual(1, self.rpc_call.call_count)
+
     def test_delete_user(self):
         self.api.delete_user(Mock)
         self.assertEqual(1, self.rpc_cast.call_count)
 
+    def test_report_status(self):
+        self.api.report_status()
+        self.assertEqual(1, self.rpc_cast.call_count)
+
     def test_create_database(self):
         self.api.create_database(Mock)
         self.assertEqual(1, self.rpc_cast.call_count)
@@ -96,6 +140,10 @@ class ApiTest(testtools.TestCase):
         self.api.list_databases()
         self.assertEqual(1, self.rpc_call.call_count)
 
+    def test_databases_exist(self):
+        self.api.databases_exist(["db1", "db2"])
+        self.assertEqual(1, self.rpc_call.call_count)
+
     def test_delete_database(self):
         self.api.delete_database(Mock)
         self.assertEqual(1, self.rpc_cast.call_count)
@@ -116,6 +164,14 @@ class ApiTest(testtools.TestCase):
         self.api.get_hwinfo()
         self.assertEqual(1, self.rpc_call.call_count)
 
+    def test_get_pool_stats(self):
+        self.api.get_pool_stats()
+        self.assertEqual(1, self.rpc_call.call_count)
+
+    def test_get_status_report_stats(self):
+        self.api.get_status_report_stats()
+        self.assertEqual(1, self.rpc_call.call_count)
+
     def test_get_diagnostics(self):
         self.api.get_diagnostics()
         self.assertEqual(1, self.rpc_call.call_count)
@@ -136,6 +192,26 @@ class ApiTest(testtools.TestCase):
         self.api.get_volume_info()
         self.assertEqual(1, self.rpc_call.call_count)
 
+    def test_get_volume_info_from_cache_while_unavailable(self):
+        self.rpc_call.return_value = {'used': 1.5}
+        self.assertEqual({'used': 1.5}, self.api.get_volume_info())
+        circuit.get(self.api.id)._open()
+        self.assertEqual({'used': 1.5}, self.api.get_volume_info())
+        self.assertEqual(1, self.rpc_call.call_count)
+
+    def test_get_volume_info_from_cache_on_timeout(self):
+        self.rpc_call.return_value = {'used': 1.5}
+        self.api.get_volume_info()
+        self.rpc_call.side_effect = rpc_common.Timeout()
+        self.assertEqual({'used': 1.5}, self.api.get_volume_info())
+        self.assertEqual(1, circuit.get(self.api.id).failures)
+
+    def test_get_volume_info_unavailable_without_cache(self):
+        circuit.get(self.api.id)._open()
+        self.assertRaises(exception.GuestUnavailable,
+                          self.api.get_volume_info)
+        self.assertFalse(self.rpc_call.called)
+
     def test_update_guest(self):
         self.api.update_guest()
         self.assertEqual(1, self.rpc_call.call_count)
@@ -0,0 +1,139 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import testtools
+from mock import Mock
+from reddwarf.guestagent import circuit
+from reddwarf.guestagent import models as agent_models
+from reddwarf.taskmanager.manager import Manager
+
+
+class GuestCircuitTest(testtools.TestCase):
+
+    def setUp(self):
+        super(GuestCircuitTest, self).setUp()
+        self.orig_find_active = \
+            agent_models.AgentHeartBeat.find_active_instance_ids
+        agent_models.AgentHeartBeat.find_active_instance_ids = Mock(
+            return_value=set(["instance-1"]))
+        circuit.CONF.set_override('guest_circuit_failure_threshold', 2)
+        self.circuit = circuit.get("instance-1")
+
+    def tearDown(self):
+        super(GuestCircuitTest, self).tearDown()
+        agent_models.AgentHeartBeat.find_active_instance_ids = \
+            self.orig_find_active
+        circuit.CONF.clear_override('guest_circuit_failure_threshold')
+        circuit.CONF.clear_override('check_agent_heartbeats')
+        circuit._circuits.clear()
+
+    def _expire_open(self):
+        self.circuit.opened_at -= circuit.CONF.guest_circuit_reset_timeout
+
+    def test_opens_after_threshold(self):
+        self.circuit.record_timeout()
+        self.assertTrue(self.circuit.allow_call())
+        self.circuit.record_timeout()
+        self.assertEqual(circuit.OPEN, self.circuit.state)
+        self.assertFalse(self.circuit.allow_call())
+
+    def test_success_resets_failures(self):
+        self.circuit.record_timeout()
+        self.circuit.record_success()
+        self.circuit.record_timeout()
+        self.assertEqual(circuit.CLOSED, self.circuit.state)
+
+    def test_half_open_allows_single_probe(self):
+        self.circuit.record_timeout()
+        self.circuit.record_timeout()
+        self._expire_open()
+        self.assertTrue(self.circuit.allow_call())
+        self.assertEqual(circuit.HALF_OPEN, self.circuit.state)
+        self.assertFalse(self.circuit.allow_call())
+
+    def test_half_open_closes_on_success(self):
+        self.circuit.record_timeout()
+        self.circuit.record_timeout()
+        self._expire_open()
+        self.circuit.allow_call()
+        self.circuit.record_success()
+        self.assertEqual(circuit.CLOSED, self.circuit.state)
+        self.assertTrue(self.circuit.allow_call())
+
+    def test_half_open_reopens_on_timeout(self):
+        self.circuit.record_timeout()
+        self.circuit.record_timeout()
+        self._expire_open()
+        self.circuit.allow_call()
+        self.circuit.record_timeout()
+        self.assertEqual(circuit.OPEN, self.circuit.state)
+        self.assertFalse(self.circuit.allow_call())
+
+    def test_stale_heartbeat_opens_at_once(self):
+        circuit.CONF.set_override('check_agent_heartbeats', True)
+        agent_models.AgentHeartBeat.find_active_instance_ids.return_value = \
+            set()
+        self.circuit.record_timeout()
+        self.assertEqual(circuit.OPEN, self.circuit.state)
+
+    def test_stale_heartbeat_prevents_probe(self):
+        circuit.CONF.set_override('check_agent_heartbeats', True)
+        agent_models.AgentHeartBeat.find_active_instance_ids.return_value = \
+            set()
+        self.circuit.record_timeout()
+        self._expire_open()
+        self.assertFalse(self.circuit.allow_call())
+        self.assertEqual(circuit.OPEN, self.circuit.state)
+
+    def test_get_circuit_stats(self):
+        circuit.get("instance-2")
+        self.circuit.record_timeout()
+        self.circuit.record_timeout()
+        stats = circuit.get_circuit_stats()
+        self.assertEqual(["instance-1"], stats.keys())
+        self.assertEqual(circuit.OPEN, stats["instance-1"]['state'])
+        self.assertEqual(2, stats["instance-1"]['failures'])
+
+    def test_log_circuit_stats(self):
+        orig_log = circuit.LOG
+        circuit.LOG = Mock()
+        try:
+            circuit.get("instance-2")
+            self.circuit.record_timeout()
+            self.circuit.record_timeout()
+            Manager().log_guest_circuits(None)
+            calls = circuit.LOG.info.call_args_list
+        finally:
+            circuit.LOG = orig_log
+        self.assertEqual(1, len(calls))
+        message = calls[0][0][0]
+        self.assertTrue("instance-1" in message)
+        self.assertTrue(circuit.OPEN in message)
+
+    def test_start_logging_circuit_stats_once(self):
+        orig_looping_call = circuit.loopingcall.LoopingCall
+        circuit.loopingcall.LoopingCall = Mock()
+        try:
+            circuit.start_logging_circuit_stats()
+            circuit.start_logging_circuit_stats()
+            looping_call = circuit.loopingcall.LoopingCall
+        finally:
+            circuit.loopingcall.LoopingCall = orig_looping_call
+            circuit._stats_logger = None
+        looping_call.assert_called_once_with(circuit.log_circuit_stats)
+        self.assertEqual(1, looping_call.return_value.start.call_count)
+
+    def test_remove(self):
+        circuit.remove("instance-1")
+        self.assertFalse(circuit.get("instance-1") is self.circuit)
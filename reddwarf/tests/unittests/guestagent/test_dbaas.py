@@ -13,16 +13,21 @@
 #    under the License.
 
 from mock import Mock, MagicMock
+import os
+import shutil
+import tempfile
 import testtools
 from random import randint
 import time
 import reddwarf.guestagent.dbaas as dbaas
+from reddwarf.common.exception import PollTimeOut
 from reddwarf.guestagent.db import models
 from reddwarf.guestagent.dbaas import MySqlAdmin
 from reddwarf.guestagent.dbaas import MySqlApp
 from reddwarf.guestagent.dbaas import MySqlAppStatus
 from reddwarf.guestagent.dbaas import Interrogator
 from reddwarf.guestagent.dbaas import KeepAliveConnection
+from reddwarf.guestagent.manager import Manager
 from reddwarf.instance.models import ServiceStatuses
 from reddwarf.instance.models import InstanceServiceStatus
 from reddwarf.tests.unittests.util import util
@@ -107,6 +112,14 @@ class DbaasTest(testtools.TestCase):
         self.assertFalse(dbaas.load_mysqld_options())
 
 
+class FakeResult(list):
+    """A result set which also knows its row count."""
+
+    @property
+    def rowcount(self):
+        return len(self)
+
+
 class MySqlAdminTest(testtools.TestCase):
 
     def setUp(self):
@@ -306,7 +319,7 @@ class EnableRootTest(MySqlAdminTest):
     def test_list_databases_with_marker(self):
         marker = "aMarker"
         self.mySqlAdmin.list_databases(marker=marker)
-        args, _ = dbaas.LocalSqlClient.execute.call_args
+        args, kwargs = dbaas.LocalSqlClient.execute.call_args
 
         self.assertTrue("SELECT schema_name as name," in args[0].text)
         self.assertTrue("default_character_set_name as charset,"
@@ -323,12 +336,13 @@ class EnableRootTest(MySqlAdminTest):
 
         self.assertFalse("LIMIT " in args[0].text)
 
-        self.assertTrue("AND schema_name > '" + marker + "'" in args[0].text)
+        self.assertTrue("AND schema_name > :marker" in args[0].text)
+        self.assertEqual({'marker': marker}, kwargs)
 
     def test_list_databases_with_include_marker(self):
         marker = "aMarker"
         self.mySqlAdmin.list_databases(marker=marker, include_marker=True)
-        args, _ = dbaas.LocalSqlClient.execute.call_args
+        args, kwargs = dbaas.LocalSqlClient.execute.call_args
 
         self.assertTrue("SELECT schema_name as name," in args[0].text)
         self.assertTrue("default_character_set_name as charset,"
@@ -346,7 +360,36 @@ class EnableRootTest(MySqlAdminTest):
 
         self.assertFalse("LIMIT " in args[0].text)
 
-        self.assertTrue("AND schema_name >= '" + marker + "'" in args[0].text)
+        self.assertTrue("AND schema_name >= :marker" in args[0].text)
+        self.assertEqual({'marker': marker}, kwargs)
+
+    def test_users_exist(self):
+        dbaas.LocalSqlClient.execute = Mock(return_value=[("user2",)])
+        existing = self.mySqlAdmin.users_exist(["user1", "user2", "user3"])
+        self.assertEqual(["user2"], existing)
+        self.assertEqual(1, dbaas.LocalSqlClient.execute.call_count)
+        args, kwargs = dbaas.LocalSqlClient.execute.call_args
+        self.assertTrue("SELECT DISTINCT User" in args[0].text)
+        self.assertTrue("FROM mysql.user" in args[0].text)
+        self.assertTrue("host != 'localhost'" in args[0].text)
+        self.assertTrue("User IN (:name0, :name1, :name2)" in args[0].text)
+        self.assertEqual({'name0': "user1", 'name1': "user2",
+                          'name2': "user3"}, kwargs)
+
+    def test_users_exist_no_names(self):
+        self.assertEqual([], self.mySqlAdmin.users_exist([]))
+        self.assertFalse(dbaas.LocalSqlClient.execute.called)
+
+    def test_databases_exist(self):
+        dbaas.LocalSqlClient.execute = Mock(return_value=[("db1",)])
+        existing = self.mySqlAdmin.databases_exist(["db1", "db2"])
+        self.assertEqual(["db1"], existing)
+        self.assertEqual(1, dbaas.LocalSqlClient.execute.call_count)
+        args, kwargs = dbaas.LocalSqlClient.execute.call_args
+        self.assertTrue("SELECT DISTINCT schema_name" in args[0].text)
+        self.assertTrue("FROM information_schema.schemata" in args[0].text)
+        self.assertTrue("schema_name IN (:name0, :name1)" in args[0].text)
+        self.assertEqual({'name0': "db1", 'name1': "db2"}, kwargs)
 
     def test_list_users(self):
         self.mySqlAdmin.list_users()
@@ -361,6 +404,39 @@ class EnableRootTest(MySqlAdminTest):
         self.assertFalse("LIMIT " in args[0].text)
         self.assertFalse("AND User > '" in args[0].text)
 
+    def test_list_users_one_grants_query(self):
+        users = FakeResult([{'User': "user%d" % i} for i in range(3)])
+        grants = FakeResult([
+            {'grantee': "'user0'@'%'", 'table_schema': "db0"},
+            {'grantee': "'user2'@'%'", 'table_schema': "db0"},
+            {'grantee': "'user2'@'%'", 'table_schema': "db2"},
+        ])
+        dbaas.LocalSqlClient.execute = Mock(side_effect=[users, grants])
+        result, next_marker = self.mySqlAdmin.list_users(limit=2)
+
+        self.assertEqual(2, dbaas.LocalSqlClient.execute.call_count)
+        args, kwargs = dbaas.LocalSqlClient.execute.call_args
+        self.assertTrue("FROM information_schema.SCHEMA_PRIVILEGES"
+                        in args[0].text)
+        self.assertTrue("grantee LIKE :grantee0 OR grantee LIKE :grantee1"
+                        in args[0].text)
+        self.assertEqual({'grantee0': "'user0'@%", 'grantee1': "'user1'@%"},
+                         kwargs)
+        self.assertEqual(["user0", "user1"],
+                         [user['_name'] for user in result])
+        self.assertEqual(["db0"],
+                         [db['_name'] for db in result[0]['_databases']])
+        self.assertEqual([], result[1]['_databases'])
+        self.assertEqual("user1", next_marker)
+
+    def test_list_users_escapes_like(self):
+        users = FakeResult([{'User': "user_1"}])
+        dbaas.LocalSqlClient.execute = Mock(side_effect=[users,
+                                                         FakeResult([])])
+        self.mySqlAdmin.list_users(limit=1)
+        args, kwargs = dbaas.LocalSqlClient.execute.call_args
+        self.assertEqual({'grantee0': "'user\\_1'@%"}, kwargs)
+
     def test_list_users_with_limit(self):
         limit = 2
         self.mySqlAdmin.list_users(limit)
@@ -378,7 +454,7 @@ class EnableRootTest(MySqlAdminTest):
     def test_list_users_with_marker(self):
         marker = "aMarker"
         self.mySqlAdmin.list_users(marker=marker)
-        args, _ = dbaas.LocalSqlClient.execute.call_args
+        args, kwargs = dbaas.LocalSqlClient.execute.call_args
 
         self.assertTrue("SELECT User" in args[0].text)
 
@@ -389,12 +465,13 @@ class EnableRootTest(MySqlAdminTest):
 
         self.assertFalse("LIMIT " in args[0].text)
 
-        self.assertTrue("AND User > '" + marker + "'" in args[0].text)
+        self.assertTrue("AND User > :marker" in args[0].text)
+        self.assertEqual({'marker': marker}, kwargs)
 
     def test_list_users_with_include_marker(self):
         marker = "aMarker"
         self.mySqlAdmin.list_users(marker=marker, include_marker=True)
-        args, _ = dbaas.LocalSqlClient.execute.call_args
+        args, kwargs = dbaas.LocalSqlClient.execute.call_args
 
         self.assertTrue("SELECT User" in args[0].text)
 
@@ -405,7 +482,8 @@ class EnableRootTest(MySqlAdminTest):
 
         self.assertFalse("LIMIT " in args[0].text)
 
-        self.assertTrue("AND User >= '" + marker + "'" in args[0].text)
+        self.assertTrue("AND User >= :marker" in args[0].text)
+        self.assertEqual({'marker': marker}, kwargs)
 
 
 class MySqlAppTest(testtools.TestCase):
@@ -771,6 +849,162 @@ class KeepAliveConnectionTest(testtools.TestCase):
                           dbapi_con, Mock(), Mock())
 
 
+class GuestEnginePoolTest(testtools.TestCase):
+
+    def setUp(self):
+        super(GuestEnginePoolTest, self).setUp()
+        self.orig_ENGINE = dbaas.ENGINE
+        self.orig_POOL_METRICS = dbaas.POOL_METRICS
+        self.orig_create_engine = dbaas.create_engine
+        self.orig_get_auth_password = dbaas.get_auth_password
+        dbaas.ENGINE = None
+        dbaas.POOL_METRICS = dbaas.session.PoolMetrics()
+        dbaas.GuestQueuePool.metrics = dbaas.POOL_METRICS
+        dbaas.get_auth_password = Mock(return_value="password")
+        # MySQL isn't around, so the engine talks to SQLite instead.
+        self.engine = self.orig_create_engine(
+            "sqlite://", poolclass=dbaas.GuestQueuePool, pool_size=2,
+            max_overflow=3)
+        dbaas.create_engine = Mock(return_value=self.engine)
+
+    def tearDown(self):
+        super(GuestEnginePoolTest, self).tearDown()
+        dbaas.ENGINE = self.orig_ENGINE
+        dbaas.POOL_METRICS = self.orig_POOL_METRICS
+        dbaas.GuestQueuePool.metrics = self.orig_POOL_METRICS
+        dbaas.create_engine = self.orig_create_engine
+        dbaas.get_auth_password = self.orig_get_auth_password
+
+    def test_get_engine_is_pooled(self):
+        engine = dbaas.get_engine()
+        self.assertEqual(engine, dbaas.get_engine())
+        self.assertEqual(1, dbaas.create_engine.call_count)
+        kwargs = dbaas.create_engine.call_args[1]
+        self.assertEqual(dbaas.GuestQueuePool, kwargs['poolclass'])
+        self.assertEqual(dbaas.CONF.guest_sql_pool_size,
+                         kwargs['pool_size'])
+        self.assertEqual(dbaas.CONF.guest_sql_max_overflow,
+                         kwargs['max_overflow'])
+        self.assertFalse(kwargs['echo'])
+        self.assertTrue(isinstance(kwargs['listeners'][0],
+                                   KeepAliveConnection))
+
+    def test_get_pool_stats(self):
+        engine = dbaas.get_engine()
+        for _ in range(3):
+            conn = engine.connect()
+            conn.execute("SELECT 1")
+            conn.close()
+        stats = dbaas.get_pool_stats()
+        self.assertEqual(1, stats['connects'])
+        self.assertEqual(3, stats['checkouts'])
+        self.assertEqual(0, stats['checked_out'])
+        self.assertEqual(3, stats['waits'])
+        self.assertEqual(2, stats['pool_size'])
+        self.assertEqual(1, stats['checked_in'])
+
+    def test_get_pool_stats_without_engine(self):
+        stats = dbaas.get_pool_stats()
+        self.assertEqual(0, stats['checkouts'])
+        self.assertFalse('pool_size' in stats)
+
+
+class MySqlLivenessTest(testtools.TestCase):
+
+    def setUp(self):
+        super(MySqlLivenessTest, self).setUp()
+        self.orig_ENGINE = dbaas.ENGINE
+        self.orig_get_engine = dbaas.get_engine
+        self.orig_mycnf_cache = dbaas._mycnf_cache
+        dbaas._mycnf_cache = {}
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(MySqlLivenessTest, self).tearDown()
+        dbaas.ENGINE = self.orig_ENGINE
+        dbaas.get_engine = self.orig_get_engine
+        dbaas._mycnf_cache = self.orig_mycnf_cache
+        shutil.rmtree(self.tmp_dir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def _connect_error(self, code):
+        from sqlalchemy import exc
+        engine = Mock()
+        engine.connect.side_effect = exc.OperationalError(
+            None, None, Exception(code, "error"))
+        dbaas.get_engine = Mock(return_value=engine)
+        return engine
+
+    def test_read_mycnf(self):
+        path = self._write("my.cnf", "[client]\n"
+                                     "password = secret\n"
+                                     "\n"
+                                     "[mysqld]\n"
+                                     "# a comment\n"
+                                     "pid_file = /tmp/mysqld.pid\n"
+                                     "socket=/tmp/mysqld.sock\n"
+                                     "skip-external-locking\n"
+                                     "!includedir /etc/mysql/conf.d/\n")
+        sections = dbaas.read_mycnf(path)
+        self.assertEqual("secret", sections['client']['password'])
+        self.assertEqual({'pid-file': "/tmp/mysqld.pid",
+                          'socket': "/tmp/mysqld.sock",
+                          'skip-external-locking': None},
+                         sections['mysqld'])
+
+    def test_read_mycnf_is_cached_until_modified(self):
+        path = self._write("my.cnf", "[mysqld]\nport = 3306\n")
+        sections = dbaas.read_mycnf(path)
+        self.assertTrue(sections is dbaas.read_mycnf(path))
+        self._write("my.cnf", "[mysqld]\nport = 3307\n")
+        os.utime(path, (0, 0))
+        self.assertEqual("3307", dbaas.read_mycnf(path)['mysqld']['port'])
+
+    def test_read_mycnf_missing(self):
+        self.assertEqual({}, dbaas.read_mycnf(
+            os.path.join(self.tmp_dir, "missing.cnf")))
+
+    def test_ping_mysql(self):
+        dbaas.get_engine = Mock()
+        self.assertTrue(dbaas.ping_mysql())
+
+    def test_ping_mysql_access_denied(self):
+        engine = self._connect_error(1045)
+        dbaas.ENGINE = engine
+        self.assertTrue(dbaas.ping_mysql())
+        self.assertTrue(engine.dispose.called)
+        self.assertEqual(None, dbaas.ENGINE)
+
+    def test_ping_mysql_unreachable(self):
+        self._connect_error(2002)
+        self.assertFalse(dbaas.ping_mysql())
+
+    def test_ping_mysql_unknown_error(self):
+        self._connect_error(1234)
+        self.assertEqual(None, dbaas.ping_mysql())
+
+    def test_mysqld_process_state_running(self):
+        path = self._write("mysqld.pid", "%d\n" % os.getpid())
+        self.assertEqual("running", dbaas.mysqld_process_state(path))
+
+    def test_mysqld_process_state_crashed(self):
+        path = self._write("mysqld.pid", "99999999\n")
+        self.assertEqual("crashed", dbaas.mysqld_process_state(path))
+
+    def test_mysqld_process_state_stopped(self):
+        path = os.path.join(self.tmp_dir, "mysqld.pid")
+        self.assertEqual("stopped", dbaas.mysqld_process_state(path))
+
+    def test_mysqld_process_state_unreadable(self):
+        path = self._write("mysqld.pid", "not a pid")
+        self.assertEqual(None, dbaas.mysqld_process_state(path))
+
+
 class MySqlAppStatusTest(testtools.TestCase):
 
     def setUp(self):
@@ -780,6 +1014,13 @@ class MySqlAppStatusTest(testtools.TestCase):
         self.orig_load_mysqld_options = dbaas.load_mysqld_options
         self.orig_dbaas_os_path_exists = dbaas.os.path.exists
         self.orig_dbaas_time_sleep = dbaas.time.sleep
+        self.orig_read_mycnf = dbaas.read_mycnf
+        self.orig_ping_mysql = dbaas.ping_mysql
+        self.orig_mysqld_process_state = dbaas.mysqld_process_state
+        self.orig_REPORT_COUNTERS = dbaas.REPORT_COUNTERS
+        self.orig_time_time = dbaas.time.time
+        dbaas.read_mycnf = Mock(return_value={})
+        dbaas.REPORT_COUNTERS = dbaas.StatusReportCounters()
         self.FAKE_ID = randint(1, 10000)
         InstanceServiceStatus.create(instance_id=self.FAKE_ID,
                                      status=ServiceStatuses.NEW)
@@ -791,6 +1032,11 @@ class MySqlAppStatusTest(testtools.TestCase):
         dbaas.load_mysqld_options = self.orig_load_mysqld_options
         dbaas.os.path.exists = self.orig_dbaas_os_path_exists
         dbaas.time.sleep = self.orig_dbaas_time_sleep
+        dbaas.read_mycnf = self.orig_read_mycnf
+        dbaas.ping_mysql = self.orig_ping_mysql
+        dbaas.mysqld_process_state = self.orig_mysqld_process_state
+        dbaas.REPORT_COUNTERS = self.orig_REPORT_COUNTERS
+        dbaas.time.time = self.orig_time_time
         InstanceServiceStatus.find_by(instance_id=self.FAKE_ID).delete()
         dbaas.CONF.guest_id = None
 
@@ -824,14 +1070,73 @@ class MySqlAppStatusTest(testtools.TestCase):
 
     def test_get_actual_db_status(self):
 
+        dbaas.os.path.exists = Mock(return_value=True)
+        dbaas.ping_mysql = Mock(return_value=True)
+        dbaas.utils.execute_with_timeout = Mock()
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        status = self.mySqlAppStatus._get_actual_db_status()
+
+        self.assertEqual(ServiceStatuses.RUNNING, status)
+        self.assertFalse(dbaas.utils.execute_with_timeout.called)
+
+    def test_get_actual_db_status_blocked(self):
+
+        dbaas.os.path.exists = Mock(return_value=True)
+        dbaas.ping_mysql = Mock(return_value=False)
+        dbaas.mysqld_process_state = Mock(return_value="running")
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        status = self.mySqlAppStatus._get_actual_db_status()
+
+        self.assertEqual(ServiceStatuses.BLOCKED, status)
+
+    def test_get_actual_db_status_crashed(self):
+
+        dbaas.os.path.exists = Mock(return_value=False)
+        dbaas.ping_mysql = Mock()
+        dbaas.mysqld_process_state = Mock(return_value="crashed")
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        status = self.mySqlAppStatus._get_actual_db_status()
+
+        self.assertEqual(ServiceStatuses.CRASHED, status)
+        self.assertFalse(dbaas.ping_mysql.called)
+
+    def test_get_actual_db_status_shutdown(self):
+
+        dbaas.os.path.exists = Mock(return_value=False)
+        dbaas.mysqld_process_state = Mock(return_value="stopped")
+        dbaas.utils.execute_with_timeout = Mock()
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        status = self.mySqlAppStatus._get_actual_db_status()
+
+        self.assertEqual(ServiceStatuses.SHUTDOWN, status)
+        self.assertFalse(dbaas.utils.execute_with_timeout.called)
+
+    def test_get_actual_db_status_unknown_runs_commands(self):
+
+        dbaas.os.path.exists = Mock(return_value=False)
+        dbaas.mysqld_process_state = Mock(return_value=None)
         dbaas.utils.execute_with_timeout = Mock(return_value=(None, None))
 
         self.mySqlAppStatus = MySqlAppStatus()
         status = self.mySqlAppStatus._get_actual_db_status()
 
         self.assertEqual(ServiceStatuses.RUNNING, status)
+        self.assertTrue(dbaas.utils.execute_with_timeout.called)
 
-    def test_get_actual_db_status_error_shutdown(self):
+    def test_get_status_from_commands(self):
+
+        dbaas.utils.execute_with_timeout = Mock(return_value=(None, None))
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        status = self.mySqlAppStatus._get_status_from_commands()
+
+        self.assertEqual(ServiceStatuses.RUNNING, status)
+
+    def test_get_status_from_commands_error_shutdown(self):
 
         from reddwarf.common.exception import ProcessExecutionError
         dbaas.utils.execute_with_timeout = Mock(side_effect=
@@ -840,11 +1145,11 @@ class MySqlAppStatusTest(testtools.TestCase):
         dbaas.os.path.exists = Mock(return_value=False)
 
         self.mySqlAppStatus = MySqlAppStatus()
-        status = self.mySqlAppStatus._get_actual_db_status()
+        status = self.mySqlAppStatus._get_status_from_commands()
 
         self.assertEqual(ServiceStatuses.SHUTDOWN, status)
 
-    def test_get_actual_db_status_error_crashed(self):
+    def test_get_status_from_commands_error_crashed(self):
 
         from reddwarf.common.exception import ProcessExecutionError
         dbaas.utils.execute_with_timeout = \
@@ -854,10 +1159,146 @@ class MySqlAppStatusTest(testtools.TestCase):
         dbaas.os.path.exists = Mock(return_value=True)
 
         self.mySqlAppStatus = MySqlAppStatus()
-        status = self.mySqlAppStatus._get_actual_db_status()
+        status = self.mySqlAppStatus._get_status_from_commands()
 
         self.assertEqual(ServiceStatuses.BLOCKED, status)
 
+    def test_report_status_changed(self):
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        self.mySqlAppStatus.report_status(ServiceStatuses.RUNNING)
+
+        status = InstanceServiceStatus.find_by(instance_id=self.FAKE_ID)
+        self.assertEqual(ServiceStatuses.RUNNING, status.status)
+        self.assertTrue(status.updated_at is not None)
+        self.assertEqual({'writes': 1, 'heartbeats': 0, 'skipped': 0},
+                         dbaas.get_status_report_stats())
+
+    def test_report_status_unchanged_is_skipped(self):
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        self.mySqlAppStatus.report_status(ServiceStatuses.RUNNING)
+        self.mySqlAppStatus._heartbeat = Mock()
+
+        self.mySqlAppStatus.report_status(ServiceStatuses.RUNNING)
+        self.mySqlAppStatus.report_status(ServiceStatuses.RUNNING)
+
+        self.assertFalse(self.mySqlAppStatus._heartbeat.called)
+        self.assertEqual({'writes': 1, 'heartbeats': 0, 'skipped': 2},
+                         dbaas.get_status_report_stats())
+
+    def test_report_status_unchanged_heartbeat(self):
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        self.mySqlAppStatus.report_status(ServiceStatuses.RUNNING)
+        InstanceServiceStatus.find_all(instance_id=self.FAKE_ID).update(
+            updated_at=None)
+        last_reported = self.mySqlAppStatus.last_reported
+        dbaas.time.time = Mock(return_value=last_reported +
+                               dbaas.CONF.guest_status_heartbeat_interval)
+
+        self.mySqlAppStatus.report_status(ServiceStatuses.RUNNING)
+
+        status = InstanceServiceStatus.find_by(instance_id=self.FAKE_ID)
+        self.assertTrue(status.updated_at is not None)
+        self.assertEqual(ServiceStatuses.RUNNING, status.status)
+        self.assertEqual({'writes': 1, 'heartbeats': 1, 'skipped': 0},
+                         dbaas.get_status_report_stats())
+
+    def test_report_status_repairs_status_changed_elsewhere(self):
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        self.mySqlAppStatus.report_status(ServiceStatuses.RUNNING)
+        self._pause_behind_agents_back()
+
+        self.mySqlAppStatus.report_status(ServiceStatuses.RUNNING)
+
+        status = InstanceServiceStatus.find_by(instance_id=self.FAKE_ID)
+        self.assertEqual(ServiceStatuses.RUNNING, status.status)
+        self.assertEqual({'writes': 2, 'heartbeats': 0, 'skipped': 0},
+                         dbaas.get_status_report_stats())
+
+    def test_heartbeat_repairs_status_changed_elsewhere(self):
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        self.mySqlAppStatus.report_status(ServiceStatuses.RUNNING)
+        self._pause_behind_agents_back()
+
+        self.mySqlAppStatus._heartbeat()
+
+        status = InstanceServiceStatus.find_by(instance_id=self.FAKE_ID)
+        self.assertEqual(ServiceStatuses.RUNNING, status.status)
+        self.assertEqual({'writes': 2, 'heartbeats': 0, 'skipped': 0},
+                         dbaas.get_status_report_stats())
+
+    def _pause_behind_agents_back(self):
+        status = InstanceServiceStatus.find_by(instance_id=self.FAKE_ID)
+        status.set_status(ServiceStatuses.PAUSED)
+        status.save()
+
+    def test_set_status_via_conductor(self):
+
+        orig_conductor_api = dbaas.conductor_api.API
+        dbaas.conductor_api.API = Mock()
+        dbaas.CONF.set_override('guest_status_via_conductor', True)
+        try:
+            self.mySqlAppStatus = MySqlAppStatus()
+            self.mySqlAppStatus._load_status = Mock()
+            self.mySqlAppStatus.set_status(ServiceStatuses.RUNNING)
+            self.mySqlAppStatus._heartbeat()
+            conductor = dbaas.conductor_api.API.return_value
+        finally:
+            dbaas.CONF.clear_override('guest_status_via_conductor')
+            dbaas.conductor_api.API = orig_conductor_api
+
+        self.assertFalse(self.mySqlAppStatus._load_status.called)
+        conductor.update_status.assert_called_once_with(
+            self.FAKE_ID, ServiceStatuses.RUNNING.code)
+        conductor.heartbeat.assert_called_once_with(
+            self.FAKE_ID, ServiceStatuses.RUNNING.code)
+        self.assertEqual(ServiceStatuses.RUNNING, self.mySqlAppStatus.status)
+
+    def test_paused_via_conductor_is_repaired_when_asked(self):
+
+        orig_conductor_api = dbaas.conductor_api.API
+        dbaas.conductor_api.API = Mock()
+        dbaas.CONF.set_override('guest_status_via_conductor', True)
+        try:
+            self.mySqlAppStatus = MySqlAppStatus()
+            self.mySqlAppStatus._get_actual_db_status = \
+                Mock(return_value=ServiceStatuses.RUNNING)
+            self.mySqlAppStatus.update()
+            # The taskmanager pauses the status after the guest came up;
+            # the guest can't see that and has nothing new to say.
+            self._pause_behind_agents_back()
+            self.mySqlAppStatus.update()
+            conductor = dbaas.conductor_api.API.return_value
+            self.assertEqual(1, conductor.update_status.call_count)
+            # Until the taskmanager asks it to report again.
+            MySqlAppStatus._instance = self.mySqlAppStatus
+            Manager().report_status(None)
+        finally:
+            MySqlAppStatus._instance = None
+            dbaas.CONF.clear_override('guest_status_via_conductor')
+            dbaas.conductor_api.API = orig_conductor_api
+
+        self.assertEqual(2, conductor.update_status.call_count)
+        conductor.update_status.assert_called_with(
+            self.FAKE_ID, ServiceStatuses.RUNNING.code)
+
+    def test_update_reports_status(self):
+
+        self.mySqlAppStatus = MySqlAppStatus()
+        self.mySqlAppStatus.status = ServiceStatuses.RUNNING
+        self.mySqlAppStatus._get_actual_db_status = \
+            Mock(return_value=ServiceStatuses.SHUTDOWN)
+        self.mySqlAppStatus.report_status = Mock()
+
+        self.mySqlAppStatus.update()
+
+        self.mySqlAppStatus.report_status.assert_called_once_with(
+            ServiceStatuses.SHUTDOWN)
+
     def test_is_mysql_installed(self):
 
         self.mySqlAppStatus = MySqlAppStatus()
@@ -923,8 +1364,12 @@ class MySqlAppStatusTest(testtools.TestCase):
         self.mySqlAppStatus = MySqlAppStatus()
         self.mySqlAppStatus._get_actual_db_status = \
             Mock(return_value=ServiceStatuses.RUNNING)
-        dbaas.time.sleep = Mock()
-
-        self.assertFalse(self.mySqlAppStatus.
-                         wait_for_real_status_to_change_to
-                         (ServiceStatuses.SHUTDOWN, 10))
+        orig_poll_until = dbaas.utils.poll_until
+        dbaas.utils.poll_until = Mock(side_effect=PollTimeOut)
+
+        try:
+            self.assertFalse(self.mySqlAppStatus.
+                             wait_for_real_status_to_change_to
+                             (ServiceStatuses.SHUTDOWN, 10))
+        finally:
+            dbaas.utils.poll_until = orig_poll_until
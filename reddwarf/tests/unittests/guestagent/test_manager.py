@@ -52,6 +52,37 @@ class GuestAgentManagerTest(testtools.TestCase):
         self.manager.create_user(self.context, users)
         self.assertEqual(1, dbaas.MySqlAdmin.create_user.call_count)
 
+    def test_users_exist(self):
+        dbaas.MySqlAdmin.users_exist = MagicMock(return_value=["user1"])
+        result = self.manager.users_exist(self.context, ["user1", "user2"])
+        self.assertEqual(["user1"], result)
+        dbaas.MySqlAdmin.users_exist.assert_any_call(["user1", "user2"])
+
+    def test_databases_exist(self):
+        dbaas.MySqlAdmin.databases_exist = MagicMock(return_value=[])
+        result = self.manager.databases_exist(self.context, ["db1"])
+        self.assertEqual([], result)
+        dbaas.MySqlAdmin.databases_exist.assert_any_call(["db1"])
+
+    def test_get_pool_stats(self):
+        orig_get_pool_stats = dbaas.get_pool_stats
+        dbaas.get_pool_stats = MagicMock(return_value={'checkouts': 3})
+        try:
+            result = self.manager.get_pool_stats(self.context)
+        finally:
+            dbaas.get_pool_stats = orig_get_pool_stats
+        self.assertEqual({'checkouts': 3}, result)
+
+    def test_get_status_report_stats(self):
+        orig_get_status_report_stats = dbaas.get_status_report_stats
+        dbaas.get_status_report_stats = MagicMock(
+            return_value={'skipped': 3})
+        try:
+            result = self.manager.get_status_report_stats(self.context)
+        finally:
+            dbaas.get_status_report_stats = orig_get_status_report_stats
+        self.assertEqual({'skipped': 3}, result)
+
     def test_delete_database(self):
         databases = Mock()
         dbaas.MySqlAdmin.delete_database = MagicMock()
@@ -19,14 +19,31 @@ from reddwarf.common import utils
 from reddwarf.db.sqlalchemy import api as dbapi
 from reddwarf.db import models as dbmodels
 from datetime import datetime
+from datetime import timedelta
+from reddwarf.tests.unittests.util import util
 
 
 class AgentHeartBeatTest(testtools.TestCase):
     def setUp(self):
         super(AgentHeartBeatTest, self).setUp()
+        self.orig_generate_uuid = utils.generate_uuid
+        self.orig_utcnow = utils.utcnow
+        self.orig_save = dbapi.save
+        self.orig_DatabaseModelBase = dbmodels.DatabaseModelBase
+        self.orig_get_db_api = dbmodels.get_db_api
+        self.orig_AGENT_HEARTBEAT = models.AGENT_HEARTBEAT
 
     def tearDown(self):
         super(AgentHeartBeatTest, self).tearDown()
+        utils.generate_uuid = self.orig_generate_uuid
+        utils.utcnow = self.orig_utcnow
+        dbapi.save = self.orig_save
+        dbmodels.DatabaseModelBase = self.orig_DatabaseModelBase
+        dbmodels.get_db_api = self.orig_get_db_api
+        models.AGENT_HEARTBEAT = self.orig_AGENT_HEARTBEAT
+        # is_valid is inherited; removing the mock exposes it again.
+        if 'is_valid' in dbmodels.DatabaseModelBase.__dict__:
+            del dbmodels.DatabaseModelBase.is_valid
 
     def test_create(self):
         utils.generate_uuid = Mock()
@@ -52,5 +69,55 @@ class AgentHeartBeatTest(testtools.TestCase):
     def test_is_active(self):
         models.AGENT_HEARTBEAT = 10000000000
         mock = models.AgentHeartBeat()
-        models.AgentHeartBeat.__setitem__(mock, 'updated_at', datetime.now())
+        models.AgentHeartBeat.__setitem__(mock, 'updated_at',
+                                          datetime.utcnow())
         self.assertTrue(models.AgentHeartBeat.is_active(mock))
+
+
+class AgentHeartBeatLivenessTest(testtools.TestCase):
+    def setUp(self):
+        super(AgentHeartBeatLivenessTest, self).setUp()
+        util.init_db()
+        self.alive = utils.generate_uuid()
+        self.dead = utils.generate_uuid()
+        self.missing = utils.generate_uuid()
+        models.AgentHeartBeat.create(instance_id=self.alive)
+        models.AgentHeartBeat.create(instance_id=self.dead)
+        models.AgentHeartBeat.find_all(instance_id=self.dead).update(
+            updated_at=datetime.utcnow() - timedelta(
+                seconds=models.AGENT_HEARTBEAT + 60))
+
+    def tearDown(self):
+        super(AgentHeartBeatLivenessTest, self).tearDown()
+        for instance_id in (self.alive, self.dead, self.missing):
+            models.AgentHeartBeat.find_all(instance_id=instance_id).delete()
+
+    def test_find_active_instance_ids(self):
+        active = models.AgentHeartBeat.find_active_instance_ids(
+            [self.alive, self.dead, self.missing])
+        self.assertEqual(set([self.alive]), active)
+
+    def test_find_active_instance_ids_empty(self):
+        self.assertEqual(set(),
+                         models.AgentHeartBeat.find_active_instance_ids([]))
+
+    def test_touch_all(self):
+        models.AgentHeartBeat.touch_all([self.alive, self.dead, self.missing])
+        active = models.AgentHeartBeat.find_active_instance_ids(
+            [self.alive, self.dead, self.missing])
+        self.assertEqual(set([self.alive, self.dead, self.missing]), active)
+        self.assertEqual(1, models.AgentHeartBeat.find_all(
+            instance_id=self.missing).count())
+
+    def test_touch_all_rows_inserted_concurrently(self):
+        # As if another conductor inserted the rows after they were looked
+        # up; the unique index rejects the second insert of each.
+        orig_find_values_in = dbapi.find_values_in
+        dbapi.find_values_in = Mock(return_value=[])
+        try:
+            models.AgentHeartBeat.touch_all([self.alive, self.missing])
+        finally:
+            dbapi.find_values_in = orig_find_values_in
+        for instance_id in (self.alive, self.missing):
+            self.assertEqual(1, models.AgentHeartBeat.find_all(
+                instance_id=instance_id).count())
@@ -72,3 +72,61 @@ class QueryTest(testtools.TestCase):
         limit_count = 20
         myQuery = query.Query(limit=limit_count)
         self.assertEqual('LIMIT 20', myQuery._limit)
+
+    def test_bind(self):
+        myQuery = query.Query(tables=['mysql.user'])
+        placeholder = myQuery.bind('marker', "user'1")
+        self.assertEqual(':marker', placeholder)
+        self.assertEqual({'marker': "user'1"}, myQuery.params)
+
+    def test_bind_list(self):
+        myQuery = query.Query()
+        placeholders = myQuery.bind_list('name', ["a", "b"])
+        self.assertEqual(':name0, :name1', placeholders)
+        self.assertEqual({'name0': "a", 'name1': "b"}, myQuery.params)
+
+
+class StatementCacheTest(testtools.TestCase):
+    def setUp(self):
+        super(StatementCacheTest, self).setUp()
+        self.orig_statements = query._statements
+        query._statements = query.StatementCache()
+
+    def tearDown(self):
+        super(StatementCacheTest, self).tearDown()
+        query._statements = self.orig_statements
+
+    def _query(self, marker):
+        myQuery = query.Query(columns=['User'], tables=['mysql.user'])
+        myQuery.where = ["User > %s" % myQuery.bind('marker', marker)]
+        return myQuery
+
+    def test_statement_reused_for_same_shape(self):
+        first = self._query("a")
+        second = self._query("b")
+        self.assertTrue(first.statement() is second.statement())
+        self.assertEqual({'marker': "b"}, second.params)
+
+    def test_statement_differs_by_shape(self):
+        first = self._query("a")
+        second = self._query("a")
+        second.limit = 10
+        self.assertFalse(first.statement() is second.statement())
+
+    def test_statement_cache_evicts_oldest(self):
+        oldest = query.Query(tables=['table_0']).statement()
+        for index in range(1, query.STATEMENT_CACHE_SIZE + 1):
+            query.Query(tables=['table_%d' % index]).statement()
+        self.assertEqual(query.STATEMENT_CACHE_SIZE, len(query._statements))
+        self.assertFalse(oldest is query.Query(
+            tables=['table_0']).statement())
+
+    def test_statement_cache_keeps_recently_used(self):
+        oldest = query.Query(tables=['table_0']).statement()
+        for index in range(1, query.STATEMENT_CACHE_SIZE):
+            query.Query(tables=['table_%d' % index]).statement()
+        self.assertTrue(oldest is query.Query(
+            tables=['table_0']).statement())
+        query.Query(tables=['table_new']).statement()
+        self.assertTrue(oldest is query.Query(
+            tables=['table_0']).statement())
@@ -0,0 +1,215 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import eventlet
+from eventlet import debug
+import testtools
+from mock import Mock
+from novaclient import exceptions as nova_exceptions
+from reddwarf.common import exception
+from reddwarf.instance import models
+
+
+def _server(id):
+    server = Mock()
+    server.id = id
+    return server
+
+
+class ServerListMatcherTest(testtools.TestCase):
+
+    def setUp(self):
+        super(ServerListMatcherTest, self).setUp()
+        self.servers = [_server("server-%d" % i) for i in range(10)]
+        self.find_server = models.create_server_list_matcher(self.servers)
+
+    def test_find_server(self):
+        server = self.find_server("instance-3", "server-3")
+        self.assertEqual(self.servers[3], server)
+
+    def test_find_server_not_found(self):
+        self.assertRaises(exception.ComputeInstanceNotFound,
+                          self.find_server, "instance-11", "server-11")
+
+    def test_find_server_found_twice(self):
+        self.servers.append(_server("server-4"))
+        find_server = models.create_server_list_matcher(self.servers)
+        error = self.assertRaises(exception.ReddwarfError,
+                                  find_server, "instance-4", "server-4")
+        self.assertFalse(isinstance(error,
+                                    exception.ComputeInstanceNotFound))
+
+    def test_find_server_empty_list(self):
+        find_server = models.create_server_list_matcher([])
+        self.assertRaises(exception.ComputeInstanceNotFound,
+                          find_server, "instance-0", "server-0")
+
+
+class LoadServersByIdsTest(testtools.TestCase):
+
+    def setUp(self):
+        super(LoadServersByIdsTest, self).setUp()
+        self.orig_create_nova_client = models.create_nova_client
+        self.servers = dict(("server-%d" % i, _server("server-%d" % i))
+                            for i in range(6))
+        self.running = 0
+        self.max_running = 0
+        self.clients = 0
+
+        def get(server_id):
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            eventlet.sleep(0.01)
+            self.running -= 1
+            if server_id not in self.servers:
+                raise nova_exceptions.NotFound(404)
+            if server_id == "broken":
+                raise nova_exceptions.ClientException(500, "Nova failed")
+            return self.servers[server_id]
+
+        def create_nova_client(context):
+            self.clients += 1
+            client = Mock()
+            client.servers.get.side_effect = get
+            return client
+        models.create_nova_client = create_nova_client
+        models.CONF.set_override('nova_server_load_pool_size', 3)
+
+    def tearDown(self):
+        super(LoadServersByIdsTest, self).tearDown()
+        models.create_nova_client = self.orig_create_nova_client
+        models.CONF.clear_override('nova_server_load_pool_size')
+
+    def test_load_servers(self):
+        ids = sorted(self.servers.keys())
+        servers = models.load_servers_by_ids(Mock(), ids)
+        self.assertEqual(ids, [server.id for server in servers])
+        self.assertEqual(3, self.max_running)
+        self.assertEqual(6, self.clients)
+
+    def test_missing_servers_skipped(self):
+        servers = models.load_servers_by_ids(Mock(), ["server-1", "gone",
+                                                      "server-2"])
+        self.assertEqual(["server-1", "server-2"],
+                         [server.id for server in servers])
+
+    def test_nova_error_fails_listing(self):
+        self.servers["broken"] = None
+        # The hub would print the error of the pool's green thread too.
+        debug.hub_exceptions(False)
+        try:
+            self.assertRaises(exception.ReddwarfError,
+                              models.load_servers_by_ids,
+                              Mock(), ["server-1", "broken"])
+        finally:
+            debug.hub_exceptions(True)
+
+    def test_no_servers(self):
+        self.assertEqual([], models.load_servers_by_ids(Mock(), []))
+        self.assertEqual(0, self.clients)
+
+
+class TenantUsageTest(testtools.TestCase):
+
+    def setUp(self):
+        super(TenantUsageTest, self).setUp()
+        self.orig_add_instances = models.TenantUsage.__dict__[
+            '_add_instances']
+        models.TenantUsage.get_by = Mock(return_value=None)
+        models.TenantUsage.create = Mock()
+
+    def tearDown(self):
+        super(TenantUsageTest, self).tearDown()
+        models.TenantUsage._add_instances = self.orig_add_instances
+        # get_by and create are inherited; removing the mocks exposes them.
+        del models.TenantUsage.get_by
+        del models.TenantUsage.create
+
+    def test_reserve_instance(self):
+        models.TenantUsage._add_instances = Mock(return_value=1)
+        self.assertTrue(models.TenantUsage.reserve_instance("tenant", 5))
+        models.TenantUsage._add_instances.assert_called_once_with(
+            "tenant", 1, maximum=5)
+        self.assertFalse(models.TenantUsage.create.called)
+
+    def test_reserve_instance_quota_full(self):
+        models.TenantUsage._add_instances = Mock(return_value=0)
+        models.TenantUsage.get_by = Mock(return_value=Mock())
+        self.assertFalse(models.TenantUsage.reserve_instance("tenant", 5))
+        self.assertFalse(models.TenantUsage.create.called)
+
+    def test_reserve_instance_creates_usage(self):
+        models.TenantUsage._add_instances = Mock(side_effect=[0, 1])
+        self.assertTrue(models.TenantUsage.reserve_instance("tenant", 5))
+        models.TenantUsage.create.assert_called_once_with(tenant_id="tenant",
+                                                          instances=0)
+
+    def test_reserve_instance_usage_created_concurrently(self):
+        models.TenantUsage._add_instances = Mock(side_effect=[0, 1])
+        models.TenantUsage.create = Mock(
+            side_effect=exception.DBConstraintError(model_name="TenantUsage",
+                                                    error="duplicate"))
+        self.assertTrue(models.TenantUsage.reserve_instance("tenant", 5))
+
+    def test_release_instance(self):
+        models.TenantUsage._add_instances = Mock(return_value=1)
+        models.TenantUsage.release_instance("tenant")
+        models.TenantUsage._add_instances.assert_called_once_with(
+            "tenant", -1, minimum=0)
+
+
+class UpdateDbTest(testtools.TestCase):
+
+    def setUp(self):
+        super(UpdateDbTest, self).setUp()
+        self.query = Mock()
+        models.DBInstance.find_all = Mock(return_value=self.query)
+        models.DBInstance.find_by = Mock()
+        self.db_info = Mock()
+        self.db_info.id = "instance-1"
+        self.db_info.task_id = models.InstanceTasks.RESIZING.code
+        self.instance = models.BaseInstance(Mock(), self.db_info, Mock(),
+                                            Mock())
+
+    def tearDown(self):
+        super(UpdateDbTest, self).tearDown()
+        # Both are inherited; removing the mocks exposes them again.
+        del models.DBInstance.find_all
+        del models.DBInstance.find_by
+
+    def test_update_db_single_update(self):
+        self.query.update.return_value = 1
+        self.assertTrue(self.instance.update_db(
+            task_status=models.InstanceTasks.NONE, flavor_id="2"))
+        models.DBInstance.find_all.assert_called_once_with(
+            id="instance-1", deleted=False,
+            task_id=models.InstanceTasks.RESIZING.code)
+        values = self.query.update.call_args[1]
+        self.assertEqual(models.InstanceTasks.NONE.code, values['task_id'])
+        self.assertEqual(models.InstanceTasks.NONE.db_text,
+                         values['task_description'])
+        self.assertEqual("2", values['flavor_id'])
+        self.assertFalse('task_status' in values)
+        self.assertFalse(models.DBInstance.find_by.called)
+        self.assertEqual(models.InstanceTasks.NONE,
+                         self.db_info.task_status)
+        self.assertEqual("2", self.db_info.flavor_id)
+
+    def test_update_db_task_changed(self):
+        self.query.update.return_value = 0
+        self.db_info.flavor_id = "1"
+        self.assertFalse(self.instance.update_db(flavor_id="2"))
+        self.assertFalse(models.DBInstance.find_by.called)
+        self.assertEqual("1", self.db_info.flavor_id)
+        self.assertFalse(self.db_info.save.called)
@@ -0,0 +1,76 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import json
+import testtools
+from mock import Mock
+from reddwarf.instance import notifications
+from reddwarf.tests.fakes import notifications as fake_notifications
+
+
+class NotificationConsumerTest(testtools.TestCase):
+
+    def setUp(self):
+        super(NotificationConsumerTest, self).setUp()
+        self.orig_find_all = notifications.DBInstance.find_all
+        self.query = Mock()
+        notifications.DBInstance.find_all = Mock(return_value=self.query)
+        self.service = notifications.NotificationService(
+            connection_factory=fake_notifications.FakeNotificationConnection)
+        self.service.start()
+
+    def tearDown(self):
+        super(NotificationConsumerTest, self).tearDown()
+        self.service.stop()
+        notifications.DBInstance.find_all = self.orig_find_all
+
+    def test_update_writes_status_and_addresses(self):
+        fixed_ips = [{'address': '10.0.0.2', 'label': 'private',
+                      'version': 4, 'type': 'fixed'}]
+        fake_notifications.publish('compute.instance.update',
+                                   {'instance_id': 'server-1',
+                                    'state': 'active',
+                                    'new_task_state': None,
+                                    'fixed_ips': fixed_ips})
+        notifications.DBInstance.find_all.assert_called_with(
+            compute_instance_id='server-1', deleted=False)
+        values = self.query.update.call_args[1]
+        self.assertEqual("ACTIVE", values['server_status'])
+        addresses = json.loads(values['server_addresses'])
+        self.assertEqual("10.0.0.2", addresses['private'][0]['addr'])
+
+    def test_reboot_task_state(self):
+        fake_notifications.publish('compute.instance.update',
+                                   {'instance_id': 'server-1',
+                                    'state': 'active',
+                                    'new_task_state': 'rebooting'})
+        self.query.update.assert_called_with(server_status="REBOOT")
+
+    def test_delete_end(self):
+        fake_notifications.publish('compute.instance.delete.end',
+                                   {'instance_id': 'server-1',
+                                    'state': 'deleted'})
+        self.query.update.assert_called_with(server_status="SHUTDOWN")
+
+    def test_ignores_other_events(self):
+        fake_notifications.publish('volume.create.end',
+                                   {'volume_id': 'volume-1'})
+        self.assertFalse(notifications.DBInstance.find_all.called)
+
+    def test_stopped_service_gets_nothing(self):
+        self.service.stop()
+        fake_notifications.publish('compute.instance.update',
+                                   {'instance_id': 'server-1',
+                                    'state': 'active'})
+        self.assertFalse(notifications.DBInstance.find_all.called)
@@ -0,0 +1,90 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import testtools
+from mock import Mock
+from reddwarf.instance import status_cache
+from reddwarf.instance.status_cache import ServerStatusCache
+
+
+def _server(id, status="ACTIVE"):
+    server = Mock()
+    server.id = id
+    server.status = status
+    server.addresses = {"private": [{"addr": "10.0.0.1"}]}
+    return server
+
+
+class ServerStatusCacheTest(testtools.TestCase):
+
+    def setUp(self):
+        super(ServerStatusCacheTest, self).setUp()
+        self.cache = ServerStatusCache()
+        self.orig_create_admin_nova_client = (
+            status_cache.create_admin_nova_client)
+
+    def tearDown(self):
+        super(ServerStatusCacheTest, self).tearDown()
+        status_cache.create_admin_nova_client = (
+            self.orig_create_admin_nova_client)
+
+    def test_find_missing(self):
+        self.assertEqual(None, self.cache.find("server-1"))
+
+    def test_put_and_find(self):
+        self.cache.put(_server("server-1", "REBOOT"))
+        cached = self.cache.find("server-1")
+        self.assertEqual("REBOOT", cached.status)
+        self.assertEqual("10.0.0.1", cached.addresses["private"][0]["addr"])
+
+    def test_find_stale(self):
+        cached = self.cache.put(_server("server-1"))
+        cached.updated -= status_cache.CONF.server_status_cache_max_age + 1
+        self.assertEqual(None, self.cache.find("server-1"))
+
+    def test_refresh_pages_through_all_tenants(self):
+        client = Mock()
+        client.servers.list = Mock(side_effect=[
+            [_server("server-1"), _server("server-2")],
+            [_server("server-3")],
+            []])
+        status_cache.create_admin_nova_client = Mock(return_value=client)
+        self.cache.refresh()
+        self.assertEqual(3, client.servers.list.call_count)
+        calls = client.servers.list.call_args_list
+        self.assertEqual({'all_tenants': 1}, calls[0][1]['search_opts'])
+        self.assertEqual({'all_tenants': 1, 'marker': "server-2"},
+                         calls[1][1]['search_opts'])
+        self.assertEqual({'all_tenants': 1, 'marker': "server-3"},
+                         calls[2][1]['search_opts'])
+        self.assertEqual("ACTIVE", self.cache.find("server-3").status)
+
+    def test_refresh_stops_when_marker_is_ignored(self):
+        client = Mock()
+        client.servers.list = Mock(side_effect=[
+            [_server("server-1")],
+            [_server("server-1")]])
+        status_cache.create_admin_nova_client = Mock(return_value=client)
+        self.cache.refresh()
+        self.assertEqual(2, client.servers.list.call_count)
+        self.assertEqual("ACTIVE", self.cache.find("server-1").status)
+
+    def test_refresh_survives_failure(self):
+        status_cache.create_admin_nova_client = Mock(
+            side_effect=Exception("401"))
+        stale = self.cache.put(_server("server-1"))
+        stale.updated -= status_cache.CONF.server_status_cache_max_age * 3
+        self.cache.refresh()
+        self.assertEqual(None, self.cache.find("server-1"))
+        self.assertEqual(0, len(self.cache._servers))
@@ -0,0 +1,87 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+
+import eventlet
+import testtools
+from reddwarf.taskmanager import graph
+
+
+class TaskGraphTest(testtools.TestCase):
+
+    def setUp(self):
+        super(TaskGraphTest, self).setUp()
+        self.graph = graph.TaskGraph("test")
+        self.events = []
+
+    def _step(self, name, result=None, sleeps=0, error=None):
+        def step(**kwargs):
+            self.events.append(("start", name, sorted(kwargs.items())))
+            for _ in range(sleeps):
+                eventlet.sleep(0)
+            self.events.append(("end", name))
+            if error is not None:
+                raise error
+            return result
+        return step
+
+    def test_passes_results_of_required_steps(self):
+        self.graph.add("a", self._step("a", result=1))
+        self.graph.add("b", self._step("b", result=2))
+        self.graph.add("c", self._step("c", result=3), requires=["a", "b"])
+        results = self.graph.run()
+        self.assertEqual({"a": 1, "b": 2, "c": 3}, results)
+        self.assertTrue(("start", "c", [("a", 1), ("b", 2)]) in self.events)
+
+    def test_independent_steps_overlap(self):
+        self.graph.add("slow", self._step("slow", sleeps=3))
+        self.graph.add("fast", self._step("fast"))
+        self.graph.add("last", self._step("last"), requires=["slow"])
+        self.graph.run()
+        names = [event[:2] for event in self.events]
+        self.assertEqual([("start", "slow"), ("start", "fast"),
+                          ("end", "fast"), ("end", "slow"),
+                          ("start", "last"), ("end", "last")], names)
+
+    def test_error_stops_later_steps(self):
+        self.graph.add("bad", self._step("bad", error=ValueError("bad")))
+        self.graph.add("other", self._step("other", sleeps=2))
+        self.graph.add("after", self._step("after"), requires=["bad"])
+        self.assertRaises(ValueError, self.graph.run)
+        names = [event[:2] for event in self.events]
+        self.assertTrue(("end", "other") in names)
+        self.assertFalse(("start", "after") in names)
+
+    def test_timeout_in_step_is_raised(self):
+        timeout = eventlet.Timeout()
+        self.graph.add("stuck", self._step("stuck", error=timeout))
+        self.graph.add("other", self._step("other"))
+        # Should the graph hang, this other timeout ends the test.
+        with eventlet.Timeout(5):
+            error = self.assertRaises(eventlet.Timeout, self.graph.run)
+        self.assertTrue(error is timeout)
+
+    def test_unknown_requirement(self):
+        self.assertRaises(ValueError, self.graph.add, "a",
+                          self._step("a"), requires=["b"])
+
+    def test_timings_and_critical_path(self):
+        self.graph.add("a", self._step("a"))
+        self.graph.add("b", self._step("b"))
+        self.graph.add("c", self._step("c"), requires=["a", "b"])
+        self.graph.run()
+        self.assertEqual(["a", "b", "c"], sorted(self.graph.timings()))
+        path = [step.name for step in self.graph.critical_path()]
+        self.assertEqual("c", path[-1])
+        self.assertEqual(2, len(path))
@@ -0,0 +1,264 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import os
+
+import eventlet
+import testtools
+from mock import Mock
+from reddwarf.common.context import ReddwarfContext
+from reddwarf.instance.models import DBInstance
+from reddwarf.instance.tasks import InstanceTasks
+from reddwarf.taskmanager import journal
+from reddwarf.taskmanager import sharding
+from reddwarf.taskmanager import watcher
+from reddwarf.taskmanager.journal import TaskJournal
+from reddwarf.taskmanager.manager import Manager
+from reddwarf.taskmanager.models import BuiltInstanceTasks
+from reddwarf.tests.unittests.util import util
+
+
+class TaskJournalTest(testtools.TestCase):
+
+    def setUp(self):
+        super(TaskJournalTest, self).setUp()
+        util.init_db()
+        self.context = ReddwarfContext(user="user", tenant="tenant",
+                                       auth_tok="token")
+        self.db_info = DBInstance.create(name="instance",
+                                         tenant_id="tenant",
+                                         task_status=InstanceTasks.RESIZING)
+        self.manager = Manager()
+
+    def tearDown(self):
+        super(TaskJournalTest, self).tearDown()
+        TaskJournal.find_all().delete()
+        journal.CONF.clear_override('taskmanager_worker_name')
+        self.db_info.delete()
+
+    def test_recover_orphaned_tasks_periodically(self):
+        self.assertTrue(getattr(Manager.recover_orphaned_tasks,
+                                '_periodic_task', False))
+        self._entry("reboot")
+        self.manager.reboot = Mock()
+        self.manager.recover_orphaned_tasks(None)
+        eventlet.sleep(0)
+        self.assertTrue(self.manager.reboot.called)
+
+    def _tasks(self):
+        tasks = Mock()
+        tasks.id = self.db_info.id
+        return tasks
+
+    def _entry(self, action, steps=(), **args):
+        entry = TaskJournal.start(self.context, self.db_info.id, action,
+                                  **args)
+        for step in steps:
+            entry.checkpoint(step)
+        return entry
+
+    def _task_status(self):
+        return DBInstance.find_by(id=self.db_info.id).task_status
+
+    def test_record(self):
+        tasks = self._tasks()
+        with journal.record(self.context, tasks, "migrate") as entry:
+            tasks.journal.checkpoint("nova_action_started")
+            saved = TaskJournal.find_by(id=entry.id)
+            self.assertEqual(["nova_action_started"], saved.steps)
+            self.assertFalse("token" in saved.context)
+        self.assertEqual(None, TaskJournal.get_by(id=entry.id))
+        self.assertEqual(None, tasks.journal)
+
+    def test_record_removes_failed_task(self):
+        tasks = self._tasks()
+
+        def fail():
+            with journal.record(self.context, tasks, "reboot"):
+                raise ValueError()
+        self.assertRaises(ValueError, fail)
+        self.assertEqual([], TaskJournal.find_all().all())
+
+    def test_claim(self):
+        entry = self._entry("reboot")
+        other = TaskJournal.find_by(id=entry.id)
+        journal.CONF.set_override('taskmanager_worker_name', "other")
+        self.assertTrue(other.claim())
+        self.assertFalse(entry.claim())
+        self.assertEqual("other", TaskJournal.find_by(id=entry.id).worker)
+
+    def test_find_recoverable(self):
+        entry = self._entry("reboot")
+        journal.CONF.set_override('taskmanager_worker_name', "other")
+        self.assertEqual([], TaskJournal.find_recoverable())
+        journal.CONF.set_override('task_journal_orphan_age', -1)
+        try:
+            self.assertEqual([entry.id],
+                             [found.id for found in
+                              TaskJournal.find_recoverable()])
+        finally:
+            journal.CONF.clear_override('task_journal_orphan_age')
+
+    def test_running_task_is_not_recoverable(self):
+        tasks = self._tasks()
+        with journal.record(self.context, tasks, "reboot"):
+            self.assertEqual([], TaskJournal.find_recoverable())
+        self._entry("reboot")
+        self.assertEqual(1, len(TaskJournal.find_recoverable()))
+
+    def test_running_task_is_touched(self):
+        journal.CONF.set_override('task_journal_touch_interval', 0)
+        try:
+            with journal.record(self.context, self._tasks(),
+                                "reboot") as entry:
+                started = TaskJournal.find_by(id=entry.id).updated
+                eventlet.sleep(0.01)
+                touched = TaskJournal.find_by(id=entry.id).updated
+        finally:
+            journal.CONF.clear_override('task_journal_touch_interval')
+        self.assertTrue(touched > started)
+
+    def test_touch_fails_once_taken_over(self):
+        entry = self._entry("reboot")
+        self.assertTrue(entry.touch())
+        journal.CONF.set_override('taskmanager_worker_name', "other")
+        self.assertTrue(TaskJournal.find_by(id=entry.id).claim())
+        self.assertFalse(entry.touch())
+
+    def test_default_worker_name_is_per_process(self):
+        self.assertTrue(journal.worker_name().endswith(":%d" % os.getpid()))
+        entry = self._entry("reboot")
+        # Another taskmanager on the same host, still running the task.
+        TaskJournal.find_all(id=entry.id).update(
+            worker=journal.worker_name() + "0")
+        self.assertEqual([], TaskJournal.find_recoverable())
+
+    def test_recover_resumes_reboot(self):
+        self._entry("reboot")
+        self.manager.reboot = Mock()
+        self.manager.recover_tasks()
+        args, _ = self.manager.reboot.call_args
+        self.assertEqual("user", args[0].user)
+        self.assertEqual("tenant", args[0].tenant)
+        self.assertTrue(args[0].is_admin)
+        self.assertEqual(None, args[0].auth_tok)
+        self.assertEqual(self.db_info.id, args[1])
+        self.assertEqual([], TaskJournal.find_all().all())
+
+    def test_recover_clears_reboot_which_fails_again(self):
+        self._entry("reboot")
+        self.manager.reboot = Mock(side_effect=Exception("token expired"))
+        self.manager.recover_tasks()
+        self.assertEqual(InstanceTasks.NONE, self._task_status())
+
+    def test_recover_confirmed_resize(self):
+        self._entry("resize_flavor", new_flavor_id="7",
+                    steps=["nova_action_started", "nova_action_confirmed"])
+        self.manager._roll_back_resize = Mock()
+        self.manager.recover_tasks()
+        self.assertFalse(self.manager._roll_back_resize.called)
+        db_info = DBInstance.find_by(id=self.db_info.id)
+        self.assertEqual("7", db_info.flavor_id)
+        self.assertEqual(InstanceTasks.NONE, db_info.task_status)
+
+    def test_recover_rolls_back_resize(self):
+        self._entry("resize_flavor", new_flavor_id="7",
+                    steps=["nova_action_started"])
+        self.manager._roll_back_resize = Mock()
+        self.manager.recover_tasks()
+        self.assertTrue(self.manager._roll_back_resize.called)
+
+    def test_recover_create_instance(self):
+        self._entry("create_instance", steps=["volume", "dns_client"])
+        self.manager.recover_tasks()
+        self.assertEqual(InstanceTasks.BUILDING_ERROR_SERVER,
+                         self._task_status())
+
+    def test_recover_skips_claimed_task(self):
+        self._entry("reboot")
+        self.manager.reboot = Mock()
+        orig_claim = TaskJournal.claim
+        TaskJournal.claim = Mock(return_value=False)
+        try:
+            self.manager.recover_tasks()
+        finally:
+            TaskJournal.claim = orig_claim
+        self.assertFalse(self.manager.reboot.called)
+
+    def _recover_sharded(self, owner):
+        orig_ring = sharding.InstanceRing._instance
+        sharding.InstanceRing._instance = sharding.InstanceRing(
+            {"taskmanager": [owner]})
+        journal.CONF.set_override('taskmanager_shard_by_instance', True)
+        journal.CONF.set_override('host', "tm-1")
+        try:
+            self.manager.recover_tasks()
+        finally:
+            sharding.InstanceRing._instance = orig_ring
+            journal.CONF.clear_override('taskmanager_shard_by_instance')
+            journal.CONF.clear_override('host')
+
+    def test_recover_skips_task_of_other_shard(self):
+        entry = self._entry("reboot")
+        self.manager.reboot = Mock()
+        self._recover_sharded("tm-2")
+        self.assertFalse(self.manager.reboot.called)
+        self.assertEqual(entry.id, TaskJournal.find_by(id=entry.id).id)
+
+    def test_recover_takes_task_of_own_shard(self):
+        self._entry("reboot")
+        self.manager.reboot = Mock()
+        self._recover_sharded("tm-1")
+        self.assertTrue(self.manager.reboot.called)
+
+    def test_recover_rolls_back_resize_through_watcher(self):
+        self._entry("resize_flavor", new_flavor_id="7",
+                    steps=["nova_action_started"])
+        server = Mock()
+        server.id = "server-id"
+        server.status = "VERIFY_RESIZE"
+        server.flavor = {'id': "1"}
+
+        def revert_resize():
+            server.status = "ACTIVE"
+        server.revert_resize.side_effect = revert_resize
+
+        nova_client = Mock()
+        # The proxy admin's own project has no servers.
+        nova_client.servers.list.return_value = []
+        nova_client.servers.get = Mock(return_value=server)
+
+        def load(context, instance_id):
+            db_info = DBInstance.find_by(id=instance_id)
+            tasks = BuiltInstanceTasks(context, db_info, server, None)
+            tasks._guest = Mock()
+            return tasks
+
+        orig_create_nova_client = watcher.create_nova_client
+        orig_load = BuiltInstanceTasks.load
+        watcher.create_nova_client = Mock(return_value=nova_client)
+        BuiltInstanceTasks.load = staticmethod(load)
+        watcher.ResourceWatcher._instance = None
+        watcher.CONF.set_override('watcher_sweep_interval', 0)
+        try:
+            self.manager.recover_tasks()
+        finally:
+            watcher.create_nova_client = orig_create_nova_client
+            BuiltInstanceTasks.load = orig_load
+            watcher.ResourceWatcher._instance = None
+            watcher.CONF.clear_override('watcher_sweep_interval')
+        self.assertTrue(server.revert_resize.called)
+        db_info = DBInstance.find_by(id=self.db_info.id)
+        self.assertEqual("1", db_info.flavor_id)
+        self.assertEqual(InstanceTasks.NONE, db_info.task_status)
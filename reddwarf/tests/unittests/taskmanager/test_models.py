@@ -0,0 +1,108 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import testtools
+from mock import Mock
+from reddwarf.instance.models import InstanceServiceStatus
+from reddwarf.instance.models import ServiceStatuses
+from reddwarf.instance.tasks import InstanceTasks
+from reddwarf.taskmanager import models
+from reddwarf.taskmanager.watcher import ResourceWatcher
+from reddwarf.tests.unittests.util import util
+
+
+class RollBackResizeTest(testtools.TestCase):
+
+    def setUp(self):
+        super(RollBackResizeTest, self).setUp()
+        self.watcher = Mock()
+        self.watcher.wait_for_server.side_effect = self._settle
+        self.orig_get = ResourceWatcher.get
+        ResourceWatcher.get = classmethod(lambda cls: self.watcher)
+        self.settled = []
+
+    def tearDown(self):
+        super(RollBackResizeTest, self).tearDown()
+        ResourceWatcher.get = self.orig_get
+
+    def _server(self, status, flavor_id='1'):
+        server = Mock()
+        server.id = 'server-id'
+        server.status = status
+        server.flavor = {'id': flavor_id}
+        return server
+
+    def _settle(self, context, server_id, condition, time_out=None):
+        server = self.settled.pop(0)
+        self.assertTrue(condition(server))
+        return server
+
+    def _instance(self, server):
+        db_info = Mock()
+        db_info.id = 'instance-id'
+        instance = models.BuiltInstanceTasks(Mock(), db_info, server, None)
+        instance.update_db = Mock()
+        instance._guest = Mock()
+        return instance
+
+    def test_waits_out_resize_then_reverts(self):
+        instance = self._instance(self._server('RESIZE', '2'))
+        verifying = self._server('VERIFY_RESIZE', '2')
+        self.settled = [verifying, self._server('ACTIVE', '1')]
+        instance.roll_back_resize()
+        self.assertEqual(2, self.watcher.wait_for_server.call_count)
+        verifying.revert_resize.assert_called_once_with()
+        instance.update_db.assert_any_call(flavor_id='1')
+        instance._guest.restart.assert_called_once_with()
+        instance.update_db.assert_called_with(task_status=InstanceTasks.NONE)
+
+    def test_records_flavor_when_nova_confirms_on_its_own(self):
+        instance = self._instance(self._server('RESIZE_PREP', '1'))
+        self.settled = [self._server('ACTIVE', '2')]
+        instance.roll_back_resize()
+        self.assertEqual(1, self.watcher.wait_for_server.call_count)
+        self.assertFalse(instance.server.revert_resize.called)
+        instance.update_db.assert_any_call(flavor_id='2')
+        instance._guest.restart.assert_called_once_with()
+
+    def test_clears_task_when_server_is_broken(self):
+        instance = self._instance(self._server('ERROR'))
+        instance.roll_back_resize()
+        self.assertFalse(self.watcher.wait_for_server.called)
+        self.assertFalse(instance._guest.restart.called)
+        instance.update_db.assert_called_once_with(
+            task_status=InstanceTasks.NONE)
+
+
+class PauseServiceStatusTest(testtools.TestCase):
+
+    def setUp(self):
+        super(PauseServiceStatusTest, self).setUp()
+        util.init_db()
+        self.status = InstanceServiceStatus.create(
+            instance_id="instance-id", status=ServiceStatuses.RUNNING)
+
+    def tearDown(self):
+        super(PauseServiceStatusTest, self).tearDown()
+        self.status.delete()
+
+    def test_asks_guest_to_report_again(self):
+        db_info = Mock()
+        db_info.id = "instance-id"
+        instance = models.BuiltInstanceTasks(Mock(), db_info, Mock(), None)
+        instance._guest = Mock()
+        instance._set_service_status_to_paused()
+        status = InstanceServiceStatus.find_by(instance_id="instance-id")
+        self.assertEqual(ServiceStatuses.PAUSED, status.status)
+        instance._guest.report_status.assert_called_once_with()
@@ -0,0 +1,157 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+
+import eventlet
+import testtools
+from mock import Mock
+from reddwarf.taskmanager import api
+from reddwarf.taskmanager import sharding
+
+HOSTS = ["tm-1", "tm-2", "tm-3"]
+IDS = ["instance-%d" % i for i in range(300)]
+
+
+class InstanceRingTest(testtools.TestCase):
+
+    def setUp(self):
+        super(InstanceRingTest, self).setUp()
+        self.ring = sharding.InstanceRing({"taskmanager": HOSTS})
+
+    def _owners(self, ring):
+        return dict((id, ring.get_host("taskmanager", id)) for id in IDS)
+
+    def test_same_host_every_time(self):
+        first = self._owners(self.ring)
+        again = self._owners(sharding.InstanceRing({"taskmanager": HOSTS}))
+        self.assertEqual(first, again)
+
+    def test_every_host_gets_instances(self):
+        owners = self._owners(self.ring).values()
+        for host in HOSTS:
+            self.assertTrue(owners.count(host) > len(IDS) / 10)
+
+    def test_removing_host_only_moves_its_instances(self):
+        before = self._owners(self.ring)
+        after = self._owners(sharding.InstanceRing({"taskmanager":
+                                                    HOSTS[:2]}))
+        for id in IDS:
+            if before[id] != "tm-3":
+                self.assertEqual(before[id], after[id])
+
+    def test_unknown_topic(self):
+        self.assertEqual(None, self.ring.get_host("other", "instance-1"))
+
+
+class RoutingTest(testtools.TestCase):
+
+    def setUp(self):
+        super(RoutingTest, self).setUp()
+        self.orig_ring = sharding.InstanceRing._instance
+        sharding.InstanceRing._instance = sharding.InstanceRing(
+            {"taskmanager": HOSTS})
+        sharding.CONF.set_override('taskmanager_shard_by_instance', True)
+
+    def tearDown(self):
+        super(RoutingTest, self).tearDown()
+        sharding.InstanceRing._instance = self.orig_ring
+        sharding.CONF.clear_override('taskmanager_shard_by_instance')
+
+    def test_routing_key(self):
+        host = sharding.InstanceRing.get().get_host("taskmanager",
+                                                    "instance-1")
+        self.assertEqual("taskmanager.%s" % host,
+                         sharding.get_routing_key("taskmanager",
+                                                  "instance-1"))
+
+    def test_routing_key_not_sharded(self):
+        sharding.CONF.set_override('taskmanager_shard_by_instance', False)
+        self.assertEqual("taskmanager",
+                         sharding.get_routing_key("taskmanager",
+                                                  "instance-1"))
+
+    def test_routing_key_without_instance(self):
+        self.assertEqual("taskmanager",
+                         sharding.get_routing_key("taskmanager", None))
+
+    def test_is_owner(self):
+        host = sharding.InstanceRing.get().get_host("taskmanager",
+                                                    "instance-1")
+        other = [h for h in HOSTS if h != host][0]
+        self.assertTrue(sharding.is_owner("taskmanager", "instance-1", host))
+        self.assertFalse(sharding.is_owner("taskmanager", "instance-1",
+                                           other))
+
+    def test_is_owner_not_sharded(self):
+        sharding.CONF.set_override('taskmanager_shard_by_instance', False)
+        self.assertTrue(sharding.is_owner("taskmanager", "instance-1",
+                                          "tm-1"))
+
+    def test_cast_routed_by_instance(self):
+        task_api = api.API(Mock())
+        routing_key = task_api._get_cast_routing_key(instance_id="instance-1",
+                                                     new_size=2)
+        self.assertEqual(sharding.get_routing_key("taskmanager",
+                                                  "instance-1"),
+                         routing_key)
+
+
+class InstanceLockTest(testtools.TestCase):
+
+    def _task(self, events, instance_id, name):
+        with sharding.instance_lock(instance_id):
+            events.append(("start", name))
+            eventlet.sleep(0)
+            events.append(("end", name))
+
+    def _run(self, tasks):
+        events = []
+        threads = [eventlet.spawn(self._task, events, instance_id, name)
+                   for instance_id, name in tasks]
+        for thread in threads:
+            thread.wait()
+        return events
+
+    def test_same_instance_takes_turns(self):
+        events = self._run([("instance-1", "a"), ("instance-1", "b")])
+        self.assertEqual([("start", "a"), ("end", "a"),
+                          ("start", "b"), ("end", "b")], events)
+
+    def test_other_instances_overlap(self):
+        events = self._run([("instance-1", "a"), ("instance-2", "b")])
+        self.assertEqual([("start", "a"), ("start", "b"),
+                          ("end", "a"), ("end", "b")], events)
+
+    def test_reentrant(self):
+        with sharding.instance_lock("instance-1"):
+            with sharding.instance_lock("instance-1"):
+                pass
+        self.assertFalse("instance-1" in sharding._locks)
+
+    def test_manager_method_serialized(self):
+        calls = []
+
+        class FakeManager(object):
+            @sharding.serialized_by_instance
+            def reboot(self, context, instance_id):
+                calls.append(context)
+                eventlet.sleep(0)
+                calls.append(context)
+
+        manager = FakeManager()
+        threads = [eventlet.spawn(manager.reboot, "a", instance_id="i-1"),
+                   eventlet.spawn(manager.reboot, "b", "i-1")]
+        for thread in threads:
+            thread.wait()
+        self.assertEqual(["a", "a", "b", "b"], calls)
@@ -0,0 +1,200 @@
+#    Copyright 2013 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License
+
+import eventlet
+import testtools
+from mock import Mock
+from novaclient import exceptions as nova_exceptions
+from reddwarf.common import exception
+from reddwarf.taskmanager import watcher
+
+
+def _server(id, status):
+    server = Mock()
+    server.id = id
+    server.status = status
+    return server
+
+
+def _context(tenant):
+    context = Mock()
+    context.tenant = tenant
+    return context
+
+
+class ResourceWatcherTest(testtools.TestCase):
+
+    def setUp(self):
+        super(ResourceWatcherTest, self).setUp()
+        watcher.CONF.set_override('watcher_sweep_interval', 0)
+        self.watcher = watcher.ResourceWatcher()
+        self.servers = {}
+        self.watcher._list = Mock(side_effect=lambda kind, context, ids:
+                                  dict(self.servers))
+        self.context = _context("tenant")
+
+    def tearDown(self):
+        super(ResourceWatcherTest, self).tearDown()
+        watcher.CONF.clear_override('watcher_sweep_interval')
+
+    def _becomes_active(self, id, sweeps):
+        def condition(server):
+            if self.watcher._list.call_count >= sweeps:
+                self.servers[id] = _server(id, "ACTIVE")
+            return server.status == "ACTIVE"
+        return condition
+
+    def test_wait_for_server(self):
+        self.servers["server-1"] = _server("server-1", "BUILD")
+        server = self.watcher.wait_for_server(
+            self.context, "server-1", self._becomes_active("server-1", 3))
+        self.assertEqual("ACTIVE", server.status)
+        self.assertEqual(4, self.watcher._list.call_count)
+
+    def test_wait_does_not_back_off(self):
+        self.servers["server-1"] = _server("server-1", "ACTIVE")
+        orig_poll_until = watcher.utils.poll_until
+        watcher.utils.poll_until = Mock(side_effect=orig_poll_until)
+        try:
+            self.watcher.wait_for_server(self.context, "server-1",
+                                         lambda server: True)
+            kwargs = watcher.utils.poll_until.call_args[1]
+        finally:
+            watcher.utils.poll_until = orig_poll_until
+        self.assertEqual(1, kwargs['backoff'])
+
+    def test_waits_share_sweeps(self):
+        ids = ["server-%d" % i for i in range(5)]
+        for id in ids:
+            self.servers[id] = _server(id, "BUILD")
+        threads = [eventlet.spawn(self.watcher.wait_for_server, self.context,
+                                  id, self._becomes_active(id, 3))
+                   for id in ids]
+        for thread in threads:
+            self.assertEqual("ACTIVE", thread.wait().status)
+        self.assertEqual(4, self.watcher._list.call_count)
+        self.assertEqual([], self.watcher._waits)
+
+    def test_one_list_per_tenant(self):
+        self.servers["server-1"] = _server("server-1", "ACTIVE")
+        self.servers["server-2"] = _server("server-2", "ACTIVE")
+        threads = [eventlet.spawn(self.watcher.wait_for_server,
+                                  _context(tenant), id,
+                                  lambda server: server.status == "ACTIVE")
+                   for tenant, id in [("a", "server-1"), ("b", "server-2")]]
+        for thread in threads:
+            thread.wait()
+        self.assertEqual(2, self.watcher._list.call_count)
+
+    def test_server_missing(self):
+        self.assertRaises(exception.NotFound, self.watcher.wait_for_server,
+                          self.context, "server-1", lambda server: True)
+
+    def test_server_missing_ok(self):
+        self.assertEqual(None, self.watcher.wait_for_server(
+            self.context, "server-1", lambda server: server is None,
+            missing_ok=True))
+
+    def test_time_out(self):
+        self.servers["server-1"] = _server("server-1", "BUILD")
+        self.assertRaises(exception.PollTimeOut, self.watcher.wait_for_server,
+                          self.context, "server-1", lambda server: False,
+                          time_out=-1)
+
+    def test_list_failure_is_retried(self):
+        self.servers["server-1"] = _server("server-1", "ACTIVE")
+        results = [Exception("Nova is down."), dict(self.servers)]
+        self.watcher._list = Mock(side_effect=lambda kind, context, ids:
+                                  self._raise_or_return(results.pop(0)))
+        server = self.watcher.wait_for_server(
+            self.context, "server-1", lambda server: True)
+        self.assertEqual("server-1", server.id)
+        self.assertEqual(2, self.watcher._list.call_count)
+
+    def test_slow_sweeps_do_not_overlap(self):
+        self.servers["server-1"] = _server("server-1", "BUILD")
+        self.servers["server-2"] = _server("server-2", "BUILD")
+        listing = []
+        overlaps = []
+
+        def slow_list(kind, context, ids):
+            listing.append(context.tenant)
+            overlaps.append(len(listing) > 1)
+            eventlet.sleep(0.05)
+            listing.remove(context.tenant)
+            for id in self.servers:
+                self.servers[id] = _server(id, "ACTIVE")
+            return dict(self.servers)
+        self.watcher._list = Mock(side_effect=slow_list)
+
+        def wait(tenant, id):
+            return self.watcher.wait_for_server(
+                _context(tenant), id,
+                lambda server: server.status == "ACTIVE", time_out=5)
+        first = eventlet.spawn(wait, "a", "server-1")
+        # Starts while the first task sweeps, and swept along next time.
+        eventlet.sleep(0.01)
+        second = eventlet.spawn(wait, "b", "server-2")
+        eventlet.sleep(0.01)
+        third = eventlet.spawn(wait, "b", "server-1")
+        for thread in (first, second, third):
+            self.assertEqual("ACTIVE", thread.wait().status)
+        self.assertEqual([], self.watcher._waits)
+        self.assertFalse(any(overlaps))
+
+    def _list_with(self, context, ids):
+        nova_client = Mock()
+        nova_client.servers.list = Mock(
+            return_value=[_server("server-1", "BUILD")])
+        nova_client.servers.get = Mock(
+            side_effect=lambda id: self._raise_or_return(
+                self.servers.get(id, nova_exceptions.NotFound(404))))
+        orig_create_nova_client = watcher.create_nova_client
+        watcher.create_nova_client = Mock(return_value=nova_client)
+        try:
+            resources = watcher.ResourceWatcher()._list(watcher.SERVER,
+                                                        context, ids)
+        finally:
+            watcher.create_nova_client = orig_create_nova_client
+        return nova_client, resources
+
+    def test_list_for_user(self):
+        self.context.is_admin = False
+        nova_client, resources = self._list_with(self.context, ["server-1"])
+        self.assertEqual(["server-1"], resources.keys())
+        self.assertFalse(nova_client.servers.get.called)
+
+    def test_list_gets_servers_left_out_of_the_list(self):
+        # Beyond osapi_max_limit, or gone.
+        self.servers["server-2"] = _server("server-2", "ACTIVE")
+        self.context.is_admin = False
+        nova_client, resources = self._list_with(
+            self.context, ["server-1", "server-2", "server-3"])
+        self.assertEqual(["server-1", "server-2"], sorted(resources.keys()))
+        self.assertEqual(2, nova_client.servers.get.call_count)
+
+    def test_list_for_admin_gets_each_server(self):
+        # Servers of other tenants, which the admin's list leaves out.
+        self.servers["server-2"] = _server("server-2", "ACTIVE")
+        self.context.is_admin = True
+        nova_client, resources = self._list_with(
+            self.context, ["server-2", "server-3", "server-2"])
+        self.assertEqual(["server-2"], resources.keys())
+        self.assertFalse(nova_client.servers.list.called)
+        self.assertEqual(2, nova_client.servers.get.call_count)
+
+    def _raise_or_return(self, result):
+        if isinstance(result, Exception):
+            raise result
+        return result
@@ -63,6 +63,7 @@ from reddwarf.tests.util.users import Requirements
 from reddwarf.common.exception import PollTimeOut
 from reddwarf.common.utils import import_object
 from reddwarf.common.utils import import_class
+from reddwarf.common.utils import poll_until
 
 
 WHITE_BOX = test_config.white_box
@@ -203,32 +204,6 @@ def string_in_list(str, substr_list):
     return any([str.find(x) >= 0 for x in substr_list])
 
 
-if CONFIG.simulate_events:
-    # Without event let, this just calls time.sleep.
-    def poll_until(retriever, condition=lambda value: value,
-                   sleep_time=1, time_out=None):
-        """Retrieves object until it passes condition, then returns it.
-
-        If time_out_limit is passed in, PollTimeOut will be raised once that
-        amount of time is eclipsed.
-
-        """
-        start_time = time.time()
-
-        def check_timeout():
-            if time_out is not None and time.time() > start_time + time_out:
-                raise PollTimeOut
-
-        while True:
-            obj = retriever()
-            if condition(obj):
-                return
-            check_timeout()
-            time.sleep(sleep_time)
-else:
-    from reddwarf.common.utils import poll_until
-
-
 def mysql_connection():
     cls = CONFIG.get('mysql_connection',
                      "local.MySqlConnection")
@@ -89,15 +89,9 @@ def initialize_fakes(app):
     time.sleep = event_simulator_sleep
 
 
-def replace_poll_until():
-    from reddwarf.common import utils as rd_utils
-    from reddwarf.tests import util as test_utils
-    rd_utils.poll_until = test_utils.poll_until
-
 if __name__=="__main__":
     wsgi_install()
     add_support_for_localization()
-    replace_poll_until()
     # Load Reddwarf app
     # Paste file needs absolute path
     config_file = os.path.realpath('etc/reddwarf/reddwarf.conf.test')
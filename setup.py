@@ -51,6 +51,7 @@ setuptools.setup(name='reddwarf',
              'bin/reddwarf-server',
              'bin/reddwarf-taskmanager',
              'bin/reddwarf-mgmt-taskmanager',
+             'bin/reddwarf-notifications',
              'bin/reddwarf-manage',
              ],
     py_modules=[],
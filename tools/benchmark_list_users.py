@@ -0,0 +1,120 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Times MySqlAdmin.list_users against a fake MySQL.
+
+Usage: python tools/benchmark_list_users.py [users [grants_per_user]]
+
+The fake LocalSqlClient serves mysql.user and SCHEMA_PRIVILEGES rows from
+memory and applies the LIKE filters of the grants query the way MySQL
+would. For growing page sizes it prints the time per page, the number of
+queries and the number of grant rows returned; both should grow linearly
+with the page size and not with the total number of grants.
+"""
+
+import os
+import re
+import sys
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'reddwarf', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from reddwarf.common import cfg
+from reddwarf.guestagent import dbaas
+
+USERS = 2000
+GRANTS_PER_USER = 5
+PAGE_SIZES = [10, 20, 50, 100, 200]
+REPEAT = 20
+
+
+class FakeResult(list):
+
+    @property
+    def rowcount(self):
+        return len(self)
+
+
+class FakeLocalSqlClient(object):
+    """Answers the queries of list_users from in-memory tables."""
+
+    queries = 0
+    grant_rows = 0
+
+    def __init__(self, users, grants):
+        self.users = users
+        self.grants = grants
+
+    def __call__(self, engine, use_flush=True):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+    def execute(self, t, **params):
+        FakeLocalSqlClient.queries += 1
+        if "mysql.user" in t.text:
+            limit = int(re.search("LIMIT (\d+)", t.text).group(1))
+            return FakeResult({'User': user} for user in self.users[:limit])
+        rows = FakeResult(self.grants)
+        if params:
+            # LIKE "'name'@%" is a prefix match on the grantee.
+            prefixes = tuple(pattern.replace('\\', '')[:-1]
+                             for pattern in params.values())
+            rows = FakeResult(grant for grant in rows
+                              if grant['grantee'].startswith(prefixes))
+        FakeLocalSqlClient.grant_rows += len(rows)
+        return rows
+
+
+def fake_mysql(users, grants_per_user):
+    names = ["user%05d" % index for index in range(users)]
+    grants = [{'grantee': "'%s'@'%%'" % name,
+               'table_schema': "db%d" % index}
+              for name in names for index in range(grants_per_user)]
+    return FakeLocalSqlClient(names, grants)
+
+
+def run(users, grants_per_user):
+    dbaas.LocalSqlClient = fake_mysql(users, grants_per_user)
+    dbaas.get_engine = lambda: None
+    admin = dbaas.MySqlAdmin()
+    print("%d users with %d grants each" % (users, grants_per_user))
+    for page_size in PAGE_SIZES:
+        FakeLocalSqlClient.queries = 0
+        FakeLocalSqlClient.grant_rows = 0
+        started = time.time()
+        for _ in range(REPEAT):
+            admin.list_users(limit=page_size)
+        elapsed = (time.time() - started) / REPEAT * 1000
+        print("page of %4d: %7.2fms  %d queries  %5d grant rows"
+              % (page_size, elapsed, FakeLocalSqlClient.queries / REPEAT,
+                 FakeLocalSqlClient.grant_rows / REPEAT))
+
+
+if __name__ == '__main__':
+    cfg.parse_args([sys.argv[0]])
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else USERS
+    grants = int(sys.argv[2]) if len(sys.argv) > 2 else GRANTS_PER_USER
+    run(users, grants)
@@ -0,0 +1,116 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Times instance list pages against a SQLite database of growing size.
+
+Usage: python tools/benchmark_pagination.py [rows ...]
+
+Each size fills a fresh database with instances spread over a few tenants,
+then times the first, a middle and the last page of one tenant using the
+same keyset query Instances.load uses. With the indexes from migration 012
+the time per page should not grow with the number of rows.
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'reddwarf', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from sqlalchemy import orm
+
+from reddwarf.common import cfg
+from reddwarf.db import get_db_api
+from reddwarf.db.sqlalchemy import session
+from reddwarf.instance import models
+
+CONF = cfg.CONF
+TENANTS = 10
+PAGE_SIZE = 20
+REPEAT = 20
+
+
+def fill(engine, rows):
+    start = datetime.datetime(2013, 1, 1)
+    values = []
+    for index in range(rows):
+        values.append({
+            'id': str(uuid.uuid4()),
+            'created': start + datetime.timedelta(seconds=index),
+            'tenant_id': "tenant-%d" % (index % TENANTS),
+            'deleted': index % 7 == 0,
+            'task_id': 1,
+            'task_description': 'No tasks for the instance.',
+            'name': "instance-%d" % index,
+        })
+    table = orm.class_mapper(models.DBInstance).mapped_table
+    engine.execute(table.insert(), values)
+
+
+def page(marker):
+    query = models.DBInstance.find_all(tenant_id="tenant-3", deleted=False)
+    return query.paginated_collection(limit=PAGE_SIZE, marker=marker,
+                                      sort_keys=['created', 'id'])
+
+
+def time_page(marker):
+    started = time.time()
+    for _ in range(REPEAT):
+        page(marker)
+    return (time.time() - started) / REPEAT * 1000
+
+
+def find_markers():
+    """Returns the markers of the first, a middle and the last page."""
+    markers = [None]
+    marker = None
+    while True:
+        items, marker = page(marker)
+        if marker is None:
+            break
+        markers.append(marker)
+    return markers[0], markers[len(markers) / 2], markers[-1]
+
+
+def run(rows):
+    path = tempfile.mktemp(suffix=".sqlite")
+    CONF.set_override('sql_connection', "sqlite:///%s" % path)
+    session._ENGINE = None
+    session._MAKER = None
+    try:
+        get_db_api().db_sync(CONF)
+        session.configure_db(CONF)
+        fill(session._ENGINE, rows)
+        first, middle, last = find_markers()
+        print("%8d rows: first %.2fms  middle %.2fms  last %.2fms"
+              % (rows, time_page(first), time_page(middle), time_page(last)))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    cfg.parse_args([sys.argv[0]])
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    for rows in sizes:
+        run(rows)
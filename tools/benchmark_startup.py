@@ -0,0 +1,130 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Times the startup of reddwarf-server and reddwarf-guestagent on SQLite.
+
+Usage: python tools/benchmark_startup.py [runs]
+
+Every run starts a fresh Python process which does what the binary does
+before it starts serving: the same imports, parsing the configuration,
+configure_db and the first query the service makes. The database is
+migrated once beforehand. The interpreter start itself isn't included;
+the imports are, so compare two versions of the code on the same machine.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'reddwarf', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+RUNS = 20
+
+
+def start_server(conf):
+    from reddwarf.db import get_db_api
+    from reddwarf.instance import models
+    started = time.time()
+    get_db_api().configure_db(conf)
+    models.DBInstance.find_all(tenant_id="tenant", deleted=False).limit(20)
+    return time.time() - started
+
+
+def start_guestagent(conf):
+    from reddwarf.db import get_db_api
+    from reddwarf.guestagent import models
+    from reddwarf.openstack.common import importutils
+    importutils.import_object("reddwarf.guestagent.manager.Manager")
+    started = time.time()
+    get_db_api().configure_db(conf)
+    models.AgentHeartBeat.get_by(instance_id="instance")
+    return time.time() - started
+
+
+SERVICES = {
+    'reddwarf-server': start_server,
+    'reddwarf-guestagent': start_guestagent,
+}
+
+
+def child(service, path):
+    """Starts one service and prints how long that took in milliseconds.
+
+    Prints the whole startup, the database part of it (configure_db plus
+    the first query) and the number of SQL statements sent. Against a
+    remote database every statement is a round trip.
+    """
+    started = time.time()
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    statements = []
+    event.listen(Engine, 'before_cursor_execute',
+                 lambda *args: statements.append(args[2]))
+    from reddwarf.common import cfg
+    cfg.parse_args([sys.argv[0]])
+    cfg.CONF.set_override('sql_connection', "sqlite:///%s" % path)
+    database = SERVICES[service](cfg.CONF)
+    print("%f %f %d" % ((time.time() - started) * 1000, database * 1000,
+                        len(statements)))
+
+
+def median(values):
+    return sorted(values)[len(values) / 2]
+
+
+def time_service(service, path, runs):
+    """Returns the median startup times and the statements sent."""
+    totals = []
+    databases = []
+    for _ in range(runs):
+        child = subprocess.Popen([sys.executable, __file__,
+                                  '--child', service, path],
+                                 stdout=subprocess.PIPE)
+        output = child.communicate()[0]
+        if child.returncode:
+            raise RuntimeError("Starting %s failed." % service)
+        total, database, statements = output.strip().splitlines()[-1].split()
+        totals.append(float(total))
+        databases.append(float(database))
+    return median(totals), median(databases), int(statements)
+
+
+def run(runs):
+    from reddwarf.db.sqlalchemy import migration
+    fd, path = tempfile.mkstemp(suffix=".sqlite")
+    os.close(fd)
+    try:
+        migration.db_sync({'sql_connection': "sqlite:///%s" % path})
+        for service in sorted(SERVICES):
+            total, database, statements = time_service(service, path, runs)
+            print("%-20s startup %.1fms  database %.1fms  %d statements"
+                  % (service, total, database, statements))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3])
+    else:
+        run(int(sys.argv[1]) if len(sys.argv) > 1 else RUNS)